@@ -57,6 +57,48 @@ function aesDecrypt(encryptedText: string): string {
   }
 }
 
+// Compact values written by the FastAPI backend (fastapiRouter/ciphertext.py):
+// "~" + unpadded base64url of a format byte and the payload
+const FORMAT_CBC = 0x01;
+const FORMAT_GCM = 0x02;
+
+function compactDecrypt(encryptedText: string): { decrypted: string; method: string } {
+  const raw = Buffer.from(encryptedText.slice(1), 'base64url');
+  if (raw.length === 0) {
+    throw new Error('Empty encrypted value');
+  }
+
+  const formatByte = raw[0];
+  const payload = raw.subarray(1);
+  if (formatByte === FORMAT_GCM) {
+    if (payload.length < 12 + 16) {
+      throw new Error('Truncated AES-GCM value');
+    }
+    const decipher = crypto.createDecipheriv('aes-256-gcm', encryptionKeyBuffer, payload.subarray(0, 12));
+    // The format byte is authenticated along with the text
+    decipher.setAAD(raw.subarray(0, 1));
+    decipher.setAuthTag(payload.subarray(payload.length - 16));
+    try {
+      const decrypted = Buffer.concat([
+        decipher.update(payload.subarray(12, payload.length - 16)),
+        decipher.final()
+      ]);
+      return { decrypted: decrypted.toString('utf8'), method: 'AES-256-GCM' };
+    } catch {
+      throw new Error('AES-GCM authentication failed, the value is damaged');
+    }
+  }
+  if (formatByte === FORMAT_CBC) {
+    if (payload.length < 32 || payload.length % 16 !== 0) {
+      throw new Error('Truncated AES-CBC value');
+    }
+    const decipher = crypto.createDecipheriv('aes-256-cbc', encryptionKeyBuffer, payload.subarray(0, 16));
+    const decrypted = Buffer.concat([decipher.update(payload.subarray(16)), decipher.final()]);
+    return { decrypted: decrypted.toString('utf8'), method: 'AES-256-CBC' };
+  }
+  throw new Error(`Unknown encrypted value format 0x${formatByte.toString(16).padStart(2, '0')}`);
+}
+
 export async function POST(request: NextRequest) {
   try {
     const { pdfFileContent } = await request.json();
@@ -83,7 +125,10 @@ export async function POST(request: NextRequest) {
         let method: string;
         
         // Choose decryption method based on format
-        if (encrypted.includes(':')) {
+        if (encrypted.startsWith('~')) {
+          // Compact base64url format (AES-256-GCM by default)
+          ({ decrypted, method } = compactDecrypt(encrypted));
+        } else if (encrypted.includes(':')) {
           // AES format with IV:ciphertext
           decrypted = aesDecrypt(encrypted);
           method = 'AES-256-CBC';
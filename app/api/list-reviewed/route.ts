@@ -1,25 +1,21 @@
 import { NextResponse } from 'next/server';
-import fs from 'fs';
 import path from 'path';
 import { prisma } from '@/lib/prisma';
+import { listPdfs } from '@/lib/storage';
 
 export async function GET() {
   try {
-    // Define the path to your PDFs folder
-    const pdfsFolderPath = path.join(process.cwd(), 'pdfs', 'reviewed');
+    // Read the directory contents (flat or sharded layout)
+    const filesInDirectory = listPdfs('reviewed');
 
     // Check if the directory exists
-    if (!fs.existsSync(pdfsFolderPath)) {
+    if (filesInDirectory === null) {
       return NextResponse.json({
         error: 'PDFs directory not found',
         files: []
       }, { status: 404 });
     }
 
-    // Read the directory contents
-    const filesInDirectory = fs.readdirSync(pdfsFolderPath)
-      .filter(file => file.toLowerCase().endsWith('.pdf'));
-
     // Fetch metadata from the database
     const papers = await prisma.paper.findMany({
       where: {
@@ -1,12 +1,12 @@
 import { NextRequest, NextResponse } from 'next/server';
-import path from 'path';
 import fs from 'fs';
+import { findPdf } from '@/lib/storage';
 
 export async function GET(request: NextRequest, { params }: { params: { filename: string } }) {
   const { filename } = await params;
-  const filePath = path.join(process.cwd(), 'pdfs', 'decrypted', filename);
+  const filePath = findPdf('decrypted', filename);
 
-  if (fs.existsSync(filePath)) {
+  if (filePath) {
     const fileContents = fs.readFileSync(filePath);
     return new NextResponse(fileContents, {
       headers: {
@@ -1,7 +1,7 @@
 import { NextRequest, NextResponse } from 'next/server';
 import { promises as fs } from 'fs';
-import path from 'path';
 import PDFParser from 'pdf2json';
+import { findPdf } from '@/lib/storage';
 
 export async function POST(req: NextRequest) {
   const { filename } = await req.json();
@@ -12,10 +12,13 @@ export async function POST(req: NextRequest) {
 
   // Construct the full path to the PDF file in the public/pdfs directory
 
-  const filePath = path.join(process.cwd(), 'pdfs', 'processed', filename);
+  const filePath = findPdf('processed', filename);
 
   try {
     // Check if the file exists
+    if (!filePath) {
+      throw new Error(`${filename} not found`);
+    }
     await fs.access(filePath);
 
     const pdfParser = new (PDFParser as any)(null, 1);
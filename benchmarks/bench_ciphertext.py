@@ -0,0 +1,89 @@
+"""
+Size and speed of the encrypted value formats (CIPHERTEXT_FORMAT).
+
+    python -m benchmarks.bench_ciphertext --fields 3 30 --repeat 50
+
+For each format this renders the encryption pages for a number of
+affiliation fields, then extracts their text and decrypts it the way
+/api/py/decrypt does. Reported are the average value length, pages and
+saved size of the encryption pages, render and decrypt times, how many
+values decrypt back from the extracted text, and how long rejecting a
+damaged value takes.
+"""
+import argparse
+import statistics
+import time
+
+import fitz  # PyMuPDF
+
+from fastapiRouter import ciphertext, decrypt
+from fastapiRouter.entities import AuthorInfo, EncryptedField, UniqueList
+from main import EncryptionOptions, add_encryption_info_pages, encryption_key
+
+
+def timed(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def damaged(value: str) -> str:
+    # Flip one character in the middle, as a bad text extraction would
+    middle = len(value) // 2
+    return value[:middle] + ("A" if value[middle] != "A" else "B") + value[middle + 1:]
+
+
+def run(field_counts, repeat):
+    print(f"{'format':>7} {'fields':>7} {'chars':>6} {'pages':>6} {'KB':>7} "
+          f"{'render ms':>10} {'decrypt ms':>11} {'ok':>4} {'reject us':>10}")
+    for count in field_counts:
+        values = [f"Department {i} of Computer Engineering, University of Somewhere" for i in range(count)]
+        author_info = AuthorInfo(affiliations=UniqueList(values))
+        options = EncryptionOptions()
+
+        for fmt in ciphertext.FORMATS:
+            fields = [EncryptedField("affiliation", value, ciphertext.encrypt(value, encryption_key, fmt),
+                                     ciphertext.algorithm(fmt)) for value in values]
+            chars = statistics.mean(len(field.encrypted) for field in fields)
+
+            def render():
+                doc = fitz.open()
+                add_encryption_info_pages(doc, fields, author_info, options, 612, 792)
+                data = doc.tobytes(garbage=3, deflate=True)
+                doc.close()
+                return data
+
+            data = render()
+            doc = fitz.open("pdf", data)
+            pages = doc.page_count
+            text = "".join(page.get_text() for page in doc)
+            doc.close()
+
+            _, results = decrypt.decrypt_content(text)
+            ok = sum(1 for item in results if item.ok)
+
+            render_ms = timed(render, repeat)
+            decrypt_ms = timed(lambda: decrypt.decrypt_content(text), repeat)
+
+            bad = damaged(fields[0].encrypted)
+
+            def reject():
+                try:
+                    ciphertext.decrypt(bad, encryption_key)
+                except ValueError:
+                    pass
+
+            reject_us = timed(reject, repeat * 20) * 1000
+            print(f"{fmt:>7} {count:>7} {chars:>6.0f} {pages:>6} {len(data) / 1024:>7.1f} "
+                  f"{render_ms:>10.2f} {decrypt_ms:>11.2f} {ok:>4} {reject_us:>10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--fields", type=int, nargs="+", default=[3, 30])
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+    run(args.fields, args.repeat)
@@ -0,0 +1,88 @@
+"""
+Time and Python allocations of author extraction and decryption per document.
+
+    python -m benchmarks.bench_entities --authors 3 200 800
+
+Author extraction runs on a cached layout, so only the pure-Python entity
+handling is measured, not PyMuPDF. Decryption runs on the text of the
+encryption pages generated for the extracted values. Times are the best of
+several plain runs; tracemalloc then reports the peak traced memory during
+one call and the blocks and bytes still held by its result.
+"""
+import argparse
+import time
+import tracemalloc
+
+import fitz  # PyMuPDF
+
+from benchmarks.synthetic import make_author_list, make_paper
+from fastapiRouter import decrypt, layout_cache
+from fastapiRouter.entities import EncryptedField
+from main import EncryptionOptions, add_encryption_info_pages, encrypt_aes, extract_author_info_from_layout
+
+
+def best_time(func, arg, repeat: int = 5) -> float:
+    """Fastest of several untraced runs, in seconds; tracemalloc slows allocations down."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(arg)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def traced(func, arg):
+    """Run func once under tracemalloc; returns (peak KB, held blocks, held KB)."""
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    result = func(arg)
+    _, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    del result
+
+    held = [stat for stat in after.compare_to(before, "filename") if stat.size_diff > 0]
+    blocks = sum(stat.count_diff for stat in held)
+    size = sum(stat.size_diff for stat in held)
+    return peak / 1024, blocks, size / 1024
+
+
+def encryption_page_text(layout) -> str:
+    """Text of the encryption pages the pipeline would append for this layout."""
+    options = EncryptionOptions()
+    author_info = extract_author_info_from_layout(layout)
+    fields = [EncryptedField(kind, value, encrypt_aes(value))
+              for kind, values in (("name", author_info.names), ("email", author_info.emails),
+                                   ("affiliation", author_info.affiliations))
+              for value in values]
+    doc = fitz.open()
+    add_encryption_info_pages(doc, fields, author_info, options, *layout.first_page_size)
+    text = "".join(page.get_text() for page in doc)
+    doc.close()
+    return text
+
+
+def run(author_counts):
+    print(f"{'authors':>8} {'stage':>10} {'ms':>9} {'peak KB':>9} {'held blocks':>12} {'held KB':>9}")
+    for count in author_counts:
+        pdf = make_paper(pages=1, with_images=False) if count <= 3 else make_author_list(count)
+        doc = fitz.open("pdf", pdf)
+        layout = layout_cache.from_document(doc)
+        doc.close()
+
+        stages = [
+            ("extract", extract_author_info_from_layout, layout),
+            ("decrypt", decrypt.decrypt_content, encryption_page_text(layout)),
+        ]
+        for name, func, arg in stages:
+            elapsed = best_time(func, arg)
+            peak, blocks, held = traced(func, arg)
+            print(f"{count:>8} {name:>10} {elapsed * 1000:>9.2f} {peak:>9.1f} {blocks:>12} {held:>9.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--authors", type=int, nargs="+", default=[3, 200, 800])
+    args = parser.parse_args()
+    run(args.authors)
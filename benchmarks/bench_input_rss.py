@@ -0,0 +1,59 @@
+"""
+Compare worker peak RSS when process_pdf_for_ieee gets the input as bytes
+(read into memory first) versus as a file path opened by MuPDF.
+
+    python -m benchmarks.bench_input_rss --pages 400
+
+Each mode runs in a fresh interpreter so the peak RSS figures do not mix.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.synthetic import write_paper
+
+CHILD = r"""
+import resource, sys, time
+from main import EncryptionOptions, process_pdf_for_ieee
+
+mode, path = sys.argv[1], sys.argv[2]
+baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+start = time.perf_counter()
+if mode == "bytes":
+    with open(path, "rb") as f:
+        source = f.read()
+else:
+    source = path
+process_pdf_for_ieee(source, EncryptionOptions(save_profile="fast"))
+elapsed = time.perf_counter() - start
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(baseline, peak, elapsed)
+"""
+
+
+def run(pages):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "paper.pdf")
+        write_paper(path, pages)
+        size_mb = os.path.getsize(path) / 1024 / 1024
+        print(f"input: {pages} pages, {size_mb:.1f} MB")
+        print(f"{'mode':>6} {'peak RSS MB':>12} {'delta MB':>10} {'seconds':>8}")
+
+        for mode in ("bytes", "path"):
+            out = subprocess.run(
+                [sys.executable, "-c", CHILD, mode, path],
+                capture_output=True, text=True, check=True, cwd=tmp,
+                env={**os.environ, "PYTHONPATH": os.getcwd()}
+            ).stdout.split()
+            # ru_maxrss is reported in kilobytes on Linux
+            baseline, peak, elapsed = int(out[-3]), int(out[-2]), float(out[-1])
+            print(f"{mode:>6} {peak / 1024:>12.1f} {(peak - baseline) / 1024:>10.1f} {elapsed:>8.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, default=400)
+    args = parser.parse_args()
+    run(args.pages)
@@ -0,0 +1,88 @@
+"""
+Render time of the generated pages: encryption details, decryption summary
+and review page.
+
+    python -m benchmarks.bench_page_templates --fields 3 30 --repeat 200
+
+Each page is rendered into a fresh document per iteration, the way a request
+does it, and the document is serialized so deferred work is counted too.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime
+
+import fitz  # PyMuPDF
+
+from benchmarks.synthetic import write_paper
+from fastapiRouter import decrypt, review
+from fastapiRouter.entities import AuthorInfo, DecryptedItem, EncryptedField, UniqueList
+from main import EncryptionOptions, add_encryption_info_pages, encrypt_aes
+
+
+def timed(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000, len(timings)
+
+
+def encryption_pages(field_count):
+    values = [f"Author Number{i} University of Somewhere" for i in range(field_count)]
+    fields = [EncryptedField("affiliation", value, encrypt_aes(value)) for value in values]
+    author_info = AuthorInfo(affiliations=UniqueList(values))
+    options = EncryptionOptions()
+
+    def render():
+        doc = fitz.open()
+        add_encryption_info_pages(doc, fields, author_info, options, 612, 792)
+        pages = doc.page_count
+        doc.tobytes()
+        doc.close()
+        return pages
+
+    return render, render()
+
+
+def summary_page(field_count):
+    results = [DecryptedItem(encrypt_aes(f"value {i}"), f"value {i}", "AES-256-CBC")
+               for i in range(field_count)]
+    return lambda: decrypt.create_decryption_summary_page(results, "paper.pdf"), 1
+
+
+def review_page(paper_path, output_path):
+    text = "The paper is well written and the evaluation is thorough. " * 10
+    return lambda: review.append_review_page(
+        paper_path, output_path, text, 4.5, datetime.now(), "reviewer@example.org", "Reviewer"), 1
+
+
+def run(field_counts, repeat):
+    with tempfile.TemporaryDirectory() as tmp:
+        paper_path = os.path.join(tmp, "paper.pdf")
+        write_paper(paper_path, pages=1, with_images=False)
+        output_path = os.path.join(tmp, "reviewed.pdf")
+
+        print(f"{'page':>12} {'fields':>7} {'pages':>6} {'ms/doc':>8} {'ms/page':>8}")
+        for count in field_counts:
+            for name, (render, pages) in (("encryption", encryption_pages(count)),
+                                          ("summary", summary_page(count))):
+                render()  # warm up font and style caches
+                ms, _ = timed(render, repeat)
+                print(f"{name:>12} {count:>7} {pages:>6} {ms:>8.2f} {ms / pages:>8.2f}")
+
+        render, pages = review_page(paper_path, output_path)
+        render()
+        ms, _ = timed(render, repeat)
+        print(f"{'review':>12} {'-':>7} {pages:>6} {ms:>8.2f} {ms / pages:>8.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--fields", type=int, nargs="+", default=[3, 30])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    run(args.fields, args.repeat)
@@ -0,0 +1,34 @@
+"""
+Compare save time and output size of the anonymization save profiles.
+
+    python -m benchmarks.bench_save_profiles --pages 10 50 200 --repeat 3
+"""
+import argparse
+import statistics
+import time
+
+from benchmarks.synthetic import make_paper
+from main import SAVE_PROFILES, EncryptionOptions, process_pdf_for_ieee
+
+
+def run(pages_list, repeat):
+    print(f"{'pages':>6} {'profile':>9} {'median s':>10} {'size KB':>10}")
+    for pages in pages_list:
+        pdf_bytes = make_paper(pages)
+        for profile in SAVE_PROFILES:
+            options = EncryptionOptions(save_profile=profile)
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                output, _ = process_pdf_for_ieee(pdf_bytes, options)
+                timings.append(time.perf_counter() - start)
+            print(f"{pages:>6} {profile:>9} {statistics.median(timings):>10.3f} "
+                  f"{len(output) / 1024:>10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run(args.pages, args.repeat)
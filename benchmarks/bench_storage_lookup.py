@@ -0,0 +1,72 @@
+"""
+Lookup latency of the flat and sharded storage layouts.
+
+    python -m benchmarks.bench_storage_lookup --files 10000 100000 1000000
+
+Creates empty files named like processed uploads in a temporary directory
+for each layout, then times exists() and open() for random present and
+absent names, plus a full iter_files() scan.
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from fastapiRouter.storage import FlatStorage, ShardedStorage
+
+
+def populate(store, count):
+    for i in range(count):
+        fd = os.open(store.path_for_write(f"processed_{i:07d}_paper.pdf"), os.O_CREAT | os.O_WRONLY)
+        os.close(fd)
+
+
+def time_calls(func, names):
+    timings = []
+    for name in names:
+        start = time.perf_counter()
+        func(name)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1e6, statistics.quantiles(timings, n=100)[98] * 1e6
+
+
+def open_close(store):
+    def run(name):
+        with open(store.path(name), "rb"):
+            pass
+    return run
+
+
+def run(counts, lookups):
+    print(f"{'files':>8} {'layout':>8} {'exists p50/p99 us':>20} {'open p50/p99 us':>18} "
+          f"{'miss p50 us':>12} {'scan s':>8}")
+    for count in counts:
+        rng = random.Random(count)
+        present = [f"processed_{rng.randrange(count):07d}_paper.pdf" for _ in range(lookups)]
+        absent = [f"processed_{count + i:07d}_paper.pdf" for i in range(lookups)]
+        for layout in (FlatStorage, ShardedStorage):
+            with tempfile.TemporaryDirectory() as tmp:
+                store = layout(tmp)
+                populate(store, count)
+
+                exists_p50, exists_p99 = time_calls(store.exists, present)
+                open_p50, open_p99 = time_calls(open_close(store), present)
+                miss_p50, _ = time_calls(store.exists, absent)
+
+                start = time.perf_counter()
+                sum(1 for _ in store.iter_files())
+                scan = time.perf_counter() - start
+
+                name = "sharded" if store.sharded else "flat"
+                print(f"{count:>8} {name:>8} {exists_p50:>9.1f}/{exists_p99:<10.1f} "
+                      f"{open_p50:>8.1f}/{open_p99:<9.1f} {miss_p50:>12.1f} {scan:>8.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--lookups", type=int, default=2000)
+    args = parser.parse_args()
+    run(args.files, args.lookups)
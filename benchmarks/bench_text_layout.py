@@ -0,0 +1,85 @@
+"""
+Line breaking and pagination of long reviews.
+
+    python -m benchmarks.bench_text_layout --kb 1 10 100 1000
+
+For each review size this times wrapping alone, wrapping plus drawing the
+pages with reportlab, and the whole append_review_page() call on a small
+paper. Time per KB should stay flat as the size grows.
+"""
+import argparse
+import io
+import os
+import random
+import tempfile
+import time
+from datetime import datetime
+
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
+
+from benchmarks.synthetic import BODY_WORDS, write_paper
+from fastapiRouter import review, text_layout
+
+
+def make_review(kilobytes: int, seed: int = 0) -> str:
+    """Paragraphs of filler words totalling about the given size."""
+    rng = random.Random(seed)
+    paragraphs = []
+    size = 0
+    while size < kilobytes * 1024:
+        paragraph = " ".join(rng.choice(BODY_WORDS) for _ in range(rng.randint(20, 120)))
+        paragraphs.append(paragraph)
+        size += len(paragraph) + 1
+    return "\n".join(paragraphs)
+
+
+def best_time(func, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def render_pages(text: str) -> int:
+    can = canvas.Canvas(io.BytesIO(), pagesize=letter)
+    flow = text_layout.TextFlow(can, x=review.REVIEW_MARGIN, y=600, width=review.REVIEW_TEXT_WIDTH,
+                                on_new_page=review._draw_review_continued)
+    flow.write(text)
+    flow.finish()
+    can.save()
+    return flow.pages
+
+
+def run(sizes, repeat):
+    with tempfile.TemporaryDirectory() as tmp:
+        paper_path = os.path.join(tmp, "paper.pdf")
+        output_path = os.path.join(tmp, "reviewed.pdf")
+        write_paper(paper_path, pages=1, with_images=False)
+
+        print(f"{'KB':>6} {'lines':>7} {'pages':>6} {'wrap ms':>9} {'pages ms':>9} "
+              f"{'review ms':>10} {'review ms/KB':>13}")
+        for kilobytes in sizes:
+            text = make_review(kilobytes)
+            lines = sum(1 for _ in text_layout.wrap_text(text, "Helvetica", 12, review.REVIEW_TEXT_WIDTH))
+            pages = render_pages(text)
+
+            wrap_s = best_time(lambda: sum(1 for _ in text_layout.wrap_text(
+                text, "Helvetica", 12, review.REVIEW_TEXT_WIDTH)), repeat)
+            pages_s = best_time(lambda: render_pages(text), repeat)
+            review_s = best_time(lambda: review.append_review_page(
+                paper_path, output_path, text, 4.5, datetime.now(), "reviewer@example.org", "Reviewer"),
+                repeat)
+            print(f"{kilobytes:>6} {lines:>7} {pages:>6} {wrap_s * 1000:>9.2f} {pages_s * 1000:>9.2f} "
+                  f"{review_s * 1000:>10.2f} {review_s * 1000 / kilobytes:>13.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--kb", type=int, nargs="+", default=[1, 10, 100, 1000],
+                        help="review sizes in KB")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    run(args.kb, args.repeat)
@@ -0,0 +1,256 @@
+"""
+Load test of the Python endpoints with a mix of synthetic traffic.
+
+    python -m benchmarks.load_test --concurrency 1 4 16 --duration 30
+    python -m benchmarks.load_test --url http://127.0.0.1:8000 --mix process-pdf=1,decrypt=4
+
+Without --url the app from main.py is driven in-process through httpx's
+ASGI transport (client and server then share the event loop and CPU, so
+latencies include some client overhead); with --url a running server is
+used. No other services are needed: papers are generated with
+benchmarks.synthetic and sent through /api/py/upload, and the decrypt and
+addDecryptedInfo requests replay the output of one setup round.
+
+For every concurrency level, that many workers send requests back to back
+for --duration seconds, each time picking an endpoint by the --mix weights.
+Reported per endpoint: requests, throughput, p50/p95/p99 latency, errors
+(failed requests and 5xx/4xx answers other than 429) and admission
+rejections (429). With --unique-papers every process-pdf and categorize
+request first uploads a paper nobody has sent before, so the content store
+cannot answer it from an earlier result.
+
+Needs httpx (pip install httpx).
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import fitz  # PyMuPDF
+import httpx
+
+from benchmarks.synthetic import make_paper
+
+ENDPOINTS = ("process-pdf", "categorize", "review", "decrypt", "addDecryptedInfo")
+DEFAULT_MIX = "process-pdf=2,categorize=2,review=2,decrypt=3,addDecryptedInfo=1"
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    """Parse "process-pdf=2,decrypt=3" into endpoint weights."""
+    mix = {}
+    for item in value.split(","):
+        endpoint, _, weight = item.partition("=")
+        endpoint = endpoint.strip()
+        if endpoint not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"Unknown endpoint '{endpoint}', expected one of {ENDPOINTS}")
+        mix[endpoint] = float(weight or 1)
+    return mix
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return float("nan")
+    index = max(0, min(len(sorted_values) - 1, int(round(q / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+class Results:
+    """Latencies and outcomes per endpoint for one concurrency level."""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.rejected: Dict[str, int] = defaultdict(int)
+        self.examples: Dict[str, str] = {}
+
+    def record(self, endpoint: str, seconds: float, status: Optional[int], detail: str = ""):
+        self.latencies[endpoint].append(seconds)
+        if status == 429:
+            self.rejected[endpoint] += 1
+        elif status is None or status >= 400:
+            self.errors[endpoint] += 1
+            self.examples.setdefault(endpoint, f"{status}: {detail[:200]}")
+
+    def summary(self, elapsed: float) -> List[Dict]:
+        rows = []
+        for endpoint in sorted(self.latencies):
+            latencies = sorted(self.latencies[endpoint])
+            count = len(latencies)
+            rows.append({
+                "endpoint": endpoint,
+                "requests": count,
+                "throughput": count / elapsed,
+                "p50_ms": percentile(latencies, 50) * 1000,
+                "p95_ms": percentile(latencies, 95) * 1000,
+                "p99_ms": percentile(latencies, 99) * 1000,
+                "error_rate": self.errors[endpoint] / count,
+                "rejected_rate": self.rejected[endpoint] / count,
+            })
+        return rows
+
+
+class Scenario:
+    """The documents and request bodies the workers replay."""
+
+    def __init__(self, client: httpx.AsyncClient, papers: int, pages: int, unique_papers: bool):
+        self.client = client
+        self.papers = papers
+        self.pages = pages
+        self.unique_papers = unique_papers
+        self.filenames: List[str] = []
+        self.decrypt_text = ""
+        self.decryption_results: List[Dict] = []
+        self.run_id = f"{int(time.time())}-{random.randrange(1 << 16):04x}"
+        self._seeds = itertools.count(1000)
+
+    async def upload(self, seed: int, data: Optional[bytes] = None) -> str:
+        filename = f"load_{self.run_id}_{seed}.pdf"
+        if data is None:
+            data = make_paper(self.pages, with_images=False, seed=seed)
+        response = await self.client.post("/api/py/upload", params={"filename": filename}, content=data)
+        response.raise_for_status()
+        return filename
+
+    async def setup(self):
+        """Upload and process the papers, and run the chain once for the decrypt requests."""
+        self.filenames = [await self.upload(seed) for seed in range(self.papers)]
+        first = self.filenames[0]
+
+        # Reviews are added to processed papers
+        for filename in self.filenames[1:]:
+            response = await self.client.post("/api/py/process-pdf", json={"filename": filename})
+            response.raise_for_status()
+        response = await self.client.post(
+            "/api/py/process-pdf", json={"filename": first, "responseMode": "pdf"})
+        response.raise_for_status()
+        doc = fitz.open("pdf", response.content)
+        self.decrypt_text = "".join(page.get_text() for page in doc)
+        doc.close()
+
+        response = await self.client.post("/api/py/review", json=self.review_body(first))
+        response.raise_for_status()
+        response = await self.client.post(
+            "/api/py/decrypt", json={"pdfFileContent": self.decrypt_text, "fileName": first})
+        response.raise_for_status()
+        self.decryption_results = response.json()["decryption_results"]
+
+    async def paper(self, rng: random.Random, results: Results) -> str:
+        if not self.unique_papers:
+            return rng.choice(self.filenames)
+        seed = next(self._seeds)
+        # Generated before the clock starts, so only the upload is timed
+        data = make_paper(self.pages, with_images=False, seed=seed)
+        start = time.perf_counter()
+        try:
+            filename = await self.upload(seed, data)
+        except Exception as e:
+            results.record("upload", time.perf_counter() - start, None, repr(e))
+            raise
+        results.record("upload", time.perf_counter() - start, 200)
+        return filename
+
+    def review_body(self, filename: str) -> Dict:
+        return {"pdf_filename": filename, "review_text": "The evaluation is thorough. " * 40,
+                "review_score": 4, "reviewer_email": "reviewer@example.org", "reviewer_name": "Reviewer"}
+
+    async def request(self, endpoint: str, rng: random.Random, results: Results) -> Tuple[str, object]:
+        """URL and JSON body of the next request to endpoint. Uploads with --unique-papers."""
+        if endpoint == "process-pdf":
+            return "/api/py/process-pdf", {"filename": await self.paper(rng, results)}
+        if endpoint == "categorize":
+            return "/api/py/categorize", await self.paper(rng, results)
+        if endpoint == "review":
+            return "/api/py/review", self.review_body(rng.choice(self.filenames))
+        if endpoint == "decrypt":
+            return "/api/py/decrypt", {"pdfFileContent": self.decrypt_text, "fileName": self.filenames[0]}
+        return (f"/api/py/addDecryptedInfo/{self.filenames[0]}",
+                {"decryptionResults": self.decryption_results})
+
+
+async def worker(scenario: Scenario, mix: Dict[str, float], deadline: float,
+                 results: Results, seed: int):
+    rng = random.Random(seed)
+    endpoints, weights = list(mix), list(mix.values())
+    while time.perf_counter() < deadline:
+        endpoint = rng.choices(endpoints, weights)[0]
+        try:
+            url, body = await scenario.request(endpoint, rng, results)
+        except Exception:
+            # Already recorded as a failed upload
+            continue
+        start = time.perf_counter()
+        try:
+            response = await scenario.client.post(url, json=body)
+        except Exception as e:
+            results.record(endpoint, time.perf_counter() - start, None, repr(e))
+            continue
+        results.record(endpoint, time.perf_counter() - start, response.status_code,
+                       response.text if response.status_code >= 400 else "")
+
+
+def print_table(concurrency: int, elapsed: float, rows: List[Dict], results: Results):
+    print(f"\nconcurrency {concurrency}, {elapsed:.1f} s")
+    print(f"{'endpoint':>17} {'requests':>9} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} "
+          f"{'p99 ms':>9} {'errors':>7} {'429':>6}")
+    for row in rows:
+        print(f"{row['endpoint']:>17} {row['requests']:>9} {row['throughput']:>8.2f} "
+              f"{row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} {row['p99_ms']:>9.1f} "
+              f"{row['error_rate']:>7.1%} {row['rejected_rate']:>6.1%}")
+    for endpoint, example in results.examples.items():
+        print(f"  first {endpoint} error: {example}")
+
+
+async def run(args) -> List[Dict]:
+    if args.url:
+        transport = None
+        base_url = args.url.rstrip("/")
+    else:
+        import main  # noqa: imported here so --url runs do not load the app
+
+        transport = httpx.ASGITransport(app=main.app)
+        base_url = "http://load-test"
+
+    report = []
+    async with httpx.AsyncClient(transport=transport, base_url=base_url, timeout=args.timeout) as client:
+        scenario = Scenario(client, args.papers, args.pages, args.unique_papers)
+        await scenario.setup()
+
+        for concurrency in args.concurrency:
+            results = Results()
+            start = time.perf_counter()
+            deadline = start + args.duration
+            await asyncio.gather(*(worker(scenario, args.mix, deadline, results, args.seed + i)
+                                   for i in range(concurrency)))
+            elapsed = time.perf_counter() - start
+            rows = results.summary(elapsed)
+            print_table(concurrency, elapsed, rows, results)
+            report.append({"concurrency": concurrency, "seconds": elapsed, "endpoints": rows})
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", help="base URL of a running server (default: in-process)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16],
+                        help="concurrent workers; one run per value")
+    parser.add_argument("--duration", type=float, default=30, help="seconds per concurrency level")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f"endpoint weights (default: {DEFAULT_MIX})")
+    parser.add_argument("--papers", type=int, default=8, help="distinct papers uploaded for the run")
+    parser.add_argument("--pages", type=int, default=4, help="pages per synthetic paper")
+    parser.add_argument("--unique-papers", action="store_true",
+                        help="upload a new paper for every process-pdf and categorize request")
+    parser.add_argument("--timeout", type=float, default=300, help="per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,75 @@
+"""Synthetic IEEE-style papers used by the benchmark scripts."""
+import random
+
+import fitz  # PyMuPDF
+
+AUTHORS = [
+    ("John Smith", "john.smith@mit.edu", "Department of Computer Science",
+     "Massachusetts Institute of Technology"),
+    ("Alice Jones", "alice.jones@stanford.edu", "School of Engineering",
+     "Stanford University"),
+    ("Mehmet Yilmaz", "mehmet.yilmaz@kocaeli.edu.tr", "Department of Computer Engineering",
+     "Kocaeli University"),
+]
+
+BODY_WORDS = (
+    "machine learning deep learning neural network security encryption cloud computing "
+    "blockchain data mining user interface distributed system the of and a to in is for "
+    "with on we our results method approach evaluation performance model dataset"
+).split()
+
+
+def make_paper(pages: int = 10, with_images: bool = True, seed: int = 0) -> bytes:
+    """Build a paper with an author header on page 1 and filler body pages."""
+    rng = random.Random(seed)
+    doc = fitz.open()
+
+    first = doc.new_page()
+    first.insert_text((72, 60), "Secure Federated Learning for Edge Networks", fontsize=20)
+    x = 72
+    for name, email, department, university in AUTHORS:
+        first.insert_text(
+            (x, 110), f"{name}\n{email}\n{department}\n{university}", fontsize=8)
+        x += 160
+
+    for page_number in range(pages):
+        page = first if page_number == 0 else doc.new_page()
+        y = 300 if page_number == 0 else 72
+        while y < page.rect.height - 72:
+            line = " ".join(rng.choice(BODY_WORDS) for _ in range(14))
+            page.insert_text((72, y), line, fontsize=9)
+            y += 12
+
+        if with_images and page_number % 2 == 1:
+            # Uncompressed noisy image so image deflate has something to do
+            pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 200, 120), False)
+            pix.set_rect(pix.irect, (rng.randrange(256), 120, 200))
+            page.insert_image(fitz.Rect(72, 400, 272, 520), pixmap=pix)
+
+    data = doc.tobytes(garbage=0, deflate=False)
+    doc.close()
+    return data
+
+
+def write_paper(path: str, pages: int = 10, with_images: bool = True, seed: int = 0):
+    with open(path, "wb") as f:
+        f.write(make_paper(pages, with_images, seed))
+
+
+def make_author_list(count: int) -> bytes:
+    """A single tall first page whose top half holds `count` distinct author blocks."""
+    doc = fitz.open()
+    rows = (count + 3) // 4
+    page = doc.new_page(width=700, height=max(792, rows * 60 * 2 + 200))
+    page.insert_text((72, 60), "Large Collaboration Report on Detector Calibration", fontsize=20)
+    for i in range(count):
+        x = 40 + (i % 4) * 165
+        y = 110 + (i // 4) * 60
+        page.insert_text(
+            (x, y),
+            f"Author{i:04d} Member{i:04d}\nauthor{i:04d}.member@lab{i % 50}.edu\n"
+            f"Department of Physics {i % 7}\nUniversity of Place{i % 50}",
+            fontsize=6)
+    data = doc.tobytes()
+    doc.close()
+    return data
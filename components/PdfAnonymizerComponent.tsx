@@ -54,6 +54,15 @@ export default function PdfAnonymizerComponent() {
     fetchAvailableFiles();
   }, []);
 
+  // Release the downloaded PDF once its result is replaced or the component unmounts
+  useEffect(() => {
+    return () => {
+      if (result?.downloadHref) {
+        URL.revokeObjectURL(result.downloadHref);
+      }
+    };
+  }, [result]);
+
   // Handle file selection
   const handleFileSelection = async (filename: string) => {
     setSelectedFilename(filename);
@@ -127,7 +136,9 @@ export default function PdfAnonymizerComponent() {
         },
         body: JSON.stringify({
           filename: selectedFilename,
-          encryptionOptions
+          encryptionOptions,
+          // The anonymized PDF comes back with the result, no second download needed
+          responseMode: 'multipart'
         }),
       });
 
@@ -156,7 +167,9 @@ export default function PdfAnonymizerComponent() {
         return;
       }
 
-      const processResult = await processResponse.json();
+      const processForm = await processResponse.formData();
+      const processResult = JSON.parse(processForm.get('result') as string);
+      const processedFile = processForm.get('file') as File;
       console.log('File processed successfully:', processResult);
 
       // Log the successful processing event
@@ -200,6 +213,7 @@ export default function PdfAnonymizerComponent() {
       // Transform the result to include the mapping data which shows what was encrypted
       const transformedResult = {
         ...processResult,
+        downloadHref: URL.createObjectURL(processedFile),
         sensitiveDataFound: processResult.mapping.sensitive_data_found,
         authorCount: processResult.mapping.encrypted_data.filter((item: any) => item.name).length,
         encryptedItems: processResult.mapping.encrypted_data,
@@ -344,7 +358,7 @@ export default function PdfAnonymizerComponent() {
                 <AlertTitle>Processing Complete</AlertTitle>
                 <AlertDescription className="space-y-2">
                   <p>Successfully processed PDF</p>
-                  <p>Download: <a href={"api/" + result.download_url} className="text-blue-600 underline">Download Anonymized PDF</a></p>
+                  <p>Download: <a href={result.downloadHref} download={result.processed_filename} className="text-blue-600 underline">Download Anonymized PDF</a></p>
 
                   <div className="mt-2">
                     <h4 className="font-medium">Sensitive data found and encrypted:</h4>
@@ -1,6 +1,8 @@
 from fastapi import FastAPI, APIRouter, HTTPException, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import FileResponse
 import json
+import logging
 import os
 from typing import Dict, List, Any
 from PyPDF2 import PdfReader, PdfWriter
@@ -10,7 +12,10 @@ from io import BytesIO
 import tempfile
 import shutil
 
+from fastapiRouter import admission, atomic_io, logs, metrics, storage, text_layout
+
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 # Path to the directory containing reviewed PDFs
 REVIEWED_PDFS_DIR = "./pdfs/reviewed/"
@@ -18,6 +23,8 @@ REVIEWED_PDFS_DIR = "./pdfs/reviewed/"
 DECRYPTED_PDFS_DIR = "./pdfs/decrypted/"
 
 @router.post("/api/py/addDecryptedInfo/{filename}")
+@metrics.timed_endpoint("addDecryptedInfo")
+@admission.admit("addDecryptedInfo", admission.INTERACTIVE)
 async def add_decrypted_info_to_pdf(filename: str, decryption_data: Dict[str, Any], background_tasks: BackgroundTasks):
     """
     Add decrypted information to a PDF file located in the /pdfs/reviewed/ directory.
@@ -35,40 +42,28 @@ async def add_decrypted_info_to_pdf(filename: str, decryption_data: Dict[str, An
     if not filename.endswith('.pdf'):
         filename += '.pdf'
 
-    file_path = os.path.join(REVIEWED_PDFS_DIR,"reviewed_" + filename)
+    file_path = storage.get("reviewed").path("reviewed_" + filename)
 
     # Check if file exists
     if not os.path.exists(file_path):
-        print(f"File {filename} not found in {REVIEWED_PDFS_DIR}")
+        logger.warning("Reviewed PDF not found", extra={"pdf": filename})
         raise HTTPException(status_code=404, detail=f"File {filename} not found in {REVIEWED_PDFS_DIR}")
 
     try:
-        # Ensure the decrypted directory exists
-        os.makedirs(DECRYPTED_PDFS_DIR, exist_ok=True)
-        
-        # Path for the decrypted file
+        # Path for the decrypted file, creating its directory if needed
         decrypted_filename = f"decrypted_{filename}"
-        decrypted_file_path = os.path.join(DECRYPTED_PDFS_DIR, decrypted_filename)
+        decrypted_file_path = storage.get("decrypted").path_for_write(decrypted_filename)
 
         # Extract decryption results
         decryption_results = decryption_data.get("decryptionResults", [])
-        print(f"decryption_results={decryption_results}")
+        logs.payload(logger, "Decryption results received", pdf=filename,
+                     decryption_results=decryption_results)
 
         if not decryption_results:
             raise HTTPException(status_code=400, detail="No decryption results provided")
 
-        # Create a temporary file for the overlay
-        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as temp_overlay:
-            temp_overlay_path = temp_overlay.name
-
-        # Create a new PDF with the decrypted information
-        create_overlay_pdf(temp_overlay_path, decryption_results)
-
-        # Merge the original PDF with the overlay and save to the decrypted directory
-        merge_pdfs(file_path, temp_overlay_path, decrypted_file_path)
-
-        # Clean up the overlay temporary file
-        os.unlink(temp_overlay_path)
+        # Parsing, the file lock and the fsync'd write all block
+        await run_in_threadpool(append_decrypted_info, file_path, decrypted_file_path, decryption_results)
 
         # Return the modified PDF from the decrypted directory
         return FileResponse(
@@ -77,50 +72,56 @@ async def add_decrypted_info_to_pdf(filename: str, decryption_data: Dict[str, An
             media_type="application/pdf"
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Failed to process PDF: error={str(e)}")
+        logger.exception("Failed to add decrypted information", extra={"pdf": filename})
         raise HTTPException(status_code=500, detail=f"Failed to process PDF: {str(e)}")
 
+def append_decrypted_info(file_path: str, output_path: str, decryption_results: List[Dict[str, str]]):
+    """Write a copy of file_path with pages listing the decrypted values appended to output_path."""
+    # Create a temporary file for the overlay
+    with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as temp_overlay:
+        temp_overlay_path = temp_overlay.name
+
+    try:
+        # Create a new PDF with the decrypted information
+        with metrics.stage("overlay"):
+            create_overlay_pdf(temp_overlay_path, decryption_results)
+
+        # Merge the original PDF with the overlay and save to the decrypted directory
+        with metrics.stage("merge"), atomic_io.file_lock(output_path):
+            merge_pdfs(file_path, temp_overlay_path, output_path)
+    finally:
+        # Clean up the overlay temporary file
+        if os.path.exists(temp_overlay_path):
+            os.unlink(temp_overlay_path)
+
 def create_overlay_pdf(output_path: str, decryption_results: List[Dict[str, str]]):
     """Create a PDF overlay with the decrypted information."""
     buffer = BytesIO()
     c = canvas.Canvas(buffer, pagesize=letter)
 
-    # Set font and size
-    c.setFont("Helvetica", 10)
-
     # Add a title
     c.setFont("Helvetica-Bold", 12)
     c.drawString(50, 750, "Decrypted Information")
-    c.setFont("Helvetica", 10)
 
-    # Add decrypted data
-    y_position = 730
-    for i, result in enumerate(decryption_results):
+    # Add decrypted data, wrapped to the page width and continued on new pages
+    flow = text_layout.TextFlow(c, x=50, y=730, width=letter[0] - 100, top=750,
+                                font_name="Helvetica", font_size=10, leading=15)
+    for result in decryption_results:
         decrypted = result.get("decrypted", "")
         if decrypted:
-            # Handle multi-line content
+            # Multi-line values keep their line breaks
+            flow.write(decrypted)
             if "\n" in decrypted:
-                lines = decrypted.split("\n")
-                for line in lines:
-                    c.drawString(50, y_position, line)
-                    y_position -= 15
-                y_position -= 5  # Extra space between multi-line items
-            else:
-                c.drawString(50, y_position, decrypted)
-                y_position -= 15
-
-            # Check if we need to start a new page
-            if y_position < 50:
-                c.showPage()
-                y_position = 750
-                c.setFont("Helvetica", 10)
+                flow.skip(5)  # Extra space between multi-line items
+    flow.finish()
 
     c.save()
 
     # Write the buffer to the output file
-    with open(output_path, 'wb') as f:
-        f.write(buffer.getvalue())
+    atomic_io.write_bytes(output_path, buffer.getvalue())
 
 def merge_pdfs(original_path: str, overlay_path: str, output_path: str):
     """Merge the original PDF with the overlay containing decrypted information."""
@@ -140,5 +141,5 @@ def merge_pdfs(original_path: str, overlay_path: str, output_path: str):
         output.add_page(page)
 
     # Write the output PDF
-    with open(output_path, 'wb') as output_file:
+    with atomic_io.atomic_write(output_path) as output_file:
         output.write(output_file)
\ No newline at end of file
@@ -0,0 +1,254 @@
+"""
+Admission control for the Python endpoints.
+
+Every admitted endpoint belongs to a priority class: "interactive" (a
+reviewer or the decrypter UI waiting on the answer) or "bulk" (anonymizing
+and categorizing papers). Documents that preflight marks as large are
+moved to the "large" class: the request gives up its bulk slot before it
+queues for a large one, so small documents are never stuck behind large
+ones waiting. Each class has its own concurrency limit and wait queue, so
+bulk traffic can never take the slots interactive calls run in; endpoints
+can additionally be capped on their own.
+
+A request that finds its class or endpoint queue full, or that waits longer
+than the class allows, is rejected at once with 429 and a Retry-After
+estimated from recent service times, instead of piling up behind the
+backlog. Queue time is recorded as the "queue" stage of the endpoint's
+metrics, rejections as pdf_admission_rejected_total.
+
+Usage, below the metrics decorator:
+
+    @router.post("/api/py/review")
+    @metrics.timed_endpoint("review")
+    @admission.admit("review", admission.INTERACTIVE)
+    async def add_review_to_pdf(...):
+"""
+from collections import deque
+from contextvars import ContextVar
+from typing import Deque, Dict, List, Optional
+import asyncio
+import contextlib
+import functools
+import math
+import os
+import time
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+
+from fastapiRouter import metrics
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "1").lower() in ("1", "true", "yes")
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+# Documents preflight marks as large, entered from inside a bulk request
+LARGE = "large"
+
+
+def _parse_limits(value: str) -> Dict[str, int]:
+    """Parse "process-pdf=4,categorize_batch=1" into a dict."""
+    limits = {}
+    for item in value.split(","):
+        if "=" in item:
+            endpoint, limit = item.split("=", 1)
+            limits[endpoint.strip()] = int(limit)
+    return limits
+
+
+# class -> (concurrent requests, queued requests, longest wait in seconds)
+CLASS_LIMITS = {
+    INTERACTIVE: (
+        int(os.getenv("ADMISSION_INTERACTIVE_CONCURRENCY", "16")),
+        int(os.getenv("ADMISSION_INTERACTIVE_QUEUE", "64")),
+        float(os.getenv("ADMISSION_INTERACTIVE_WAIT", "5")),
+    ),
+    BULK: (
+        int(os.getenv("ADMISSION_BULK_CONCURRENCY", "8")),
+        int(os.getenv("ADMISSION_BULK_QUEUE", "32")),
+        float(os.getenv("ADMISSION_BULK_WAIT", "30")),
+    ),
+    LARGE: (
+        int(os.getenv("ADMISSION_LARGE_CONCURRENCY", "1")),
+        int(os.getenv("ADMISSION_LARGE_QUEUE", "8")),
+        float(os.getenv("ADMISSION_LARGE_WAIT", "300")),
+    ),
+}
+
+# endpoint -> concurrent requests, on top of the class limit
+ENDPOINT_LIMITS = {"categorize_batch": 1}
+ENDPOINT_LIMITS.update(_parse_limits(os.getenv("ADMISSION_ENDPOINT_LIMITS", "")))
+
+MAX_RETRY_AFTER = 60
+
+
+class Limiter:
+    """
+    First-come first-served slot counter for the event loop. Unlike
+    asyncio.Semaphore it is not bound to one loop, so module-level
+    instances survive the app being started more than once (tests, reload).
+    """
+
+    __slots__ = ("name", "limit", "max_queue", "active", "service_time", "_waiters")
+
+    def __init__(self, name: str, limit: int, max_queue: int):
+        self.name = name
+        self.limit = max(1, limit)
+        self.max_queue = max(0, max_queue)
+        self.active = 0
+        # Moving average of how long a request holds a slot, for Retry-After
+        self.service_time = 1.0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self, timeout: float) -> Optional[str]:
+        """Take a slot. Returns None when admitted, else why not ("queue_full" or "timeout")."""
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return None
+        if len(self._waiters) >= self.max_queue:
+            return "queue_full"
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            self._discard(future)
+            return "timeout"
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as the client went away
+                self.release()
+            else:
+                self._discard(future)
+            raise
+        return None
+
+    def release(self):
+        # Hand the slot straight to the oldest waiter still waiting
+        while self._waiters:
+            future = self._waiters.popleft()
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    def _discard(self, future: asyncio.Future):
+        try:
+            self._waiters.remove(future)
+        except ValueError:
+            pass
+
+    def observe(self, seconds: float):
+        self.service_time += 0.2 * (seconds - self.service_time)
+
+    def retry_after(self) -> int:
+        """Seconds until the queue in front of a new request has likely drained."""
+        estimate = self.service_time * (self.waiting + 1) / self.limit
+        return min(MAX_RETRY_AFTER, max(1, math.ceil(estimate)))
+
+
+_classes = {name: Limiter(name, limit, queue) for name, (limit, queue, _) in CLASS_LIMITS.items()}
+_endpoints: Dict[str, Limiter] = {}
+
+# Limiters whose slots the current request holds, innermost slot() block
+_held: ContextVar[Optional[List[Limiter]]] = ContextVar("admission_held", default=None)
+
+
+def _endpoint_limiter(endpoint: str, priority: str) -> Optional[Limiter]:
+    if endpoint not in ENDPOINT_LIMITS:
+        return None
+    limiter = _endpoints.get(endpoint)
+    if limiter is None:
+        limiter = _endpoints[endpoint] = Limiter(
+            endpoint, ENDPOINT_LIMITS[endpoint], CLASS_LIMITS[priority][1])
+    return limiter
+
+
+def _reject(endpoint: str, priority: str, limiter: Limiter, reason: str):
+    metrics.increment("pdf_admission_rejected_total", endpoint=endpoint, priority=priority, reason=reason)
+    retry_after = limiter.retry_after()
+    raise HTTPException(
+        status_code=429,
+        detail=f"Too many {priority} requests in progress, retry in {retry_after} s",
+        headers={"Retry-After": str(retry_after)}
+    )
+
+
+@contextlib.asynccontextmanager
+async def slot(endpoint: str, priority: str = INTERACTIVE):
+    """
+    Hold a slot of the priority class and endpoint for the body of an
+    async with block; raises 429 when none frees up in time. admit() uses
+    this for whole handlers; handlers use it directly for work that needs a
+    class of its own, such as large documents.
+    """
+    if not ADMISSION_ENABLED:
+        yield
+        return
+
+    # Endpoint first, so a request waiting for its endpoint does not hold a class slot
+    limiters = [limiter for limiter in (_endpoint_limiter(endpoint, priority), _classes[priority])
+                if limiter is not None]
+    acquired: List[Limiter] = []
+    deadline = time.monotonic() + CLASS_LIMITS[priority][2]
+    token = _held.set(acquired)
+    try:
+        with metrics.stage("queue"):
+            for limiter in limiters:
+                reason = await limiter.acquire(max(0.0, deadline - time.monotonic()))
+                if reason is not None:
+                    _reject(endpoint, priority, limiter, reason)
+                acquired.append(limiter)
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            for limiter in acquired:
+                limiter.observe(elapsed)
+    finally:
+        _held.reset(token)
+        release_held(acquired)
+
+
+def release_held(held: Optional[List[Limiter]] = None):
+    """
+    Give up the slots of the innermost slot() block early, e.g. before
+    waiting for a slot of another class. Leaving the block then releases
+    nothing more.
+    """
+    held = _held.get() if held is None else held
+    while held:
+        held.pop().release()
+
+
+def admit(endpoint: str, priority: str = INTERACTIVE):
+    """
+    Decorator that runs a route handler only once its priority class and
+    endpoint have a free slot. Sync handlers are run in the threadpool, as
+    FastAPI would run them without the decorator.
+    """
+    if priority not in CLASS_LIMITS:
+        raise ValueError(f"Unknown priority class: {priority}")
+
+    def decorator(func):
+        if not ADMISSION_ENABLED:
+            return func
+        is_async = asyncio.iscoroutinefunction(func)
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            async with slot(endpoint, priority):
+                if is_async:
+                    return await func(*args, **kwargs)
+                return await run_in_threadpool(func, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,127 @@
+"""
+Crash-safe file output shared by every PDF writer.
+
+Files are written to a temporary name in the destination directory and
+renamed over the final path once complete, so readers only ever see the
+previous version or the finished new one. file_lock() serializes writers
+of the same path, across threads and (where fcntl exists) across worker
+processes, while writers of different paths run fully in parallel.
+
+Both block, so async handlers call them through run_in_threadpool. The lock
+file a path gets under pdfs/.locks is removed again when its lock is
+released; see _acquire_lock_file().
+"""
+from contextlib import contextmanager
+from typing import Dict, List
+import hashlib
+import os
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: only in-process locking
+    fcntl = None
+
+LOCK_DIR = os.path.join(os.getcwd(), "pdfs", ".locks")
+
+
+def _umask_mode() -> int:
+    # The umask can only be read by setting it; done once at import
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+# Mode open() gives a new file; mkstemp always creates temporary files 0600
+FILE_MODE = _umask_mode()
+
+_registry_lock = threading.Lock()
+# path -> [lock, number of holders and waiters]
+_path_locks: Dict[str, List] = {}
+
+
+@contextmanager
+def atomic_write(path: str, mode: str = "wb"):
+    """
+    Open a temporary file next to path for writing and move it into place
+    when the block finishes without an exception. On error the partial file
+    is removed and path is left untouched.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(
+        dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(temp_path, FILE_MODE)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+
+def write_bytes(path: str, data: bytes):
+    with atomic_write(path) as f:
+        f.write(data)
+
+
+def _acquire_lock_file(lock_path: str) -> int:
+    """
+    Open and flock lock_path. The holder unlinks the file on release, so a
+    waiter that wakes up holding a file that is no longer at lock_path
+    locked a stale inode and tries again with the current one.
+    """
+    while True:
+        fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            held = os.fstat(fd)
+            try:
+                current = os.stat(lock_path)
+            except FileNotFoundError:
+                current = None
+        except BaseException:
+            os.close(fd)
+            raise
+        if current is not None and (current.st_dev, current.st_ino) == (held.st_dev, held.st_ino):
+            return fd
+        os.close(fd)
+
+
+@contextmanager
+def file_lock(path: str):
+    """Exclusive lock for writers of one output path."""
+    key = os.path.abspath(path)
+
+    with _registry_lock:
+        entry = _path_locks.get(key)
+        if entry is None:
+            entry = _path_locks[key] = [threading.Lock(), 0]
+        entry[1] += 1
+
+    try:
+        with entry[0]:
+            if fcntl is None:
+                yield
+            else:
+                # A lock file per path lets uvicorn workers and the ingestion
+                # daemon coordinate without touching the PDF itself
+                os.makedirs(LOCK_DIR, exist_ok=True)
+                lock_path = os.path.join(LOCK_DIR, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".lock")
+                fd = _acquire_lock_file(lock_path)
+                try:
+                    yield
+                finally:
+                    # Unlinked while still locked, so no one can lock it in between
+                    os.unlink(lock_path)
+                    os.close(fd)
+    finally:
+        with _registry_lock:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del _path_locks[key]
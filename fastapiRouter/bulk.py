@@ -0,0 +1,275 @@
+"""
+Offline bulk jobs that call the pipeline directly instead of going through
+the HTTP API. Run from the project root next to the FastAPI app:
+
+    python -m fastapiRouter.bulk anonymize pdfs/ --jobs 8
+    python -m fastapiRouter.bulk categorize pdfs/ --jobs 8
+    python -m fastapiRouter.bulk review pdfs/processed/ --reviews reviews.json
+    python -m fastapiRouter.bulk decrypt pdfs/reviewed/
+    python -m fastapiRouter.bulk add-decrypted pdfs/reviewed/
+
+Outputs are written to the same storage areas the endpoints use, or to
+--output-dir. Every finished file is appended to a JSON-lines manifest
+(bulk-<command>.manifest.jsonl by default); running the same command again
+skips files the manifest records as done and unchanged, so an interrupted
+job resumes where it stopped. A throughput summary is printed at the end.
+
+A directory argument that is one of the storage areas (pdfs/, pdfs/processed,
+...) stands for that area's files only, so pdfs/ means the uploads and not
+the processed, reviewed or stored copies below it. Other directories are
+read one level deep, or entirely with --recursive.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+# command -> (output area, prefix stripped from input names, prefix of output names)
+COMMANDS = {
+    "anonymize": ("processed", "", "processed_"),
+    "categorize": (None, "", None),
+    "review": ("reviewed", "processed_", "reviewed_"),
+    "decrypt": ("decrypted", "", "decrypted_"),
+    "add-decrypted": ("decrypted", "reviewed_", "decrypted_"),
+}
+
+
+def base_name(path: str, prefix: str) -> str:
+    name = os.path.basename(path)
+    return name[len(prefix):] if prefix and name.startswith(prefix) else name
+
+
+def _output_path(command: str, path: str, output_dir: Optional[str]) -> str:
+    from fastapiRouter import storage
+
+    area, input_prefix, output_prefix = COMMANDS[command]
+    store = storage.FlatStorage(output_dir) if output_dir else storage.get(area)
+    return store.path_for_write(output_prefix + base_name(path, input_prefix))
+
+
+def _extract_text(path: str) -> str:
+    from fastapiRouter import categorize
+
+    return categorize.extract_text_from_pdf(path)
+
+
+def anonymize_file(path: str, output_dir: Optional[str], params: Dict) -> Dict:
+    # Imported here so worker processes only load what their command needs
+    import main
+    from fastapiRouter import atomic_io
+
+    modified_pdf, mapping = main.process_pdf_for_ieee(path, main.EncryptionOptions(**params["options"]))
+    output_path = _output_path("anonymize", path, output_dir)
+    with atomic_io.file_lock(output_path):
+        atomic_io.write_bytes(output_path, modified_pdf)
+    return {
+        "output": output_path,
+        "total_replacements": mapping["total_replacements"],
+        "sensitive_data_found": mapping["sensitive_data_found"]
+    }
+
+
+def categorize_file(path: str, output_dir: Optional[str], params: Dict) -> Dict:
+    from fastapiRouter import categorize
+
+    category_scores = categorize.categorize_text(_extract_text(path))
+    return {
+        "primary_category": categorize.get_primary_category(category_scores),
+        "category_scores": category_scores
+    }
+
+
+def review_file(path: str, output_dir: Optional[str], params: Dict) -> Dict:
+    from fastapiRouter import review
+
+    data = params["review"]
+    review_date = datetime.fromisoformat(data["review_date"]) if data.get("review_date") else datetime.now()
+    output_path = _output_path("review", path, output_dir)
+    review.append_review_page(path, output_path, data["review_text"], float(data["review_score"]),
+                              review_date, data["reviewer_email"], data["reviewer_name"])
+    return {"output": output_path}
+
+
+def decrypt_file(path: str, output_dir: Optional[str], params: Dict) -> Dict:
+    from fastapiRouter import atomic_io, decrypt
+
+    _, decryption_results = decrypt.decrypt_content(_extract_text(path))
+    with open(path, "rb") as f:
+        pdf_bytes = f.read()
+    modified_pdf = decrypt.modify_pdf_with_summary(
+        pdf_bytes, decryption_results, os.path.basename(path), replace_originals=params["replace"])
+
+    output_path = _output_path("decrypt", path, output_dir)
+    with atomic_io.file_lock(output_path):
+        atomic_io.write_bytes(output_path, modified_pdf)
+    return {
+        "output": output_path,
+        "total_decrypted": len([item for item in decryption_results if item.ok]),
+        "errors": len([item for item in decryption_results if not item.ok])
+    }
+
+
+def add_decrypted_file(path: str, output_dir: Optional[str], params: Dict) -> Dict:
+    from fastapiRouter import addDecryptedInfo, decrypt
+
+    _, decryption_results = decrypt.decrypt_content(_extract_text(path))
+    decrypted = [item.to_dict() for item in decryption_results if item.ok]
+    if not decrypted:
+        raise ValueError("No encrypted values found")
+
+    output_path = _output_path("add-decrypted", path, output_dir)
+    addDecryptedInfo.append_decrypted_info(path, output_path, decrypted)
+    return {"output": output_path, "total_decrypted": len(decrypted)}
+
+
+WORKERS = {
+    "anonymize": anonymize_file,
+    "categorize": categorize_file,
+    "review": review_file,
+    "decrypt": decrypt_file,
+    "add-decrypted": add_decrypted_file,
+}
+
+
+def run_one(command: str, path: str, output_dir: Optional[str], params: Dict) -> Dict:
+    """Process one file in a pool worker. Always returns a plain, picklable dict."""
+    start = time.perf_counter()
+    stat = os.stat(path)
+    entry = {"path": path, "size": stat.st_size, "mtime": stat.st_mtime}
+    try:
+        entry.update(WORKERS[command](path, output_dir, params))
+        entry["status"] = "ok"
+    except Exception as e:
+        # HTTPException carries its message in detail and does not pickle
+        entry["status"] = "error"
+        entry["error"] = str(getattr(e, "detail", None) or e)
+    entry["seconds"] = round(time.perf_counter() - start, 3)
+    return entry
+
+
+def load_manifest(manifest_path: str) -> Dict[str, Tuple[int, float]]:
+    """Files the manifest records as done, with the size and mtime they had then."""
+    done = {}
+    if not os.path.exists(manifest_path):
+        return done
+    with open(manifest_path) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # A line cut short by an interrupted run
+                continue
+            if entry.get("status") == "ok":
+                done[entry["path"]] = (entry["size"], entry["mtime"])
+            else:
+                done.pop(entry.get("path"), None)
+    return done
+
+
+def is_done(path: str, done: Dict[str, Tuple[int, float]]) -> bool:
+    if path not in done:
+        return False
+    stat = os.stat(path)
+    return done[path] == (stat.st_size, stat.st_mtime)
+
+
+def report(command: str, entries: List[Dict], skipped: int, elapsed: float):
+    ok = [entry for entry in entries if entry["status"] == "ok"]
+    failed = len(entries) - len(ok)
+    megabytes = sum(entry["size"] for entry in ok) / (1024 * 1024)
+    print(f"{command}: {len(ok)} done, {failed} failed, {skipped} skipped (already in manifest) "
+          f"in {elapsed:.1f} s")
+    if ok:
+        seconds = sorted(entry["seconds"] for entry in ok)
+        p95 = statistics.quantiles(seconds, n=20)[18] if len(seconds) > 1 else seconds[0]
+        print(f"throughput: {len(ok) / elapsed:.2f} files/s, {megabytes / elapsed:.2f} MB/s; "
+              f"per file p50 {statistics.median(seconds):.2f} s, p95 {p95:.2f} s")
+
+
+def run(command: str, paths: List[str], output_dir: Optional[str], jobs: int,
+        manifest_path: str, params: Dict, per_file_params: Optional[Dict[str, Dict]] = None):
+    done = load_manifest(manifest_path)
+    pending = [path for path in paths if not is_done(path, done)]
+    skipped = len(paths) - len(pending)
+    print(f"{command}: {len(pending)} files to process with {jobs} workers, {skipped} already done")
+
+    entries = []
+    start = time.perf_counter()
+    pool = ProcessPoolExecutor(max_workers=jobs)
+    try:
+        with open(manifest_path, "a") as manifest:
+            queue = iter(pending)
+            in_flight = set()
+            while True:
+                # Bound the number of submitted tasks so huge inputs are not queued at once
+                for path in queue:
+                    task_params = dict(params, **(per_file_params or {}).get(path, {}))
+                    in_flight.add(pool.submit(run_one, command, path, output_dir, task_params))
+                    if len(in_flight) >= jobs * 2:
+                        break
+                if not in_flight:
+                    break
+
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    entry = future.result()
+                    entries.append(entry)
+                    # One flushed line per file, so an interrupted run loses nothing
+                    manifest.write(json.dumps(entry) + "\n")
+                    manifest.flush()
+                    if entry["status"] != "ok":
+                        print(f"Failed to process {entry['path']}: {entry['error']}")
+                    elif len(entries) % 100 == 0:
+                        print(f"{len(entries)}/{len(pending)} files processed")
+    except KeyboardInterrupt:
+        print("Interrupted, progress is kept in the manifest")
+        pool.shutdown(wait=False, cancel_futures=True)
+    finally:
+        pool.shutdown(wait=True)
+        report(command, entries, skipped, time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run pipeline steps on directories of PDFs without the HTTP API")
+    parser.add_argument("command", choices=list(COMMANDS))
+    parser.add_argument("paths", nargs="+", help="PDF files or directories")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                        help="number of worker processes (default: all cores)")
+    parser.add_argument("--output-dir", help="write output PDFs here instead of the usual pdfs/ area")
+    parser.add_argument("--recursive", action="store_true",
+                        help="also read subdirectories of directories that are not storage areas")
+    parser.add_argument("--manifest", help="progress manifest (default: bulk-<command>.manifest.jsonl)")
+    parser.add_argument("--options", default="{}", help="anonymize: encryption options as JSON")
+    parser.add_argument("--reviews",
+                        help="review: JSON file mapping each paper's filename to review_text, review_score, "
+                             "reviewer_email, reviewer_name and optionally review_date")
+    parser.add_argument("--keep-pages", action="store_true",
+                        help="decrypt: keep the original pages in front of the summary page")
+    args = parser.parse_args()
+
+    from fastapiRouter import storage
+
+    paths = storage.collect_pdfs(args.paths, args.recursive)
+    params = {"options": json.loads(args.options), "replace": not args.keep_pages}
+    per_file_params = None
+
+    if args.command == "review":
+        if not args.reviews:
+            parser.error("review needs --reviews")
+        with open(args.reviews) as f:
+            reviews = json.load(f)
+        prefix = COMMANDS["review"][1]
+        # Only papers with a review are processed
+        paths = [path for path in paths if base_name(path, prefix) in reviews]
+        per_file_params = {path: {"review": reviews[base_name(path, prefix)]} for path in paths}
+
+    if not paths:
+        sys.exit("No PDF files found")
+
+    run(args.command, paths, args.output_dir, args.jobs,
+        args.manifest or f"bulk-{args.command}.manifest.jsonl", params, per_file_params)
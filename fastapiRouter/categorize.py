@@ -1,13 +1,31 @@
+import argparse
+import json
+import logging
 import os
 import re
-from typing import Dict, List
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterable, List, Tuple
 import fitz  # PyMuPDF for PDF text extraction
+import numpy as np
+from scipy import sparse
 from fastapi import APIRouter, Body, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel
+
+from fastapiRouter import admission, atomic_io, content_store, file_index, layout_cache, metrics, preflight, single_flight, storage
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Concurrent categorize requests for the same content share one run
+_categorizing = single_flight.Group("categorize")
 
 PROCESS_DIR = os.path.join(os.getcwd(), "pdfs")
 
+# Files a batch counts per pipeline job, so process-pdf requests run in between
+CATEGORIZE_BATCH_CHUNK = int(os.getenv("CATEGORIZE_BATCH_CHUNK", "4"))
+
 # Define category keywords and their mappings
 CATEGORIES = {
     "Artificial Intelligence and Machine Learning": [
@@ -42,17 +60,54 @@ CATEGORIES = {
     ]
 }
 
+CATEGORY_NAMES = list(CATEGORIES)
+
+# Batch vocabulary: one column per (category, keyword), patterns compiled once
+_TERMS = [
+    (category_index, keyword.lower(), re.compile(r'\b' + re.escape(keyword.lower()) + r'\b'))
+    for category_index, keywords in enumerate(CATEGORIES.values())
+    for keyword in keywords
+]
+
+# Maps term columns onto category columns
+_TERM_CATEGORY = sparse.csr_matrix(
+    (np.ones(len(_TERMS)), (np.arange(len(_TERMS)), [category for category, _, _ in _TERMS])),
+    shape=(len(_TERMS), len(CATEGORY_NAMES))
+)
+
+class BatchCategorizeRequest(BaseModel):
+    pdf_filenames: List[str]
+
+def _extract_text(doc: fitz.Document) -> str:
+    metrics.set_page_count(doc.page_count)
+    text = ""
+    with metrics.stage("extract"):
+        for page in doc:
+            text += page.get_text()
+    return text
+
 def extract_text_from_pdf(pdf_path: str) -> str:
     """Extract text content from a PDF file."""
     try:
-        doc = fitz.open(pdf_path)
-        text = ""
-        for page in doc:
-            text += page.get_text()
-        return text
+        with metrics.stage("parse"):
+            doc = fitz.open(pdf_path)
+        return _extract_text(doc)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to extract text from PDF: {str(e)}")
+
+def _layout_text(digest: str, pdf_path: str) -> str:
+    """Full text from the layout cache, parsing the PDF only on a miss."""
+    try:
+        return layout_cache.get(digest, pdf_path).text
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to extract text from PDF: {str(e)}")
 
+def _text_reader(digest: str, pdf_path: str, verdict: preflight.Verdict) -> Callable[[], str]:
+    # Without a text layer there is nothing to extract or score
+    if verdict.image_only:
+        return lambda: ""
+    return lambda: _layout_text(digest, pdf_path)
+
 def categorize_text(text: str) -> Dict[str, float]:
     """
     Categorize text based on keyword frequency.
@@ -100,29 +155,207 @@ def get_primary_category(scores: Dict[str, float]) -> str:
         # If there are multiple categories with the same score, return them joined
         return " & ".join(top_categories)
 
+def categorize_with_store(digest: str, read_text: Callable[[], str]) -> Dict:
+    """
+    Categorize a document, reusing the stored result for identical content.
+    read_text is only called when there is no stored result.
+    """
+    result = content_store.load_categories(digest)
+    if result is not None:
+        return result
+
+    # Other worker processes categorizing the same content wait here and
+    # then find the stored result
+    with atomic_io.file_lock(content_store.categories_path(digest)):
+        result = content_store.load_categories(digest)
+        if result is not None:
+            return result
+
+        text = read_text()
+        with metrics.stage("score"):
+            category_scores = categorize_text(text)
+
+        result = {
+            "primary_category": get_primary_category(category_scores),
+            "category_scores": category_scores
+        }
+        content_store.save_categories(digest, result)
+    return result
+
+
+async def categorize_coalesced(digest: str, read_text: Callable[[], str]) -> Dict:
+    """categorize_with_store off the event loop, shared by concurrent requests for the same content."""
+    result, _ = await _categorizing.run(digest, categorize_with_store, digest, read_text)
+    return result
+
+def count_terms(text: str) -> Tuple[List[int], List[int]]:
+    """Keyword counts of one document as (term columns, counts), zeros omitted."""
+    text = text.lower()
+    columns, counts = [], []
+    for column, (_, keyword, pattern) in enumerate(_TERMS):
+        # Plain substring search rules out most keywords far faster than the regex
+        if keyword not in text:
+            continue
+        matches = len(pattern.findall(text))
+        if matches:
+            columns.append(column)
+            counts.append(matches)
+    return columns, counts
+
+def term_matrix(rows: List[Tuple[List[int], List[int]]]) -> sparse.csr_matrix:
+    """Stack count_terms() results into a sparse document-term matrix."""
+    lengths = [len(columns) for columns, _ in rows]
+    indptr = np.concatenate(([0], np.cumsum(lengths, dtype=np.int64)))
+    indices = np.fromiter((c for columns, _ in rows for c in columns), dtype=np.int32, count=int(indptr[-1]))
+    data = np.fromiter((n for _, counts in rows for n in counts), dtype=np.float64, count=int(indptr[-1]))
+    return sparse.csr_matrix((data, indices, indptr), shape=(len(rows), len(_TERMS)))
+
+def tfidf_category_scores(counts: sparse.csr_matrix) -> List[Dict[str, float]]:
+    """
+    TF-IDF-weighted category scores for a whole batch, normalized per document
+    to percentages like categorize_text(). Keywords that appear in most of the
+    batch weigh less than ones specific to a few papers; for a single document
+    the result equals categorize_text().
+    """
+    document_count = counts.shape[0]
+    document_frequency = np.bincount(counts.indices, minlength=counts.shape[1])
+    idf = np.log((1 + document_count) / (1 + document_frequency)) + 1
+
+    scores = (counts @ sparse.diags(idf) @ _TERM_CATEGORY).toarray()
+    totals = scores.sum(axis=1, keepdims=True)
+    percentages = np.round(np.divide(scores, totals, out=np.zeros_like(scores), where=totals > 0) * 100, 2)
+
+    results = []
+    for row, total in zip(percentages.tolist(), totals[:, 0]):
+        if total > 0:
+            results.append(dict(zip(CATEGORY_NAMES, row)))
+        else:
+            results.append({category: 0 for category in CATEGORY_NAMES})
+    return results
+
+def categorize_counts(rows: List[Tuple[List[int], List[int]]]) -> List[Dict]:
+    """Categorize a batch from count_terms() rows with TF-IDF weighting."""
+    with metrics.stage("score"):
+        score_list = tfidf_category_scores(term_matrix(rows))
+    return [
+        {"primary_category": get_primary_category(scores), "category_scores": scores}
+        for scores in score_list
+    ]
+
+def categorize_batch(texts: Iterable[str]) -> List[Dict]:
+    """Categorize many documents at once with TF-IDF weighting."""
+    return categorize_counts([count_terms(text) for text in texts])
+
 @router.post("/api/py/categorize")
+@metrics.timed_endpoint("categorize")
+@admission.admit("categorize", admission.BULK)
 async def categorize_pdf(
     pdf_filename: str = Body(..., description="Name of the PDF file to categorize"),
 ):
     # Construct the full path to the PDF file
-    pdf_path = os.path.join(PROCESS_DIR, pdf_filename)
+    pdf_path = storage.get("uploads").path(pdf_filename)
     
     # Check if the PDF file exists
-    print(pdf_path)
     if not os.path.exists(pdf_path):
+        logger.warning("PDF to categorize not found", extra={"pdf": pdf_filename})
         raise HTTPException(status_code=404, detail=f"PDF file '{pdf_filename}' not found")
     
-    # Extract text from PDF
-    text = extract_text_from_pdf(pdf_path)
-    
-    # Get category scores
-    category_scores = categorize_text(text)
-    
-    # Get primary category
-    primary_category = get_primary_category(category_scores)
+    # Identical content is only categorized once
+    with metrics.stage("hash"):
+        digest = await run_in_threadpool(content_store.file_digest, pdf_path)
+
+    verdict = await preflight.check_async(digest, pdf_path)
+    if verdict.rejected:
+        raise HTTPException(status_code=422, detail=f"PDF rejected: {verdict.error}")
+    async with preflight.queue(verdict, "categorize"):
+        result = await categorize_coalesced(digest, _text_reader(digest, pdf_path, verdict))
+    file_index.set_category(pdf_filename, result["primary_category"])
     
     return {
         "pdf_filename": pdf_filename,
-        "primary_category": primary_category,
-        "category_scores": category_scores
-    }
\ No newline at end of file
+        "primary_category": result["primary_category"],
+        "category_scores": result["category_scores"]
+    }
+
+@router.post("/api/py/categorize/batch")
+@metrics.timed_endpoint("categorize_batch")
+@admission.admit("categorize_batch", admission.BULK)
+async def categorize_pdf_batch(request: BatchCategorizeRequest):
+    uploads = storage.get("uploads")
+    found, missing = [], []
+    for pdf_filename in request.pdf_filenames:
+        if uploads.exists(pdf_filename):
+            found.append(pdf_filename)
+        else:
+            missing.append(pdf_filename)
+
+    paths = [uploads.path(name) for name in found]
+    rows, verdicts = [], []
+    for start in range(0, len(paths), CATEGORIZE_BATCH_CHUNK):
+        chunk_rows, chunk_verdicts = await single_flight.run(
+            _count_uploads, paths[start:start + CATEGORIZE_BATCH_CHUNK])
+        rows.extend(chunk_rows)
+        verdicts.extend(chunk_verdicts)
+
+    # Files preflight rejects are reported instead of failing the whole batch
+    rejected = [{"pdf_filename": name, "error": verdict.error}
+                for name, verdict in zip(found, verdicts) if verdict.rejected]
+    found = [name for name, verdict in zip(found, verdicts) if not verdict.rejected]
+
+    documents = []
+    for pdf_filename, result in zip(found, categorize_counts(rows)):
+        file_index.set_category(pdf_filename, result["primary_category"])
+        documents.append({"pdf_filename": pdf_filename, **result})
+
+    return {"documents": documents, "missing": missing, "rejected": rejected}
+
+def _count_uploads(paths: List[str]) -> Tuple[List[Tuple[List[int], List[int]]], List[preflight.Verdict]]:
+    """Term counts of the files preflight accepts, and the verdict for every file."""
+    rows, verdicts = [], []
+    for pdf_path in paths:
+        with metrics.stage("hash"):
+            digest = content_store.file_digest(pdf_path)
+        verdict = preflight.check(digest, pdf_path)
+        verdicts.append(verdict)
+        if not verdict.rejected:
+            rows.append(count_terms(_text_reader(digest, pdf_path, verdict)()))
+    return rows, verdicts
+
+def _count_file(path: str) -> Tuple[List[int], List[int]]:
+    # Runs in a pool worker; only the sparse counts travel back, not the text.
+    # HTTPException does not survive pickling, so report a plain error instead
+    try:
+        text = extract_text_from_pdf(path)
+    except HTTPException as e:
+        raise RuntimeError(e.detail)
+    return count_terms(text)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Categorize a batch of PDFs with TF-IDF keyword scoring")
+    parser.add_argument("paths", nargs="*", help="PDF files or directories (default: the uploads directory)")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                        help="number of text extraction processes (default: all cores)")
+    parser.add_argument("--output", help="write JSON lines here instead of stdout")
+    parser.add_argument("--recursive", action="store_true",
+                        help="also read subdirectories of directories that are not storage areas")
+    args = parser.parse_args()
+
+    # Same selection as the bulk jobs: pdfs/ means the uploads, not the copies below it
+    paths = storage.collect_pdfs(args.paths or [storage.get("uploads").root], args.recursive)
+    rows, scored_paths = [], []
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        futures = [pool.submit(_count_file, path) for path in paths]
+        for path, future in zip(paths, futures):
+            try:
+                rows.append(future.result())
+                scored_paths.append(path)
+            except Exception as e:
+                print(f"Failed to read {path}: {str(e)}", file=sys.stderr)
+
+    output = open(args.output, "w") if args.output else sys.stdout
+    try:
+        for path, result in zip(scored_paths, categorize_counts(rows)):
+            output.write(json.dumps({"pdf_filename": os.path.basename(path), **result}) + "\n")
+    finally:
+        if output is not sys.stdout:
+            output.close()
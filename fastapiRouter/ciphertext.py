@@ -0,0 +1,118 @@
+"""
+Encoding of the encrypted field values written into processed PDFs.
+
+Legacy values are "<iv hex>:<ciphertext hex>" (AES-256-CBC), two characters
+per byte. Compact values are "~" followed by unpadded base64url of a format
+byte and the payload, four characters per three bytes:
+
+    0x01  AES-256-CBC   iv (16) + ciphertext
+    0x02  AES-256-GCM   nonce (12) + ciphertext + tag (16)
+
+GCM is authenticated: a value damaged by text extraction fails the tag check
+before anything is unpadded or decoded, instead of decrypting to garbage.
+CIPHERTEXT_FORMAT selects what is written ("gcm", "cbc" or "hex"); decrypt()
+reads all of them, so documents processed earlier stay readable.
+"""
+import base64
+import binascii
+import os
+from typing import Tuple
+
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import padding
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+PREFIX = "~"
+
+FORMAT_CBC = 0x01
+FORMAT_GCM = 0x02
+
+# CIPHERTEXT_FORMAT value -> (format byte, None for legacy hex), algorithm name
+FORMATS = {
+    "hex": (None, "AES-256-CBC"),
+    "cbc": (FORMAT_CBC, "AES-256-CBC"),
+    "gcm": (FORMAT_GCM, "AES-256-GCM"),
+}
+_ALGORITHMS = {format_byte: algorithm for format_byte, algorithm in FORMATS.values()}
+
+CIPHERTEXT_FORMAT = os.getenv("CIPHERTEXT_FORMAT", "gcm")
+if CIPHERTEXT_FORMAT not in FORMATS:
+    raise ValueError(
+        f"Unknown CIPHERTEXT_FORMAT '{CIPHERTEXT_FORMAT}', expected one of {list(FORMATS)}")
+
+
+def algorithm(fmt: str = CIPHERTEXT_FORMAT) -> str:
+    return FORMATS[fmt][1]
+
+
+def is_encrypted(value: str) -> bool:
+    """Whether value looks like one of the AES encodings (compact or legacy hex)."""
+    return value.startswith(PREFIX) or ":" in value
+
+
+def _cbc_encrypt(key: bytes, plaintext: bytes) -> bytes:
+    iv = os.urandom(16)
+    encryptor = Cipher(algorithms.AES(key), modes.CBC(iv), backend=default_backend()).encryptor()
+    padder = padding.PKCS7(128).padder()
+    padded = padder.update(plaintext) + padder.finalize()
+    return iv + encryptor.update(padded) + encryptor.finalize()
+
+
+def _cbc_decrypt(key: bytes, iv: bytes, ciphertext: bytes) -> bytes:
+    decryptor = Cipher(algorithms.AES(key), modes.CBC(iv), backend=default_backend()).decryptor()
+    padded = decryptor.update(ciphertext) + decryptor.finalize()
+    unpadder = padding.PKCS7(128).unpadder()
+    return unpadder.update(padded) + unpadder.finalize()
+
+
+def encrypt(text: str, key: bytes, fmt: str = CIPHERTEXT_FORMAT) -> str:
+    """Encrypt text with the 32-byte key and encode it in the given format."""
+    format_byte = FORMATS[fmt][0]
+    plaintext = text.encode()
+    if format_byte is None:
+        payload = _cbc_encrypt(key, plaintext)
+        return f"{payload[:16].hex()}:{payload[16:].hex()}"
+
+    header = bytes([format_byte])
+    if format_byte == FORMAT_GCM:
+        nonce = os.urandom(12)
+        # The format byte is authenticated along with the text
+        payload = nonce + AESGCM(key).encrypt(nonce, plaintext, header)
+    else:
+        payload = _cbc_encrypt(key, plaintext)
+    return PREFIX + base64.urlsafe_b64encode(header + payload).rstrip(b"=").decode("ascii")
+
+
+def decrypt(value: str, key: bytes) -> Tuple[str, str]:
+    """Decrypt a value in any supported format. Returns (text, algorithm name)."""
+    if not value.startswith(PREFIX):
+        parts = value.split(":")
+        if len(parts) != 2:
+            raise ValueError("Invalid AES encrypted format")
+        return _cbc_decrypt(key, bytes.fromhex(parts[0]), bytes.fromhex(parts[1])).decode("utf-8"), "AES-256-CBC"
+
+    encoded = value[len(PREFIX):]
+    try:
+        raw = base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4))
+    except (binascii.Error, ValueError):
+        raise ValueError("Invalid base64url in encrypted value")
+    if not raw:
+        raise ValueError("Empty encrypted value")
+
+    format_byte, payload = raw[0], raw[1:]
+    if format_byte == FORMAT_GCM:
+        if len(payload) < 12 + 16:
+            raise ValueError("Truncated AES-GCM value")
+        try:
+            plaintext = AESGCM(key).decrypt(payload[:12], payload[12:], raw[:1])
+        except InvalidTag:
+            raise ValueError("AES-GCM authentication failed, the value is damaged")
+    elif format_byte == FORMAT_CBC:
+        if len(payload) < 32 or len(payload) % 16:
+            raise ValueError("Truncated AES-CBC value")
+        plaintext = _cbc_decrypt(key, payload[:16], payload[16:])
+    else:
+        raise ValueError(f"Unknown encrypted value format {format_byte:#04x}")
+    return plaintext.decode("utf-8"), _ALGORITHMS[format_byte]
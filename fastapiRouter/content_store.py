@@ -0,0 +1,191 @@
+import hashlib
+import json
+import os
+import shutil
+import uuid
+from typing import Dict, Optional, Tuple
+
+from fastapiRouter import atomic_io
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# Content-addressed store: uploads and pipeline results keyed by SHA-256
+STORE_DIR = os.path.join(os.getcwd(), "pdfs", "store")
+OBJECTS_DIR = os.path.join(STORE_DIR, "objects")
+RESULTS_DIR = os.path.join(STORE_DIR, "results")
+# What each published output was made from, by output name
+PUBLISHED_DIR = os.path.join(STORE_DIR, "published")
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+os.makedirs(OBJECTS_DIR, exist_ok=True)
+os.makedirs(RESULTS_DIR, exist_ok=True)
+
+
+def bytes_digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_digest(path: str) -> str:
+    """SHA-256 of a file, read in chunks so large PDFs are not loaded at once."""
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def options_key(options: Dict) -> str:
+    """Stable short key for a set of encryption options."""
+    encoded = json.dumps(options, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode()).hexdigest()[:16]
+
+
+def object_path(digest: str) -> str:
+    return os.path.join(OBJECTS_DIR, digest[:2], f"{digest}.pdf")
+
+
+def _results_dir(digest: str) -> str:
+    return os.path.join(RESULTS_DIR, digest[:2], digest)
+
+
+def copy_file(source_path: str, dest_path: str):
+    """
+    Give dest_path its own copy of the content of source_path.
+
+    The user-facing names in pdfs/ and pdfs/processed are copies, never hard
+    links into the store: other writers (the Next.js routes) may rewrite
+    those files in place, and a shared inode would carry that write into the
+    store object and into every other name deduplicated to it. On
+    filesystems with reflinks (btrfs, XFS) the copy shares its blocks until
+    one side is changed, so identical content is still stored once there.
+    The destination entry is replaced, never written in place.
+    """
+    dest_dir = os.path.dirname(dest_path)
+    temp_path = os.path.join(dest_dir, f".{os.path.basename(dest_path)}.{uuid.uuid4().hex[:12]}.copy")
+    try:
+        if not _reflink(source_path, temp_path):
+            shutil.copyfile(source_path, temp_path)
+        os.replace(temp_path, dest_path)
+    finally:
+        if os.path.lexists(temp_path):
+            os.unlink(temp_path)
+
+
+# ioctl request of FICLONE on Linux
+_FICLONE = 0x40049409
+
+
+def _reflink(source_path: str, dest_path: str) -> bool:
+    """Clone source_path into a new dest_path when the filesystem supports it."""
+    if fcntl is None:
+        return False
+    with open(source_path, "rb") as source, open(dest_path, "wb") as dest:
+        try:
+            fcntl.ioctl(dest.fileno(), _FICLONE, source.fileno())
+            return True
+        except OSError:
+            return False
+
+
+def add_object(temp_path: str, digest: str) -> str:
+    """
+    Move a freshly written upload into the store. When the content is
+    already stored the new copy is discarded. Returns the object path.
+    """
+    path = object_path(digest)
+    if os.path.exists(path):
+        os.unlink(temp_path)
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(temp_path, path)
+    return path
+
+
+def processed_path(digest: str, key: str) -> str:
+    """Where the anonymized output for this content and options key is stored."""
+    return os.path.join(_results_dir(digest), f"processed-{key}.pdf")
+
+
+def load_processed(digest: str, key: str) -> Optional[Tuple[str, Dict]]:
+    """Return (processed pdf path, mapping) for a previous run with the same options."""
+    base = processed_path(digest, key)[:-len(".pdf")]
+    try:
+        with open(base + ".json", "r", encoding="utf-8") as f:
+            mapping = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not os.path.exists(base + ".pdf"):
+        return None
+    return base + ".pdf", mapping
+
+
+def save_processed(digest: str, key: str, pdf_bytes: bytes, mapping: Dict) -> str:
+    """Store an anonymized output and its mapping. Returns the stored pdf path."""
+    base = processed_path(digest, key)[:-len(".pdf")]
+    atomic_io.write_bytes(base + ".pdf", pdf_bytes)
+    # The mapping is written last; its presence marks the entry as complete
+    atomic_io.write_bytes(base + ".json", json.dumps(mapping).encode("utf-8"))
+    return base + ".pdf"
+
+
+def categories_path(digest: str) -> str:
+    return os.path.join(_results_dir(digest), "categories.json")
+
+
+def preflight_path(digest: str) -> str:
+    return os.path.join(_results_dir(digest), "preflight.json")
+
+
+def preview_path(digest: str, dpi: int, fmt: str) -> str:
+    """First-page image of a PDF; digest is the hash of the PDF shown."""
+    return os.path.join(_results_dir(digest), f"preview-{dpi}.{fmt}")
+
+
+def load_categories(digest: str) -> Optional[Dict]:
+    path = categories_path(digest)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_categories(digest: str, result: Dict):
+    path = categories_path(digest)
+    atomic_io.write_bytes(path, json.dumps(result).encode("utf-8"))
+
+
+def published_path(name: str) -> str:
+    key = hashlib.sha256(name.encode("utf-8")).hexdigest()
+    return os.path.join(PUBLISHED_DIR, key[:2], f"{key}.json")
+
+
+def load_published(name: str) -> Optional[Dict]:
+    """The record save_published() wrote for an output name, if any."""
+    try:
+        with open(published_path(name), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_published(name: str, record: Dict):
+    atomic_io.write_bytes(published_path(name), json.dumps(record).encode("utf-8"))
+
+
+def load_layout(digest: str) -> Optional[bytes]:
+    path = os.path.join(_results_dir(digest), "layout.bin")
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def save_layout(digest: str, data: bytes):
+    path = os.path.join(_results_dir(digest), "layout.bin")
+    atomic_io.write_bytes(path, data)
@@ -3,20 +3,23 @@ from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 import re
 import base64
+import logging
 import os
 import io
 import shutil
-from typing import List, Dict, Optional
-from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
-from cryptography.hazmat.primitives import padding
-from cryptography.hazmat.backends import default_backend
+from datetime import datetime
+from typing import List, Dict, Optional, Tuple
 from reportlab.lib.pagesizes import letter
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib import colors
 from PyPDF2 import PdfReader, PdfWriter
 
+from fastapiRouter import admission, atomic_io, ciphertext, metrics, storage
+from fastapiRouter.entities import DecryptedItem
+
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 # Define a simple encryption key (use the default key for all decryptions)
 ENCRYPTION_KEY = os.getenv(
@@ -29,19 +32,41 @@ DECRYPTED_PDF_DIR = "./pdfs/decrypted"
 os.makedirs(DECRYPTED_PDF_DIR, exist_ok=True)
 
 
+# Styles of the summary page, built once instead of on every request
+_styles = getSampleStyleSheet()
+TITLE_STYLE = ParagraphStyle(
+    'TitleStyle',
+    parent=_styles['Heading1'],
+    fontSize=14,
+    spaceAfter=12
+)
+NORMAL_STYLE = _styles['Normal']
+HEADER_STYLE = ParagraphStyle(
+    'HeaderStyle',
+    parent=_styles['Heading2'],
+    fontSize=12,
+    spaceAfter=6
+)
+SUMMARY_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('WORDWRAP', (1, 1), (2, -1), True)
+])
+
+
 class DecryptRequest(BaseModel):
     pdfFileContent: str
     fileName: Optional[str] = None
     replaceWithNewPage: Optional[bool] = True
 
 
-class DecryptedItem:
-    def __init__(self, encrypted: str, decrypted: str, method: str = None):
-        self.encrypted = encrypted
-        self.decrypted = decrypted
-        self.method = method
-
-
 def simple_decrypt(encrypted_text: str) -> str:
     """Simple XOR decryption with Base64 encoding."""
     try:
@@ -66,77 +91,43 @@ def simple_decrypt(encrypted_text: str) -> str:
         raise ValueError(f"Decryption error: {str(e)}")
 
 
-def aes_decrypt(encrypted_text: str) -> str:
-    """AES-256-CBC decryption for colon-separated format."""
+def aes_decrypt_with_method(encrypted_text: str) -> Tuple[str, str]:
+    """AES-256 decryption of a compact or legacy hex value. Returns (text, method)."""
     try:
-        # Get encryption key
-        enc_key = encryption_key
-
-        # Split the IV and ciphertext
-        parts = encrypted_text.split(':')
-        if len(parts) != 2:
-            raise ValueError("Invalid AES encrypted format")
-
-        iv = bytes.fromhex(parts[0])
-        ciphertext = bytes.fromhex(parts[1])
-
-        # Create cipher
-        cipher = Cipher(algorithms.AES(enc_key),
-                        modes.CBC(iv), backend=default_backend())
-        decryptor = cipher.decryptor()
-
-        # Decrypt
-        padded_data = decryptor.update(ciphertext) + decryptor.finalize()
-
-        # Unpad
-        unpadder = padding.PKCS7(128).unpadder()
-        data = unpadder.update(padded_data) + unpadder.finalize()
-
-        return data.decode('utf-8')
+        return ciphertext.decrypt(encrypted_text, encryption_key)
     except Exception as e:
         raise ValueError(f"AES decryption error: {str(e)}")
 
 
-def create_decryption_summary_page(decryption_results: List[Dict], file_name: str) -> bytes:
+def aes_decrypt(encrypted_text: str) -> str:
+    """AES-256 decryption for the compact "~..." and colon-separated hex formats."""
+    return aes_decrypt_with_method(encrypted_text)[0]
+
+
+def create_decryption_summary_page(decryption_results: List[DecryptedItem], file_name: str) -> bytes:
     """Create a PDF page with decryption summary."""
     buffer = io.BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=letter)
-    styles = getSampleStyleSheet()
-
-    # Create custom styles
-    title_style = ParagraphStyle(
-        'TitleStyle',
-        parent=styles['Heading1'],
-        fontSize=14,
-        spaceAfter=12
-    )
-
-    normal_style = styles['Normal']
-    header_style = ParagraphStyle(
-        'HeaderStyle',
-        parent=styles['Heading2'],
-        fontSize=12,
-        spaceAfter=6
-    )
 
     # Build content
     content = []
 
     # Title
     content.append(
-        Paragraph(f"Decryption Summary for {file_name}", title_style))
+        Paragraph(f"Decryption Summary for {file_name}", TITLE_STYLE))
     content.append(Spacer(1, 12))
 
     # File info
-    content.append(Paragraph(f"Original File: {file_name}", normal_style))
+    content.append(Paragraph(f"Original File: {file_name}", NORMAL_STYLE))
     content.append(
-        Paragraph(f"Total Items Decrypted: {len(decryption_results)}", normal_style))
+        Paragraph(f"Total Items Decrypted: {len(decryption_results)}", NORMAL_STYLE))
+    # Same format as the output of `date`, without starting a subprocess
     content.append(
-        Paragraph(f"Decryption Date: {os.popen('date').read().strip()}", normal_style))
+        Paragraph(f"Decryption Date: {datetime.now().astimezone().strftime('%a %b %d %H:%M:%S %Z %Y')}", NORMAL_STYLE))
     content.append(Spacer(1, 12))
 
     # Decrypted items
-    content.append(Paragraph("Decrypted Information", header_style))
+    content.append(Paragraph("Decrypted Information", HEADER_STYLE))
 
     # Create table data
     table_data = [["Item #", "Encrypted Value", "Decrypted Value", "Method"]]
@@ -144,25 +135,14 @@ def create_decryption_summary_page(decryption_results: List[Dict], file_name: st
     for i, item in enumerate(decryption_results, 1):
         table_data.append([
             str(i),
-            item.get("encrypted", ""),
-            item.get("decrypted", ""),
-            item.get("method", "")
+            item.encrypted,
+            item.decrypted or "",
+            item.method or ""
         ])
 
     # Create table
     table = Table(table_data, colWidths=[40, 150, 250, 60])
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('WORDWRAP', (1, 1), (2, -1), True)
-    ]))
+    table.setStyle(SUMMARY_TABLE_STYLE)
 
     content.append(table)
 
@@ -172,7 +152,7 @@ def create_decryption_summary_page(decryption_results: List[Dict], file_name: st
     return buffer.getvalue()
 
 
-def modify_pdf_with_summary(pdf_content: str, decryption_results: List[Dict], file_name: str,
+def modify_pdf_with_summary(pdf_content: str, decryption_results: List[DecryptedItem], file_name: str,
                             replace_originals: bool = True) -> bytes:
     """Modifies the PDF by adding a summary page and optionally removing original pages."""
     try:
@@ -210,145 +190,147 @@ def modify_pdf_with_summary(pdf_content: str, decryption_results: List[Dict], fi
         raise Exception(f"Error modifying PDF: {str(e)}")
 
 
+def decrypt_content(content: str) -> Tuple[str, List[DecryptedItem]]:
+    """
+    Decrypt every "Encrypted: [...]" value in text extracted from a processed
+    PDF. Returns the text with those values replaced by "Decrypted: ..." and
+    one DecryptedItem per value. Values that fail to decrypt are reported with
+    an error instead of aborting the whole document.
+    """
+    # Improved pattern to match encrypted strings
+    # Look for "Encrypted:" followed by content until next keyword or end of content
+    pattern = r'Encrypted:\s*\[(.*?)\]'
+    matches = re.finditer(pattern, content, re.DOTALL)
+
+    # Store decryption results
+    decryption_results: List[DecryptedItem] = []
+
+    # Process each encrypted value
+    for match in matches:
+        try:
+            # Get the full encrypted text and strip any extra whitespace
+            encrypted_raw = match.group(1).strip()
+
+            # Remove \r\n characters
+            encrypted_raw = encrypted_raw.replace('\r', '').replace('\n', '').replace('----------------Page', '')
+            # A value continued on the next page has that page's header in between
+            encrypted_raw = encrypted_raw.replace('ENCRYPTED INFORMATION (CONTINUED)', '')
+
+            # Handle case where there might be multiple hex strings
+            # Split by whitespace and process each part that looks like encryption
+            parts = encrypted_raw.split()
+            encrypted_values = []
+
+            # Look for parts that match encryption patterns
+            for part in parts:
+                # Check if it matches an AES format (compact or hex) or base64 format
+                if ciphertext.is_encrypted(part) or re.match(r'^[A-Za-z0-9+/=]+$', part):
+                    encrypted_values.append(part)
+
+            # If we found multiple encrypted values, process each one
+            if len(encrypted_values) > 1:
+                decrypted_results = []
+                for enc_val in encrypted_values:
+                    try:
+                        if ciphertext.is_encrypted(enc_val):
+                            dec_val, method = aes_decrypt_with_method(enc_val)
+                        else:
+                            # Simple XOR format
+                            dec_val = simple_decrypt(enc_val)
+                            method = "XOR"
+                        decrypted_results.append(dec_val)
+
+                        # Add individual result to tracking
+                        decryption_results.append(DecryptedItem(enc_val, dec_val, method))
+                    except Exception as e:
+                        logger.debug("Could not decrypt part of a value", extra={"error": str(e)})
+
+                # Replace in content with all decrypted values
+                all_decrypted = " ".join(decrypted_results)
+                # The entire "Encrypted: value" text
+                full_match = match.group(0)
+                content = content.replace(
+                    full_match, f"Decrypted: {all_decrypted}")
+
+            else:
+                # Process as a single encrypted value
+                encrypted = encrypted_raw
+
+                # Determine decryption method based on format
+                if ciphertext.is_encrypted(encrypted):
+                    decrypted, method = aes_decrypt_with_method(encrypted)
+                else:
+                    # Simple XOR format
+                    decrypted = simple_decrypt(encrypted)
+                    method = "XOR"
+
+                # Replace the encrypted value with the decrypted value in the content
+                # The entire "Encrypted: value" text
+                full_match = match.group(0)
+                content = content.replace(
+                    full_match, f"Decrypted: {decrypted}")
+
+                # Add to results
+                decryption_results.append(DecryptedItem(encrypted, decrypted, method))
+        except Exception as e:
+            # Log the error but continue with other encryptions
+            logger.debug("Could not decrypt value", extra={"error": str(e)})
+            decryption_results.append(DecryptedItem(match.group(1), error=str(e)))
+
+    return content, decryption_results
+
+
 @router.post("/api/py/decrypt")
+@metrics.timed_endpoint("decrypt")
+@admission.admit("decrypt", admission.INTERACTIVE)
 def decrypt_pdf_content(request: DecryptRequest):
     try:
         content = request.pdfFileContent
         file_name = request.fileName or "unknown_file.pdf"
         replace_with_new_page = request.replaceWithNewPage
 
-        print(f"Decrypting content for {file_name}...")
-
-        # Improved pattern to match encrypted strings
-        # Look for "Encrypted:" followed by content until next keyword or end of content
-        pattern = r'Encrypted:\s*\[(.*?)\]'
-        matches = re.finditer(pattern, content, re.DOTALL)
-
-        # Store decryption results
-        decryption_results = []
-
-        # Process each encrypted value
-        for match in matches:
-            try:
-                # Get the full encrypted text and strip any extra whitespace
-                encrypted_raw = match.group(1).strip()
-
-                # Remove \r\n characters
-                encrypted_raw = encrypted_raw.replace('\r', '').replace('\n', '').replace('----------------Page', '')
-
-                # Handle case where there might be multiple hex strings
-                # Split by whitespace and process each part that looks like encryption
-                parts = encrypted_raw.split()
-                encrypted_values = []
-
-                # Look for parts that match encryption patterns
-                for part in parts:
-                    # Check if it matches AES format (contains colon) or base64 format
-                    if ':' in part or re.match(r'^[A-Za-z0-9+/=]+$', part):
-                        encrypted_values.append(part)
-
-                # If we found multiple encrypted values, process each one
-                if len(encrypted_values) > 1:
-                    decrypted_results = []
-                    for enc_val in encrypted_values:
-                        try:
-                            if ':' in enc_val:
-                                # AES format with IV:ciphertext
-                                dec_val = aes_decrypt(enc_val)
-                                method = "AES-256-CBC"
-                            else:
-                                # Simple XOR format
-                                dec_val = simple_decrypt(enc_val)
-                                method = "XOR"
-                            decrypted_results.append(dec_val)
-
-                            # Add individual result to tracking
-                            decryption_results.append({
-                                "encrypted": enc_val,
-                                "decrypted": dec_val,
-                                "method": method
-                            })
-                        except Exception as e:
-                            print(f"Error decrypting part {enc_val}: {str(e)}")
-
-                    # Replace in content with all decrypted values
-                    all_decrypted = " ".join(decrypted_results)
-                    # The entire "Encrypted: value" text
-                    full_match = match.group(0)
-                    content = content.replace(
-                        full_match, f"Decrypted: {all_decrypted}")
+        logger.info("Decrypting content", extra={"pdf": file_name, "chars": len(content)})
 
-                else:
-                    # Process as a single encrypted value
-                    encrypted = encrypted_raw
-
-                    # Determine decryption method based on format
-                    if ':' in encrypted:
-                        # AES format with IV:ciphertext
-                        decrypted = aes_decrypt(encrypted)
-                        method = "AES-256-CBC"
-                    else:
-                        # Simple XOR format
-                        decrypted = simple_decrypt(encrypted)
-                        method = "XOR"
-
-                    # Replace the encrypted value with the decrypted value in the content
-                    # The entire "Encrypted: value" text
-                    full_match = match.group(0)
-                    content = content.replace(
-                        full_match, f"Decrypted: {decrypted}")
-
-                    # Add to results
-                    decryption_results.append({
-                        "encrypted": encrypted,
-                        "decrypted": decrypted,
-                        "method": method
-                    })
-            except Exception as e:
-                # Log the error but continue with other encryptions
-                print(f"Error decrypting {match.group(1)}: {str(e)}")
-                decryption_results.append({
-                    "encrypted": match.group(1),
-                    "error": str(e)
-                })
+        content, decryption_results = decrypt_content(content)
 
         # Create modified PDF with summary page
         try:
             # Generate a new PDF with just the summary page or append it
-            modified_pdf = modify_pdf_with_summary(
-                content,
-                decryption_results,
-                file_name,
-                replace_originals=replace_with_new_page
-            )
+            with metrics.stage("summary_page"):
+                modified_pdf = modify_pdf_with_summary(
+                    content,
+                    decryption_results,
+                    file_name,
+                    replace_originals=replace_with_new_page
+                )
 
             # Create the output filename
             base_name = os.path.basename(file_name)
             output_filename = f"decrypted_{base_name}"
-            output_path = os.path.join(DECRYPTED_PDF_DIR, output_filename)
+            output_path = storage.get("decrypted").path_for_write(output_filename)
 
             # Save the modified PDF to the decrypted folder
-            with open(output_path, "wb") as f:
-                f.write(modified_pdf)
+            with metrics.stage("write"), atomic_io.file_lock(output_path):
+                atomic_io.write_bytes(output_path, modified_pdf)
 
             # Create a relative download URL
             download_url = f"/api/download?file={output_filename}"
 
         except Exception as e:
-            print(f"Error creating modified PDF: {str(e)}")
+            logger.warning("Could not create the decrypted PDF", extra={"pdf": file_name, "error": str(e)})
             # Fallback to original method
             download_url = "/api/download?file=decrypted_content.pdf"
 
         return JSONResponse({
             "success": True,
             "decrypted_content": content if not replace_with_new_page else "Summary page created",
-            "decryption_results": decryption_results,
-            "total_decrypted": len([r for r in decryption_results if "decrypted" in r]),
+            "decryption_results": [item.to_dict() for item in decryption_results],
+            "total_decrypted": len([item for item in decryption_results if item.ok]),
             "download_url": download_url
         })
 
     except Exception as e:
-        print(e)
+        logger.exception("Decryption failed")
         return JSONResponse(
             status_code=500,
             content={
@@ -0,0 +1,100 @@
+"""
+Compact records for the values the pipeline extracts, encrypts and decrypts.
+
+These replace the dict-of-lists author info and the single-key nested dicts
+that used to be passed around. The JSON shapes the API returns are unchanged;
+use to_dict() at the boundary.
+"""
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, Optional
+
+
+class UniqueList:
+    """
+    Ordered collection that ignores values it already holds. Backed by a
+    dict (insertion-ordered hash set), so membership checks do not scan.
+    """
+
+    __slots__ = ("_items",)
+
+    def __init__(self, items: Iterable[str] = ()):
+        self._items: Dict[str, None] = dict.fromkeys(items)
+
+    def add(self, item: str) -> bool:
+        """Append item unless already present. Returns whether it was added."""
+        if item in self._items:
+            return False
+        self._items[item] = None
+        return True
+
+    def truncate(self, length: int):
+        """Keep only the first length items."""
+        for item in list(self._items)[length:]:
+            del self._items[item]
+
+    def __contains__(self, item) -> bool:
+        return item in self._items
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._items)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __bool__(self) -> bool:
+        return bool(self._items)
+
+    def __eq__(self, other) -> bool:
+        return list(self._items) == list(other)
+
+    def __repr__(self) -> str:
+        return f"UniqueList({list(self._items)!r})"
+
+
+@dataclass(slots=True)
+class AuthorInfo:
+    """Sensitive values found in the header of a paper."""
+    names: UniqueList = field(default_factory=UniqueList)
+    emails: UniqueList = field(default_factory=UniqueList)
+    affiliations: UniqueList = field(default_factory=UniqueList)
+    title: str = ""
+
+    def to_dict(self) -> Dict:
+        return {
+            "names": list(self.names),
+            "emails": list(self.emails),
+            "affiliations": list(self.affiliations),
+            "title": self.title
+        }
+
+
+@dataclass(slots=True)
+class EncryptedField:
+    """One encrypted value; kind is name, email, affiliation or title."""
+    kind: str
+    original: str
+    encrypted: str
+    algorithm: str = "AES-256-CBC"
+
+    def to_dict(self) -> Dict:
+        # Shape of mapping["encrypted_data"] entries returned by /api/py/process-pdf
+        return {self.kind: {"original": self.original, "encrypted": self.encrypted,
+                            "algorithm": self.algorithm}}
+
+
+@dataclass(slots=True)
+class DecryptedItem:
+    """Outcome of decrypting one value: decrypted and method on success, error otherwise."""
+    encrypted: str
+    decrypted: Optional[str] = None
+    method: Optional[str] = None
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def to_dict(self) -> Dict:
+        if self.error is not None:
+            return {"encrypted": self.encrypted, "error": self.error}
+        return {"encrypted": self.encrypted, "decrypted": self.decrypted, "method": self.method}
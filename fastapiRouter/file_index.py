@@ -0,0 +1,323 @@
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional
+import logging
+import os
+import sys
+import threading
+import time
+
+from fastapiRouter import storage, watcher
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Storage areas covered by the index and the filename prefix each one adds
+AREAS = {
+    "uploads": "",
+    "processed": "processed_",
+    "reviewed": "reviewed_",
+}
+
+SORT_KEYS = ("name", "mtime", "size")
+
+# Keep the index current from filesystem events in addition to the ingestion paths
+FILE_INDEX_WATCH = os.getenv("FILE_INDEX_WATCH", "1").lower() in ("1", "true", "yes")
+# Seconds between full rescans with the sharded layout, whose shard directories are not watched
+FILE_INDEX_RESCAN = float(os.getenv("FILE_INDEX_RESCAN", "300"))
+
+
+class FileEntry:
+    __slots__ = ("name", "size", "mtime")
+
+    def __init__(self, name: str, size: int, mtime: float):
+        self.name = name
+        self.size = size
+        self.mtime = mtime
+
+    def sort_key(self, key: str):
+        if key == "name":
+            return self.name
+        return (getattr(self, key), self.name)
+
+
+class AreaIndex:
+    """Entries of one directory kept pre-sorted by every supported key."""
+
+    def __init__(self, entries: Iterable[FileEntry] = ()):
+        self.entries: Dict[str, FileEntry] = {entry.name: entry for entry in entries}
+        # Sorted once when built from a scan; insort per entry would be quadratic
+        self.sorted: Dict[str, List] = {
+            key: sorted((entry.sort_key(key), entry.name) for entry in self.entries.values())
+            for key in SORT_KEYS
+        }
+
+    def put(self, entry: FileEntry):
+        self.remove(entry.name)
+        self.entries[entry.name] = entry
+        for key, items in self.sorted.items():
+            insort(items, (entry.sort_key(key), entry.name))
+
+    def remove(self, name: str):
+        entry = self.entries.pop(name, None)
+        if entry is None:
+            return
+        for key, items in self.sorted.items():
+            item = (entry.sort_key(key), name)
+            i = bisect_left(items, item)
+            if i < len(items) and items[i] == item:
+                del items[i]
+
+    def page(self, sort: str, descending: bool, offset: int, limit: int) -> List[FileEntry]:
+        items = self.sorted[sort]
+        if descending:
+            end = len(items) - offset
+            window = reversed(items[max(0, end - limit):max(0, end)])
+        else:
+            window = items[offset:offset + limit]
+        return [self.entries[name] for _, name in window]
+
+
+class FileIndex:
+    """
+    In-memory index over the upload, processed and reviewed directories.
+
+    Ingestion paths call record() after writing a file; a background watcher
+    picks up changes made by anything else (the Next.js routes, manual copies).
+    The initial scan runs in a thread of its own; files recorded before it
+    finishes are applied on top of it, and listings wait for it.
+
+    With the sharded layout only the area roots are watched, where the
+    Next.js upload routes write, and files placed in the shard directories
+    by anything other than the ingestion paths show up at the next full
+    rescan, every FILE_INDEX_RESCAN seconds.
+
+    Categories are kept in memory only. They are not rebuilt from the
+    content store on startup, since that would mean hashing every upload;
+    a file shows its category again once it is categorized after a restart.
+    """
+
+    def __init__(self, areas: Dict[str, str]):
+        # area -> (storage, filename prefix)
+        self.areas = {area: (storage.get(area), prefix) for area, prefix in areas.items()}
+        self._lock = threading.Lock()
+        self._indexes = {area: AreaIndex() for area in areas}
+        # Category per base filename, as reported by the categorization paths
+        self._categories: Dict[str, str] = {}
+        self._thread: Optional[threading.Thread] = None
+        self.ready = threading.Event()
+        # Paths recorded while the initial scan runs
+        self._pending: List[str] = []
+        # Paths recorded while a rescan runs, applied again on top of it
+        self._replay: Optional[List[str]] = None
+
+    def _area_for(self, path: str) -> Optional[str]:
+        for area, (store, _) in self.areas.items():
+            if store.owns(path):
+                return area
+        return None
+
+    def scan(self):
+        for area, (store, _) in self.areas.items():
+            entries = []
+            for item in store.iter_files():
+                if watcher.is_candidate(item.path):
+                    try:
+                        stat = item.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append(FileEntry(item.name, stat.st_size, stat.st_mtime))
+            index = AreaIndex(entries)
+            with self._lock:
+                self._indexes[area] = index
+
+    def build(self):
+        """Initial scan, then the files recorded meanwhile, then the watcher."""
+        try:
+            self.scan()
+        except Exception:
+            logger.exception("File index scan failed")
+        with self._lock:
+            pending, self._pending = self._pending, []
+            self.ready.set()
+        for path in pending:
+            self.record(path)
+        if FILE_INDEX_WATCH:
+            self.start_watching()
+
+    def record(self, path: str):
+        """Add, refresh or drop the entry for path depending on whether it exists."""
+        area = self._area_for(path)
+        if area is None or not watcher.is_candidate(path):
+            return
+        if not self.ready.is_set():
+            with self._lock:
+                if not self.ready.is_set():
+                    # The scan may already have passed this file; applied when it is done
+                    self._pending.append(path)
+                    return
+        name = os.path.basename(path)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._indexes[area].remove(name)
+                if self._replay is not None:
+                    self._replay.append(path)
+            return
+        with self._lock:
+            self._indexes[area].put(FileEntry(name, stat.st_size, stat.st_mtime))
+            if self._replay is not None:
+                self._replay.append(path)
+
+    def rescan(self):
+        """Full scan while serving the current index, then the files recorded meanwhile."""
+        with self._lock:
+            self._replay = []
+        try:
+            self.scan()
+        finally:
+            with self._lock:
+                replay, self._replay = self._replay, None
+        for path in replay:
+            self.record(path)
+
+    def set_category(self, filename: str, category: str):
+        with self._lock:
+            self._categories[filename] = category
+
+    def base_name(self, area: str, name: str) -> str:
+        prefix = self.areas[area][1]
+        return name[len(prefix):] if prefix and name.startswith(prefix) else name
+
+    def status(self, base: str) -> str:
+        # Caller holds the lock
+        if f"reviewed_{base}" in self._indexes["reviewed"].entries:
+            return "reviewed"
+        if f"processed_{base}" in self._indexes["processed"].entries:
+            return "processed"
+        return "uploaded"
+
+    def listing(self, area: str, sort: str, descending: bool, offset: int, limit: int) -> Dict:
+        with self._lock:
+            index = self._indexes[area]
+            files = []
+            for entry in index.page(sort, descending, offset, limit):
+                base = self.base_name(area, entry.name)
+                files.append({
+                    "name": entry.name,
+                    "size": entry.size,
+                    "mtime": entry.mtime,
+                    "status": self.status(base),
+                    "category": self._categories.get(base)
+                })
+            return {"total": len(index.entries), "files": files}
+
+    def start_watching(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._watch, name="file-index-watcher", daemon=True)
+        self._thread.start()
+
+    def _watch(self):
+        stores = [store for store, _ in self.areas.values()]
+        if not any(store.sharded for store in stores):
+            source = watcher.create_watcher(stores)
+            try:
+                while True:
+                    for path in source.read(timeout=1.0):
+                        self.record(path)
+            except Exception:
+                logger.exception("File index watcher stopped")
+            finally:
+                source.close()
+            return
+
+        # Polling every shard directory each second is too costly, so watch
+        # the roots and rescan everything now and then
+        source = None
+        if sys.platform.startswith("linux"):
+            try:
+                source = watcher.InotifyWatcher([store.root for store in stores])
+            except (OSError, AttributeError) as e:
+                logger.warning("inotify unavailable (%s), relying on rescans only", e)
+        next_rescan = time.monotonic() + FILE_INDEX_RESCAN
+        try:
+            while True:
+                timeout = max(0.0, next_rescan - time.monotonic())
+                if source is None:
+                    time.sleep(timeout)
+                else:
+                    for path in source.read(timeout=min(timeout, 1.0)):
+                        self.record(path)
+                if time.monotonic() >= next_rescan:
+                    try:
+                        self.rescan()
+                    except Exception:
+                        logger.exception("File index rescan failed")
+                    next_rescan = time.monotonic() + FILE_INDEX_RESCAN
+        except Exception:
+            logger.exception("File index watcher stopped")
+        finally:
+            if source is not None:
+                source.close()
+
+
+_index: Optional[FileIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_index() -> FileIndex:
+    """The index, with its scan started in the background on first use."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                index = FileIndex(AREAS)
+                threading.Thread(target=index.build, name="file-index-scan", daemon=True).start()
+                _index = index
+    return _index
+
+
+def start():
+    """Start the initial scan at application startup rather than on the first request."""
+    get_index()
+
+
+def record(path: str):
+    """Notify the index about a file written by an ingestion path."""
+    get_index().record(path)
+
+
+def set_category(filename: str, category: str):
+    get_index().set_category(filename, category)
+
+
+@router.get("/api/py/files")
+async def list_files(
+    area: str = Query("uploads", description="uploads, processed or reviewed"),
+    sort: str = Query("mtime", description="name, mtime or size"),
+    order: str = Query("desc", description="asc or desc"),
+    page: int = Query(1, ge=1),
+    page_size: int = Query(50, ge=1, le=500)
+):
+    if area not in AREAS:
+        raise HTTPException(status_code=400, detail=f"Unknown area '{area}'")
+    if sort not in SORT_KEYS:
+        raise HTTPException(status_code=400, detail=f"Unknown sort key '{sort}'")
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail=f"Unknown order '{order}'")
+
+    index = get_index()
+    if not index.ready.is_set():
+        await run_in_threadpool(index.ready.wait)
+    result = index.listing(area, sort, order == "desc", (page - 1) * page_size, page_size)
+    return {
+        "area": area,
+        "sort": sort,
+        "order": order,
+        "page": page,
+        "page_size": page_size,
+        **result
+    }
@@ -0,0 +1,155 @@
+"""
+Known institution and department names, matched in one pass over the text.
+
+The names come from a plain text file (AFFILIATION_GAZETTEER, by default
+affiliations.txt next to this module): one name per line, "#" starts a
+comment. They are compiled once per process into an Aho-Corasick automaton
+over words: the text is split into words and punctuation marks by one
+compiled regex, and the automaton takes one step per token no matter how
+many names there are. Nothing backtracks, and the per-character work stays
+in the regex engine.
+
+Matching ignores case, and whitespace only separates words, so a name
+wrapped onto the next line is still found. Since tokens are whole words,
+matches start and end at word boundaries; overlapping matches resolve to
+the leftmost, longest one ("Massachusetts Institute of Technology", not
+"Institute of Technology").
+
+The affiliation regexes in main.py then only run on the text outside the
+known names, where a lab, a city, a country or an unlisted organisation
+may still be. Set AFFILIATION_GAZETTEER to an empty value to use the
+regexes only.
+"""
+from itertools import accumulate
+from typing import Dict, Iterable, List, Optional, Tuple
+import os
+import re
+import threading
+
+AFFILIATION_GAZETTEER = os.getenv(
+    "AFFILIATION_GAZETTEER", os.path.join(os.path.dirname(os.path.abspath(__file__)), "affiliations.txt"))
+
+# Words, and punctuation marks one at a time; whitespace only separates them.
+# Captured, so split() returns the text between the tokens too.
+_TOKEN = re.compile(r"(\w+|[^\w\s])")
+
+
+def _fold(text: str) -> str:
+    """Lower-cased text, the same length as text."""
+    folded = text.lower()
+    if len(folded) != len(text):
+        # A few characters lower-case to two ("İ" -> "i̇"); keep the first so positions stay aligned
+        folded = "".join(c.lower()[0] for c in text)
+    return folded
+
+
+class Gazetteer:
+    """Aho-Corasick automaton over the tokens of the folded names."""
+
+    def __init__(self, names: Iterable[str]):
+        # Per state: transitions, failure link, token counts of the names ending there
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[int, ...]] = [()]
+        self.size = 0
+
+        for name in names:
+            tokens = _TOKEN.findall(_fold(name))
+            if not tokens:
+                continue
+            state = self._insert(tokens)
+            if not self._out[state]:
+                self._out[state] = (len(tokens),)
+                self.size += 1
+        self._link()
+
+    def _insert(self, tokens: List[str]) -> int:
+        state = 0
+        for token in tokens:
+            following = self._goto[state].get(token)
+            if following is None:
+                following = len(self._goto)
+                self._goto[state][token] = following
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            state = following
+        return state
+
+    def _link(self):
+        """
+        Breadth-first failure links; each state also reports its suffixes'
+        outputs. The failure links are then folded into the transitions, so
+        a scan takes exactly one dictionary lookup per token.
+        """
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for token, following in self._goto[state].items():
+                fallback = self._fail[state]
+                while fallback and token not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[following] = self._goto[fallback].get(token, 0)
+                self._out[following] += self._out[self._fail[following]]
+                queue.append(following)
+
+        # Every failure link points to a shallower state, resolved earlier in this order
+        self._next: List[Dict[str, int]] = [{}] * len(self._goto)
+        self._next[0] = self._goto[0]
+        for state in queue:
+            self._next[state] = {**self._next[self._fail[state]], **self._goto[state]}
+
+    def _matches(self, folded: str) -> List[Tuple[int, int]]:
+        """All (start, end) occurrences, as character offsets."""
+        transitions, out = self._next, self._out
+        # Separators and tokens alternate: parts[2 * i + 1] is token i
+        parts = _TOKEN.split(folded)
+        # (first, last) token indexes; plain strings are much cheaper to walk than match objects
+        found = []
+        state = 0
+        for last, token in enumerate(parts[1::2]):
+            state = transitions[state].get(token, 0)
+            if out[state]:
+                found.extend((last - count + 1, last) for count in out[state])
+        if not found:
+            return found
+        # offsets[k] is where parts[k] starts
+        offsets = list(accumulate(map(len, parts), initial=0))
+        return [(offsets[2 * first + 1], offsets[2 * last + 2]) for first, last in found]
+
+    def spans(self, text: str) -> List[Tuple[int, int]]:
+        """(start, end) of the known names in text, leftmost-longest and without overlaps."""
+        matches = sorted(self._matches(_fold(text)), key=lambda span: (span[0], -span[1]))
+
+        spans = []
+        covered_until = 0
+        for start, end in matches:
+            if start >= covered_until:
+                spans.append((start, end))
+                covered_until = end
+        return spans
+
+    def scan(self, text: str) -> List[str]:
+        """The known names in text, with whitespace collapsed."""
+        return [" ".join(text[start:end].split()) for start, end in self.spans(text)]
+
+
+def load(path: str) -> Gazetteer:
+    with open(path, "r", encoding="utf-8") as f:
+        names = [line.split("#", 1)[0].strip() for line in f]
+    return Gazetteer(name for name in names if name)
+
+
+_gazetteer: Optional[Gazetteer] = None
+_gazetteer_lock = threading.Lock()
+
+
+def get() -> Optional[Gazetteer]:
+    """The gazetteer built from AFFILIATION_GAZETTEER on first use, None when disabled."""
+    global _gazetteer
+    if not AFFILIATION_GAZETTEER:
+        return None
+    if _gazetteer is None:
+        with _gazetteer_lock:
+            if _gazetteer is None:
+                _gazetteer = load(AFFILIATION_GAZETTEER)
+    return _gazetteer
@@ -0,0 +1,119 @@
+"""
+Per-document layout cache.
+
+The first stage that opens a PDF records what later stages need from it:
+page count, page sizes, the first page's text and blocks (author
+extraction) and the full text (categorization). The record is stored next
+to the other results for the same content hash in the content store, so
+categorizing or re-processing a paper that was already parsed skips
+PyMuPDF entirely.
+
+On disk a layout is a short magic header followed by a zlib-compressed
+marshal of plain tuples, about a sixth of the size of the same data as
+JSON. Loading one takes well under a millisecond for a typical paper,
+against tens of milliseconds to parse the PDF again.
+"""
+from typing import List, Optional, Tuple, Union
+import marshal
+import zlib
+
+import fitz  # PyMuPDF
+
+from fastapiRouter import content_store, metrics
+
+# Bump the trailing version byte whenever the tuple layout below changes
+MAGIC = b"PDFLAYOUT\x01"
+MARSHAL_VERSION = 4
+
+
+class DocumentLayout:
+    __slots__ = ("page_count", "page_sizes", "first_page_text", "first_page_blocks", "text")
+
+    def __init__(self, page_count: int, page_sizes: List[Tuple[float, float]],
+                 first_page_text: str, first_page_blocks: List[tuple], text: Optional[str]):
+        self.page_count = page_count
+        self.page_sizes = page_sizes
+        self.first_page_text = first_page_text
+        # PyMuPDF "blocks" tuples: (x0, y0, x1, y1, text, block_no, block_type)
+        self.first_page_blocks = first_page_blocks
+        # None when built without the full text
+        self.text = text
+
+    @property
+    def first_page_size(self) -> Tuple[float, float]:
+        return self.page_sizes[0]
+
+    def encode(self) -> bytes:
+        record = (self.page_count, self.page_sizes, self.first_page_text,
+                  self.first_page_blocks, self.text)
+        return MAGIC + zlib.compress(marshal.dumps(record, MARSHAL_VERSION))
+
+    @classmethod
+    def decode(cls, data: bytes) -> Optional["DocumentLayout"]:
+        """Rebuild a layout from encode() output; None for stale or damaged data."""
+        if not data.startswith(MAGIC):
+            return None
+        try:
+            record = marshal.loads(zlib.decompress(data[len(MAGIC):]))
+            return cls(*record)
+        except (ValueError, EOFError, TypeError, zlib.error):
+            return None
+
+
+def from_document(doc: fitz.Document, full_text: bool = True) -> DocumentLayout:
+    """Extract the layout of an open, not yet modified document."""
+    page_sizes = []
+    texts = []
+    for page in doc:
+        page_sizes.append((page.rect.width, page.rect.height))
+        if full_text or page.number == 0:
+            texts.append(page.get_text())
+
+    first_page_blocks = [tuple(block) for block in doc[0].get_text("blocks")] if doc.page_count else []
+    return DocumentLayout(
+        page_count=doc.page_count,
+        page_sizes=page_sizes,
+        first_page_text=texts[0] if texts else "",
+        first_page_blocks=first_page_blocks,
+        text="".join(texts) if full_text else None
+    )
+
+
+def load(digest: str) -> Optional[DocumentLayout]:
+    data = content_store.load_layout(digest)
+    return DocumentLayout.decode(data) if data is not None else None
+
+
+def save(digest: str, layout: DocumentLayout):
+    content_store.save_layout(digest, layout.encode())
+
+
+def for_document(digest: str, doc: fitz.Document) -> DocumentLayout:
+    """Cached layout of content already opened as doc, building and storing it on a miss."""
+    layout = load(digest)
+    if layout is None:
+        layout = from_document(doc)
+        save(digest, layout)
+    return layout
+
+
+def get(digest: str, source: Union[bytes, str]) -> DocumentLayout:
+    """
+    Cached layout for the content with this digest. source (a path or the
+    PDF bytes) is only opened when nothing is cached yet.
+    """
+    layout = load(digest)
+    if layout is None:
+        with metrics.stage("parse"):
+            if isinstance(source, str):
+                doc = fitz.open(source)
+            else:
+                doc = fitz.open("pdf", source)
+        try:
+            with metrics.stage("extract"):
+                layout = from_document(doc)
+        finally:
+            doc.close()
+        save(digest, layout)
+    metrics.set_page_count(layout.page_count)
+    return layout
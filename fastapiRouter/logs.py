@@ -0,0 +1,177 @@
+"""
+Structured logging for the API, written off the request path.
+
+setup() gives the "main" and "fastapiRouter" loggers a QueueHandler: a log
+call formats its message, stamps the request id and puts the record on a
+bounded queue, and a QueueListener thread writes it to stderr. A slow
+terminal or log collector therefore never blocks the event loop or the
+pipeline thread. When the queue is full the record is dropped and counted
+as pdf_log_dropped_total instead of waiting.
+
+Every line carries the id of the request it was logged for. RequestIdMiddleware
+takes it from an X-Request-Id header (or makes one up), keeps it in a
+context variable that follows the request into the threadpool and the
+pipeline executor, and returns it in the response's X-Request-Id header.
+
+LOG_FORMAT "json" writes one JSON object per line (ts, level, logger,
+request_id, message, any extra fields, exc); "text" writes a plain line for
+reading in a terminal. Request payloads are only logged at DEBUG, through
+payload(), which is free when DEBUG is off and always replaces decrypted and
+original values with their length.
+"""
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import re
+import uuid
+
+from fastapiRouter import metrics
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+if LOG_FORMAT not in ("json", "text"):
+    raise ValueError(f"Unknown LOG_FORMAT '{LOG_FORMAT}', expected one of ['json', 'text']")
+
+# Loggers of the app; third-party loggers keep their own configuration
+LOGGERS = ("main", "fastapiRouter")
+
+REQUEST_ID_HEADER = b"x-request-id"
+_VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._:-]{1,64}$")
+
+# Keys whose values are plaintext of encrypted fields (or whole documents) and are never logged
+REDACTED_KEYS = {"decrypted", "original", "decrypted_content", "pdfFileContent", "review_text"}
+
+request_id: contextvars.ContextVar[str] = contextvars.ContextVar("request_id", default="-")
+
+# Attributes every LogRecord has; anything else was passed in extra=
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "request_id"}
+
+_listener: Optional[QueueListener] = None
+
+
+def redact(value: Any) -> Any:
+    """Copy of a payload with the values of REDACTED_KEYS replaced by their length."""
+    if isinstance(value, dict):
+        return {key: (f"<redacted {len(str(item))} chars>" if key in REDACTED_KEYS and item is not None
+                      else redact(item))
+                for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact(item) for item in value]
+    return value
+
+
+def payload(logger: logging.Logger, message: str, **fields):
+    """Log request or result data at DEBUG, redacted. Nothing is copied when DEBUG is off."""
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(message, extra={"payload": redact(fields)})
+
+
+class _RequestQueueHandler(QueueHandler):
+    """Stamps the request id in the calling thread and never blocks on a full queue."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = logging.makeLogRecord(vars(record))
+        record.request_id = request_id.get()
+        record.message = record.getMessage()
+        if record.exc_info:
+            # Tracebacks hold frames; only their text crosses the queue
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg, record.args, record.exc_info = record.message, None, None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.increment("pdf_log_dropped_total")
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "message": record.getMessage(),
+        }
+        entry.update((key, value) for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        created = datetime.fromtimestamp(record.created).strftime("%H:%M:%S.%f")[:-3]
+        extra = " ".join(f"{key}={value}" for key, value in vars(record).items()
+                         if key not in _RECORD_ATTRIBUTES)
+        line = (f"{created} {record.levelname:<7} [{getattr(record, 'request_id', '-')}] "
+                f"{record.name}: {record.getMessage()}{' ' + extra if extra else ''}")
+        if record.exc_text:
+            line += "\n" + record.exc_text
+        return line
+
+
+def setup():
+    """Route the app loggers through the queue. Safe to call more than once."""
+    global _listener
+    if _listener is not None:
+        return
+
+    records: queue.Queue = queue.Queue(LOG_QUEUE_SIZE)
+    output = logging.StreamHandler()
+    output.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+    _listener = QueueListener(records, output, respect_handler_level=False)
+
+    handler = _RequestQueueHandler(records)
+    for name in LOGGERS:
+        logger = logging.getLogger(name)
+        logger.setLevel(LOG_LEVEL)
+        logger.addHandler(handler)
+        # Not passed on to handlers uvicorn or others may have set on the root logger
+        logger.propagate = False
+
+    _listener.start()
+    # Write what is still queued when the process exits
+    atexit.register(_listener.stop)
+
+
+class RequestIdMiddleware:
+    """ASGI middleware giving each request an id for its log lines and response."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        current = None
+        for name, value in scope["headers"]:
+            if name == REQUEST_ID_HEADER:
+                current = value.decode("latin-1")
+                break
+        if current is None or not _VALID_REQUEST_ID.match(current):
+            current = uuid.uuid4().hex[:16]
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [
+                    (REQUEST_ID_HEADER, current.encode("ascii"))]
+            await send(message)
+
+        token = request_id.set(current)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id.reset(token)
@@ -0,0 +1,228 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import functools
+import os
+import threading
+import time
+
+router = APIRouter()
+
+# Metrics are opt-in; when disabled every timer is a shared no-op
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "0").lower() in ("1", "true", "yes")
+
+# Histogram bucket upper bounds in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Page count buckets used as a label so small and huge papers are not mixed
+PAGE_BUCKETS = (1, 5, 10, 25, 50, 100, 250)
+
+
+class Histogram:
+    """Cumulative latency histogram in the Prometheus layout."""
+
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * len(LATENCY_BUCKETS)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float):
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+        self.total += seconds
+        self.count += 1
+
+
+class _RequestTimings:
+    """Stage timings collected during one request, flushed when it finishes."""
+
+    __slots__ = ("endpoint", "pages", "stages")
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.pages: Optional[int] = None
+        self.stages: List[Tuple[str, float]] = []
+
+
+# (endpoint, stage, page bucket) -> histogram
+_histograms: Dict[Tuple[str, str, str], Histogram] = {}
+# (counter name, sorted label pairs) -> count
+_counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], int] = {}
+_lock = threading.Lock()
+_current: ContextVar[Optional[_RequestTimings]] = ContextVar("metrics_request", default=None)
+
+
+def page_bucket(pages: Optional[int]) -> str:
+    """Map a page count to its bucket label, e.g. 12 -> "le_25"."""
+    if pages is None:
+        return "unknown"
+    for bound in PAGE_BUCKETS:
+        if pages <= bound:
+            return f"le_{bound}"
+    return f"gt_{PAGE_BUCKETS[-1]}"
+
+
+def observe(endpoint: str, stage: str, seconds: float, pages: Optional[int] = None):
+    """Record a single observation directly into the histograms."""
+    key = (endpoint, stage, page_bucket(pages))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = Histogram()
+        histogram.observe(seconds)
+
+
+def increment(name: str, **labels: str):
+    """Add one to a labelled counter, e.g. increment("pdf_admission_rejected_total", endpoint="review")."""
+    if not METRICS_ENABLED:
+        return
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + 1
+
+
+def set_page_count(pages: int):
+    """Attach the page count of the document being processed to the current request."""
+    if not METRICS_ENABLED:
+        return
+    timings = _current.get()
+    if timings is not None:
+        timings.pages = pages
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+@contextmanager
+def _timed_stage(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        timings = _current.get()
+        if timings is not None:
+            timings.stages.append((name, elapsed))
+        else:
+            # Called outside an instrumented endpoint (scripts, CLI)
+            observe("direct", name, elapsed)
+
+
+def stage(name: str):
+    """
+    Time a pipeline stage:
+
+        with metrics.stage("save"):
+            doc.save(...)
+
+    Returns a shared no-op context manager when metrics are disabled.
+    """
+    if not METRICS_ENABLED:
+        return _NULL_STAGE
+    return _timed_stage(name)
+
+
+def _flush(timings: _RequestTimings, elapsed: float):
+    observe(timings.endpoint, "total", elapsed, timings.pages)
+    for name, seconds in timings.stages:
+        observe(timings.endpoint, name, seconds, timings.pages)
+
+
+def timed_endpoint(endpoint: str):
+    """
+    Decorator for route handlers that records the total request time and
+    every stage timed while handling it. Works for sync and async handlers.
+    """
+    def decorator(func):
+        if not METRICS_ENABLED:
+            return func
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                timings = _RequestTimings(endpoint)
+                token = _current.set(timings)
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    _current.reset(token)
+                    _flush(timings, time.perf_counter() - start)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def sync_wrapper(*args, **kwargs):
+            timings = _RequestTimings(endpoint)
+            token = _current.set(timings)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _current.reset(token)
+                _flush(timings, time.perf_counter() - start)
+        return sync_wrapper
+
+    return decorator
+
+
+def render_prometheus() -> str:
+    """Render all histograms in the Prometheus text exposition format."""
+    lines = [
+        "# HELP pdf_stage_duration_seconds Time spent per endpoint and pipeline stage",
+        "# TYPE pdf_stage_duration_seconds histogram",
+    ]
+    with _lock:
+        items = sorted(
+            (key, list(h.counts), h.total, h.count) for key, h in _histograms.items()
+        )
+        counters = sorted(_counters.items())
+
+    for (endpoint, stage_name, pages), counts, total, count in items:
+        labels = f'endpoint="{endpoint}",stage="{stage_name}",pages="{pages}"'
+        cumulative = 0
+        for bound, bucket_count in zip(LATENCY_BUCKETS, counts):
+            cumulative += bucket_count
+            lines.append(f'pdf_stage_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'pdf_stage_duration_seconds_bucket{{{labels},le="+Inf"}} {count}')
+        lines.append(f"pdf_stage_duration_seconds_sum{{{labels}}} {total:.6f}")
+        lines.append(f"pdf_stage_duration_seconds_count{{{labels}}} {count}")
+
+    previous_name = None
+    for (name, label_pairs), value in counters:
+        if name != previous_name:
+            lines.append(f"# TYPE {name} counter")
+            previous_name = name
+        labels = ",".join(f'{key}="{label}"' for key, label in label_pairs)
+        lines.append(f"{name}{{{labels}}} {value}")
+
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    """Drop all recorded observations."""
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+
+@router.get("/api/py/metrics")
+async def metrics_endpoint():
+    return PlainTextResponse(
+        render_prometheus(),
+        media_type="text/plain; version=0.0.4"
+    )
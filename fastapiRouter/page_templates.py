@@ -0,0 +1,69 @@
+"""
+Prebuilt page templates for the pages PyMuPDF appends to documents.
+
+The static part of a page (headers that read the same for every document)
+is drawn once per page size into a small one-page PDF and kept in memory.
+new_page() places that page as a Form XObject on the new page, so each
+request only has to draw its own dynamic text on top, and a document with
+several pages from the same template stores its content once.
+
+Rendered templates are shared as PDF bytes; every thread opens its own
+copy, since PyMuPDF documents must not be used by two threads at once.
+"""
+import threading
+from typing import Callable, Dict, Tuple
+
+import fitz  # PyMuPDF
+
+
+def _encryption_header(page: fitz.Page, continued: bool):
+    title = "ENCRYPTED INFORMATION (CONTINUED)" if continued else "ENCRYPTED INFORMATION"
+    # "hebo" is Helvetica-Bold under a resource name of its own: PyMuPDF would take
+    # a "Helvetica-Bold" inside the template as already present on the page
+    page.insert_text(fitz.Point(50, 50), title, fontsize=16, fontname="hebo")
+
+
+# template name -> function drawing the static content on an empty page
+TEMPLATES: Dict[str, Callable[[fitz.Page], None]] = {
+    "encryption": lambda page: _encryption_header(page, continued=False),
+    "encryption_continued": lambda page: _encryption_header(page, continued=True),
+}
+
+_lock = threading.Lock()
+# (name, width, height) -> rendered template PDF
+_rendered: Dict[Tuple[str, float, float], bytes] = {}
+# Per-thread open copies of the rendered templates
+_local = threading.local()
+
+
+def template_bytes(name: str, width: float, height: float) -> bytes:
+    """The template rendered for this page size, drawing it on first use."""
+    key = (name, round(width, 2), round(height, 2))
+    data = _rendered.get(key)
+    if data is None:
+        doc = fitz.open()
+        TEMPLATES[name](doc.new_page(width=width, height=height))
+        data = doc.tobytes(garbage=3, deflate=True)
+        doc.close()
+        with _lock:
+            data = _rendered.setdefault(key, data)
+    return data
+
+
+def _open_template(name: str, width: float, height: float) -> fitz.Document:
+    opened = getattr(_local, "documents", None)
+    if opened is None:
+        opened = _local.documents = {}
+    key = (name, round(width, 2), round(height, 2))
+    template = opened.get(key)
+    if template is None:
+        template = opened[key] = fitz.open("pdf", template_bytes(name, width, height))
+    return template
+
+
+def new_page(doc: fitz.Document, name: str, width: float, height: float) -> fitz.Page:
+    """Append a page to doc with the named template's static content already on it."""
+    page = doc.new_page(-1, width=width, height=height)
+    # Showing the same open template again in doc reuses its XObject
+    page.show_pdf_page(page.rect, _open_template(name, width, height), 0)
+    return page
@@ -0,0 +1,85 @@
+"""
+Responses that carry a PDF together with the JSON result describing it.
+
+process-pdf normally answers with JSON and a download_url, and the client
+fetches the PDF in a second request that reads it from disk again. With
+these the PDF comes back in the same response:
+
+  - "multipart": a multipart/form-data body with a "result" part (the JSON
+    the endpoint would otherwise return) and a "file" part (the PDF).
+    Browsers parse it with Response.formData().
+  - "pdf": the PDF as the body and the JSON result, base64url encoded, in
+    the X-Result header. Simpler for scripts, but proxies and clients limit
+    header sizes (Node's default is 16 KB), so keep it for small mappings.
+
+The PDF is either bytes already in memory or a file streamed in chunks.
+"""
+from typing import Dict, Iterator, Optional
+import base64
+import json
+import os
+import uuid
+
+from fastapi.responses import FileResponse, Response, StreamingResponse
+
+RESPONSE_MODES = ("json", "multipart", "pdf")
+
+CHUNK_SIZE = 64 * 1024
+
+
+def _read_chunks(path: str) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+
+def _quoted(filename: str) -> str:
+    # Header values are latin-1, and a quote or line break would end the parameter early
+    return '"' + "".join(c if c.isascii() and c.isprintable() and c not in '"\\' else "_"
+                         for c in filename) + '"'
+
+
+def multipart(result: Dict, filename: str, data: Optional[bytes] = None,
+              path: Optional[str] = None) -> StreamingResponse:
+    """The result JSON and the PDF (data, or the file at path) as multipart/form-data."""
+    boundary = uuid.uuid4().hex
+    head = (
+        f"--{boundary}\r\n"
+        'Content-Disposition: form-data; name="result"\r\n'
+        "Content-Type: application/json\r\n\r\n"
+    ).encode("ascii") + json.dumps(result).encode("utf-8") + (
+        f"\r\n--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename={_quoted(filename)}\r\n'
+        "Content-Type: application/pdf\r\n\r\n"
+    ).encode("utf-8")
+    tail = f"\r\n--{boundary}--\r\n".encode("ascii")
+
+    size = len(data) if data is not None else os.path.getsize(path)
+
+    def body() -> Iterator[bytes]:
+        yield head
+        if data is not None:
+            yield data
+        else:
+            yield from _read_chunks(path)
+        yield tail
+
+    return StreamingResponse(
+        body(),
+        media_type=f"multipart/form-data; boundary={boundary}",
+        headers={"Content-Length": str(len(head) + size + len(tail))}
+    )
+
+
+def with_result_header(result: Dict, filename: str, data: Optional[bytes] = None,
+                       path: Optional[str] = None) -> Response:
+    """The PDF (data, or the file at path) as the body, the result JSON in X-Result."""
+    encoded = base64.urlsafe_b64encode(
+        json.dumps(result, separators=(",", ":")).encode("utf-8")).decode("ascii")
+    headers = {"X-Result": encoded, "Content-Disposition": f"attachment; filename={_quoted(filename)}"}
+    if data is not None:
+        return Response(content=data, media_type="application/pdf", headers=headers)
+    return FileResponse(path, media_type="application/pdf", headers=headers)
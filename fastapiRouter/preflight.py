@@ -0,0 +1,189 @@
+"""
+Cheap checks on a PDF before it reaches the pipeline.
+
+check() looks at the header and trailer bytes, opens the document's xref
+(MuPDF loads objects lazily, so no page content is parsed) and looks for a
+text layer on the first page only. The facts it finds are stored per
+content hash next to the other pipeline results, so each document is
+inspected once. Async handlers use check_async(), which opens the document
+on the pipeline executor like the rest of the PyMuPDF work.
+
+The route is derived from those facts and the current limits:
+
+  - "reject": not a PDF, unreadable, password protected or without pages.
+    Endpoints answer 422 instead of failing deep inside the pipeline.
+  - "image_only": the first page has no text layer (a scan), so there is no
+    author block to find; text extraction is skipped.
+  - "large": above PREFLIGHT_LARGE_BYTES or PREFLIGHT_LARGE_PAGES. Processed
+    in the "large" admission class, so at most a few big documents hold the
+    pipeline at a time and small ones are not stuck behind them.
+  - "ok": everything else.
+"""
+from dataclasses import asdict, dataclass
+from typing import Dict, Optional, Tuple, Union
+import contextlib
+import json
+import os
+
+from fastapi.concurrency import run_in_threadpool
+import fitz  # PyMuPDF
+
+from fastapiRouter import admission, atomic_io, content_store, metrics, single_flight
+
+PREFLIGHT_LARGE_BYTES = int(os.getenv("PREFLIGHT_LARGE_BYTES", str(25 * 1024 * 1024)))
+PREFLIGHT_LARGE_PAGES = int(os.getenv("PREFLIGHT_LARGE_PAGES", "300"))
+
+# Bump when the stored facts change meaning, so old entries are checked again
+VERSION = 1
+
+HEAD_BYTES = 1024
+TAIL_BYTES = 2048
+
+
+@dataclass(slots=True)
+class Verdict:
+    """What preflight found out about one document."""
+    size: int
+    pages: int = 0
+    has_text: bool = False
+    encrypted: bool = False
+    # MuPDF had to rebuild a broken xref to open the file
+    repaired: bool = False
+    # Why the document cannot be processed, None when it can
+    error: Optional[str] = None
+
+    @property
+    def rejected(self) -> bool:
+        return self.error is not None
+
+    @property
+    def image_only(self) -> bool:
+        return not self.rejected and not self.has_text
+
+    @property
+    def large(self) -> bool:
+        return self.size > PREFLIGHT_LARGE_BYTES or self.pages > PREFLIGHT_LARGE_PAGES
+
+    @property
+    def route(self) -> str:
+        if self.rejected:
+            return "reject"
+        if self.large:
+            return "large"
+        if self.image_only:
+            return "image_only"
+        return "ok"
+
+    def to_dict(self) -> Dict:
+        return {**asdict(self), "route": self.route}
+
+
+def _read_ends(source: Union[bytes, str]) -> Tuple[int, bytes, bytes]:
+    """Size, first and last bytes of the document."""
+    if not isinstance(source, (str, os.PathLike)):
+        return len(source), bytes(source[:HEAD_BYTES]), bytes(source[-TAIL_BYTES:])
+    with open(source, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        head = f.read(HEAD_BYTES)
+        f.seek(max(0, size - TAIL_BYTES))
+        return size, head, f.read()
+
+
+def inspect(source: Union[bytes, str]) -> Verdict:
+    """Run the checks on a file path or in-memory PDF, without the cache."""
+    size, head, tail = _read_ends(source)
+    verdict = Verdict(size=size)
+    if size == 0:
+        verdict.error = "The file is empty"
+        return verdict
+    if b"%PDF-" not in head:
+        verdict.error = "The file is not a PDF (no %PDF- header)"
+        return verdict
+
+    try:
+        if isinstance(source, (str, os.PathLike)):
+            doc = fitz.open(source)
+        else:
+            doc = fitz.open("pdf", source)
+    except Exception as e:
+        verdict.error = f"The PDF cannot be read: {str(e)}"
+        return verdict
+
+    try:
+        # A missing end-of-file marker or xref offset means the xref was rebuilt
+        verdict.repaired = doc.is_repaired or b"startxref" not in tail or b"%%EOF" not in tail
+        verdict.encrypted = doc.is_encrypted
+        if doc.needs_pass:
+            verdict.error = "The PDF is password protected"
+            return verdict
+
+        verdict.pages = doc.page_count
+        if verdict.pages == 0:
+            verdict.error = "The PDF document contains no pages"
+            return verdict
+
+        try:
+            verdict.has_text = bool(doc[0].get_text("text").strip())
+        except Exception as e:
+            verdict.error = f"The first page cannot be read: {str(e)}"
+        return verdict
+    finally:
+        doc.close()
+
+
+def load(digest: str) -> Optional[Verdict]:
+    """The stored verdict for this content, if it was inspected before."""
+    try:
+        with open(content_store.preflight_path(digest), "r", encoding="utf-8") as f:
+            stored = json.load(f)
+        if stored.pop("version", None) == VERSION:
+            return Verdict(**stored)
+    except (OSError, ValueError, TypeError):
+        pass
+    return None
+
+
+def _inspect_and_store(digest: str, source: Union[bytes, str]) -> Verdict:
+    with metrics.stage("preflight"):
+        verdict = inspect(source)
+    atomic_io.write_bytes(content_store.preflight_path(digest),
+                          json.dumps({**asdict(verdict), "version": VERSION}).encode("utf-8"))
+    return verdict
+
+
+def check(digest: str, source: Union[bytes, str]) -> Verdict:
+    """The verdict for this content, inspecting source only the first time."""
+    verdict = load(digest)
+    if verdict is None:
+        verdict = _inspect_and_store(digest, source)
+    metrics.increment("pdf_preflight_total", route=verdict.route)
+    return verdict
+
+
+async def check_async(digest: str, source: Union[bytes, str]) -> Verdict:
+    """
+    check() for async handlers: the stored verdict is read in the threadpool,
+    a new inspection runs on the pipeline executor, since PyMuPDF is not
+    thread-safe.
+    """
+    verdict = await run_in_threadpool(load, digest)
+    if verdict is None:
+        verdict = await single_flight.run(_inspect_and_store, digest, source)
+    metrics.increment("pdf_preflight_total", route=verdict.route)
+    return verdict
+
+
+def queue(verdict: Verdict, endpoint: str):
+    """
+    Async context manager to process a document in: a slot of the "large"
+    admission class for large documents, nothing for the others.
+
+    A large document gives up the bulk slot its request was admitted with
+    first, so small documents are not held up while it waits for (and
+    holds) a large slot.
+    """
+    if verdict.large:
+        admission.release_held()
+        # A name of its own, apart from the endpoint's bulk limit
+        return admission.slot(f"{endpoint}:large", admission.LARGE)
+    return contextlib.nullcontext()
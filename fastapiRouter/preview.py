@@ -0,0 +1,171 @@
+"""
+First-page previews of anonymized papers.
+
+Reviewers and managers mostly open a processed PDF to look at the redacted
+first page. GET /api/py/preview/<processed filename> returns that page as a
+PNG or WebP image instead, so the browser does not have to fetch and render
+the whole document.
+
+Previews are cached in the content store under the SHA-256 of the PDF they
+show, one file per DPI and format. When the pipeline writes a new output it
+queues a render at PREVIEW_DPI on the pipeline executor, behind the request
+that produced it, so the preview is usually ready before anyone asks for
+it. Other sizes, and outputs that predate previews, are rendered on the
+first request; concurrent misses for the same image share one render.
+
+Responses carry an ETag (the content hash, DPI and format) and answer a
+matching If-None-Match with 304. Cache-Control is private, since the page
+still belongs to an unpublished paper.
+"""
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, Response
+from typing import Dict, Optional, Tuple, Union
+import logging
+import os
+import threading
+
+import fitz  # PyMuPDF
+
+from fastapiRouter import admission, atomic_io, content_store, metrics, single_flight, storage
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+PREVIEW_ENABLED = os.getenv("PREVIEW_ENABLED", "1").lower() in ("1", "true", "yes")
+PREVIEW_DPI = int(os.getenv("PREVIEW_DPI", "72"))
+PREVIEW_MAX_DPI = int(os.getenv("PREVIEW_MAX_DPI", "200"))
+PREVIEW_FORMAT = os.getenv("PREVIEW_FORMAT", "png")
+PREVIEW_WEBP_QUALITY = int(os.getenv("PREVIEW_WEBP_QUALITY", "80"))
+PREVIEW_MAX_AGE = int(os.getenv("PREVIEW_MAX_AGE", "300"))
+# Longest side in pixels; pages of unusual size are rendered at a lower DPI
+PREVIEW_MAX_SIDE = 4096
+
+MIN_DPI = 18
+
+FORMATS = {"png": "image/png"}
+
+try:
+    import PIL  # noqa: F401
+except ImportError:  # PyMuPDF only writes WebP through Pillow
+    PIL = None
+else:
+    FORMATS["webp"] = "image/webp"
+
+if PREVIEW_FORMAT not in FORMATS:
+    hint = " (webp needs Pillow)" if PREVIEW_FORMAT == "webp" else ""
+    raise ValueError(f"Unknown PREVIEW_FORMAT '{PREVIEW_FORMAT}', expected one of {list(FORMATS)}{hint}")
+
+# Areas whose files can be previewed; both hold anonymized papers
+AREAS = ("processed", "reviewed")
+
+# Concurrent misses for the same preview share one render
+_rendering = single_flight.Group("preview")
+
+# (path, inode, mtime, size) -> SHA-256, so unchanged files are not hashed on every request
+_digests: Dict[Tuple[str, int, int, int], str] = {}
+_digests_lock = threading.Lock()
+MAX_REMEMBERED_DIGESTS = 10000
+
+
+def render(source: Union[bytes, str], dpi: int = PREVIEW_DPI, fmt: str = PREVIEW_FORMAT) -> bytes:
+    """The first page of a PDF file or in-memory PDF as an image."""
+    doc = fitz.open(source) if isinstance(source, (str, os.PathLike)) else fitz.open("pdf", source)
+    try:
+        page = doc[0]
+        longest = max(page.rect.width, page.rect.height) or 1
+        pix = page.get_pixmap(dpi=min(dpi, int(PREVIEW_MAX_SIDE * 72 / longest)) or 1)
+    finally:
+        doc.close()
+    if fmt == "webp":
+        return pix.pil_tobytes(format="WEBP", quality=PREVIEW_WEBP_QUALITY)
+    return pix.tobytes("png")
+
+
+def render_and_store(source: Union[bytes, str], digest: str, dpi: int, fmt: str) -> bytes:
+    path = content_store.preview_path(digest, dpi, fmt)
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except OSError:
+        pass
+    with metrics.stage("preview"):
+        data = render(source, dpi, fmt)
+    atomic_io.write_bytes(path, data)
+    return data
+
+
+def _store_quietly(pdf_bytes: bytes, digest: str):
+    try:
+        render_and_store(pdf_bytes, digest, PREVIEW_DPI, PREVIEW_FORMAT)
+    except Exception:
+        logger.exception("Error rendering preview", extra={"digest": digest})
+
+
+def render_later(pdf_bytes: bytes):
+    """
+    Queue the default preview of a freshly written output on the pipeline
+    executor. Safe to call from the pipeline thread itself: the render runs
+    after the current job, not inside it.
+    """
+    if PREVIEW_ENABLED:
+        single_flight.executor.submit(_store_quietly, pdf_bytes, content_store.bytes_digest(pdf_bytes))
+
+
+def file_digest(path: str) -> str:
+    """SHA-256 of a published file, remembered while the file is unchanged."""
+    stat = os.stat(path)
+    key = (path, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    digest = _digests.get(key)
+    if digest is None:
+        digest = content_store.file_digest(path)
+        with _digests_lock:
+            if len(_digests) >= MAX_REMEMBERED_DIGESTS:
+                _digests.clear()
+            _digests[key] = digest
+    return digest
+
+
+@router.get("/api/py/preview/{filename}")
+@metrics.timed_endpoint("preview")
+@admission.admit("preview", admission.INTERACTIVE)
+async def preview_endpoint(
+    request: Request,
+    filename: str,
+    area: str = Query("processed", description="processed or reviewed"),
+    dpi: Optional[int] = Query(None, ge=MIN_DPI, le=PREVIEW_MAX_DPI, description=f"default {PREVIEW_DPI}"),
+    fmt: Optional[str] = Query(None, alias="format", description="png, or webp with Pillow installed"),
+):
+    """First page of a processed or reviewed PDF as an image, rendered on first use."""
+    if not PREVIEW_ENABLED:
+        raise HTTPException(status_code=404, detail="Previews are disabled")
+    if area not in AREAS:
+        raise HTTPException(status_code=400, detail=f"area must be one of: {', '.join(AREAS)}")
+    fmt = fmt or PREVIEW_FORMAT
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(FORMATS)}")
+    dpi = dpi or PREVIEW_DPI
+
+    path = storage.get(area).path(filename)
+    try:
+        with metrics.stage("hash"):
+            digest = await run_in_threadpool(file_digest, path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"File not found: {filename}")
+
+    etag = f'"{digest[:32]}-{dpi}.{fmt}"'
+    headers = {"ETag": etag, "Cache-Control": f"private, max-age={PREVIEW_MAX_AGE}"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+
+    cached = content_store.preview_path(digest, dpi, fmt)
+    if os.path.exists(cached):
+        metrics.increment("pdf_preview_total", result="hit")
+        return FileResponse(cached, media_type=FORMATS[fmt], headers=headers)
+
+    metrics.increment("pdf_preview_total", result="miss")
+    try:
+        data, _ = await _rendering.run((digest, dpi, fmt), render_and_store, path, digest, dpi, fmt)
+    except Exception as e:
+        raise HTTPException(status_code=422, detail=f"Preview could not be rendered: {str(e)}")
+    return Response(content=data, media_type=FORMATS[fmt], headers=headers)
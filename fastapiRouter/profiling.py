@@ -0,0 +1,250 @@
+"""
+On-demand sampling profiles of single requests.
+
+With PROFILING_ENABLED=1 a middleware profiles the requests to
+PROFILE_PATHS that carry an "X-Profile" header (equal to PROFILE_TOKEN when
+one is set), plus a random PROFILE_SAMPLE_RATE share of them. With
+profiling disabled the middleware is not installed at all.
+
+While at least one request is profiled, a sampler thread records the stacks
+of the threads requests run on (the event loop, the pipeline executor and
+the threadpool) every PROFILE_INTERVAL seconds. Stacks are taken across
+threads because the pipeline does not run on the event loop; idle threads
+(waiting on a queue, lock or selector) are skipped. Samples taken while other requests were being handled may
+include their work too; the file name records how many requests overlapped.
+
+Each profile is written to PROFILE_DIR in the folded stack format
+("frame;frame;frame count" per line) that flamegraph.pl, inferno and
+speedscope read, named "<X-Profile-Id>-<path>-<ms>ms-x<overlapping
+requests>.folded" after the id the response carries. The oldest files are
+removed once the directory exceeds PROFILE_MAX_FILES or
+PROFILE_MAX_BYTES.
+"""
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+import hmac
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+
+from fastapi.concurrency import run_in_threadpool
+
+from fastapiRouter import metrics
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "0").lower() in ("1", "true", "yes")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_PATHS = tuple(path.strip() for path in os.getenv(
+    "PROFILE_PATHS", "/api/py/process-pdf,/api/py/upload,/api/py/decrypt,/api/py/review").split(",")
+    if path.strip())
+PROFILE_DIR = os.getenv("PROFILE_DIR", "./pdfs/profiles")
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "200"))
+PROFILE_MAX_BYTES = int(os.getenv("PROFILE_MAX_BYTES", str(50 * 1024 * 1024)))
+# A profile stops collecting after this long, so a stuck request cannot grow it forever
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "300"))
+
+PROFILE_HEADER = b"x-profile"
+
+# Names of the pipeline executor threads and of the threadpool FastAPI runs sync code in
+_WORKER_THREADS = ("pipeline", "AnyIO worker thread")
+
+# Innermost frames of threads that are waiting rather than working
+_IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+}
+
+
+class Profile:
+    """Stack samples of one request."""
+
+    __slots__ = ("id", "path", "loop_thread", "started", "deadline", "samples", "overlap")
+
+    def __init__(self, path: str):
+        self.id = f"{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}"
+        self.path = path
+        # Created on the thread running the event loop
+        self.loop_thread = threading.get_ident()
+        self.started = time.perf_counter()
+        self.deadline = self.started + PROFILE_MAX_SECONDS
+        self.samples: Counter = Counter()
+        # Most requests in flight at once while this one was profiled
+        self.overlap = 1
+
+    def filename(self, elapsed_ms: int) -> str:
+        endpoint = re.sub(r"[^A-Za-z0-9]+", "-", self.path).strip("-") or "root"
+        return f"{self.id}-{endpoint}-{elapsed_ms}ms-x{self.overlap}.folded"
+
+    def folded(self) -> str:
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in self.samples.most_common())
+
+
+class _Sampler:
+    """One background thread sampling for all active profiles."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active: List[Profile] = []
+        self._in_flight = 0
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._labels: Dict[object, str] = {}
+
+    def request_started(self):
+        with self._lock:
+            self._in_flight += 1
+            for profile in self._active:
+                profile.overlap = max(profile.overlap, self._in_flight)
+
+    def request_finished(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    def start(self, profile: Profile):
+        with self._lock:
+            profile.overlap = self._in_flight
+            self._active.append(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def stop(self, profile: Profile):
+        with self._lock:
+            if profile in self._active:
+                self._active.remove(profile)
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            name = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            # ";" separates frames in the folded format
+            label = self._labels[code] = name.replace(";", ":")
+        return label
+
+    def _stacks(self, loop_threads: Set[int]) -> List[Tuple[str, ...]]:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        stacks = []
+        for ident, frame in sys._current_frames().items():
+            if ident not in loop_threads and not names.get(ident, "").startswith(_WORKER_THREADS):
+                continue
+            code = frame.f_code
+            if (os.path.basename(code.co_filename), code.co_name) in _IDLE_FRAMES:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self._label(frame.f_code))
+                frame = frame.f_back
+            stack.append(names.get(ident, f"thread-{ident}"))
+            stack.reverse()
+            stacks.append(tuple(stack))
+        return stacks
+
+    def _run(self):
+        while True:
+            now = time.perf_counter()
+            with self._lock:
+                active = [profile for profile in self._active if now < profile.deadline]
+                if not active:
+                    self._wake.clear()
+            if not active:
+                self._wake.wait()
+                continue
+
+            stacks = self._stacks({profile.loop_thread for profile in active})
+            with self._lock:
+                for profile in active:
+                    profile.samples.update(stacks)
+            time.sleep(PROFILE_INTERVAL)
+
+
+_sampler = _Sampler()
+
+
+def _prune():
+    """Delete the oldest profiles beyond the file count and size limits."""
+    entries = []
+    for entry in os.scandir(PROFILE_DIR):
+        if entry.is_file() and entry.name.endswith(".folded"):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    entries.sort(reverse=True)
+
+    total = 0
+    for index, (_, size, path) in enumerate(entries):
+        total += size
+        if index >= PROFILE_MAX_FILES or total > PROFILE_MAX_BYTES:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+
+def save(profile: Profile) -> str:
+    """Write the profile to PROFILE_DIR and enforce the disk limits. Returns its path."""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    elapsed_ms = int((time.perf_counter() - profile.started) * 1000)
+    path = os.path.join(PROFILE_DIR, profile.filename(elapsed_ms))
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(profile.folded())
+    _prune()
+    return path
+
+
+def _wants_profile(scope) -> bool:
+    if not scope["path"].startswith(PROFILE_PATHS):
+        return False
+    for name, value in scope["headers"]:
+        if name == PROFILE_HEADER:
+            if not PROFILE_TOKEN:
+                return True
+            return hmac.compare_digest(value, PROFILE_TOKEN.encode())
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware profiling selected requests, including streamed bodies
+    and background tasks that run after the response.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        _sampler.request_started()
+        try:
+            if not _wants_profile(scope):
+                await self.app(scope, receive, send)
+                return
+
+            profile = Profile(scope["path"])
+
+            async def send_with_id(message):
+                if message["type"] == "http.response.start":
+                    message.setdefault("headers", [])
+                    message["headers"] = list(message["headers"]) + [
+                        (b"x-profile-id", profile.id.encode("ascii"))]
+                await send(message)
+
+            _sampler.start(profile)
+            try:
+                await self.app(scope, receive, send_with_id)
+            finally:
+                _sampler.stop(profile)
+                metrics.increment("pdf_profiles_total", path=scope["path"])
+                await run_in_threadpool(save, profile)
+        finally:
+            _sampler.request_finished()
@@ -1,4 +1,6 @@
 from fastapi import APIRouter, HTTPException, Body
+from fastapi.concurrency import run_in_threadpool
+import logging
 import os
 from datetime import datetime
 import PyPDF2
@@ -6,13 +8,84 @@ from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter
 from io import BytesIO
 
+from fastapiRouter import admission, atomic_io, file_index, metrics, storage, text_layout
+
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 PROCESS_DIR = os.path.join(os.getcwd(), "pdfs", "processed")
 OUTPUT_DIR = os.path.join(os.getcwd(), "pdfs", "reviewed")
 
+# Left and right margin of the review pages, in points
+REVIEW_MARGIN = 100
+REVIEW_TEXT_WIDTH = letter[0] - 2 * REVIEW_MARGIN
+
+
+def _draw_review_continued(can: canvas.Canvas) -> float:
+    """Header of the pages a long review continues on; returns where the text resumes."""
+    can.setFont("Helvetica-Bold", 14)
+    can.drawString(REVIEW_MARGIN, 750, "Review (continued)")
+    return 720
+
+
+def append_review_page(pdf_path: str, output_path: str, review_text: str, review_score: float,
+                       review_date: datetime, reviewer_email: str, reviewer_name: str):
+    """Write a copy of pdf_path with the review information pages appended to output_path."""
+    # Open the original PDF
+    with open(pdf_path, 'rb') as file:
+        with metrics.stage("parse"):
+            pdf_reader = PyPDF2.PdfReader(file)
+        metrics.set_page_count(len(pdf_reader.pages))
+        pdf_writer = PyPDF2.PdfWriter()
+
+        # Copy all pages from the original PDF
+        for page_num in range(len(pdf_reader.pages)):
+            pdf_writer.add_page(pdf_reader.pages[page_num])
+
+        # Create a new page with review information
+        review_page = BytesIO()
+        can = canvas.Canvas(review_page, pagesize=letter)
+
+        # Add review information to the page
+        can.setFont("Helvetica-Bold", 16)
+        can.drawString(100, 750, "Review Information")
+
+        can.setFont("Helvetica", 12)
+        can.drawString(100, 720, f"Reviewer: {reviewer_name}")
+        can.drawString(100, 700, f"Email: {reviewer_email}")
+        can.drawString(
+            100, 680, f"Date: {review_date.strftime('%Y-%m-%d %H:%M:%S')}")
+        can.drawString(100, 660, f"Score: {review_score}")
+
+        can.setFont("Helvetica-Bold", 14)
+        can.drawString(100, 620, "Review:")
+
+        # Review text is wrapped to the page width and continues on as many
+        # pages as it needs
+        with metrics.stage("review_page"):
+            flow = text_layout.TextFlow(can, x=REVIEW_MARGIN, y=600, width=REVIEW_TEXT_WIDTH,
+                                        font_name="Helvetica", font_size=12,
+                                        on_new_page=_draw_review_continued)
+            flow.write(review_text)
+            flow.finish()
+            can.save()
+
+        # Add the new pages to the PDF
+        review_page.seek(0)
+        for new_page in PyPDF2.PdfReader(review_page).pages:
+            pdf_writer.add_page(new_page)
+
+        # Write the new PDF to the reviewed file
+        # Concurrent reviews of the same paper are serialized and the
+        # reviewed file only appears once completely written
+        with metrics.stage("write"), atomic_io.file_lock(output_path), \
+                atomic_io.atomic_write(output_path) as output_file:
+            pdf_writer.write(output_file)
+
 
 @router.post("/api/py/review")
+@metrics.timed_endpoint("review")
+@admission.admit("review", admission.INTERACTIVE)
 async def add_review_to_pdf(
     pdf_filename: str = Body(...,
                              description="Name of the PDF file to add review to"),
@@ -24,7 +97,7 @@ async def add_review_to_pdf(
     reviewer_name: str = Body(..., description="Name of the reviewer")
 ):
     # Construct the full path to the PDF file
-    pdf_path = os.path.join(PROCESS_DIR, ("processed_" + pdf_filename))
+    pdf_path = storage.get("processed").path("processed_" + pdf_filename)
 
     # Check if the PDF file exists
     if not os.path.exists(pdf_path):
@@ -32,72 +105,23 @@ async def add_review_to_pdf(
             status_code=404, detail=f"PDF file '{pdf_filename}' not found")
 
     try:
-        # Open the original PDF
-        with open(pdf_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            pdf_writer = PyPDF2.PdfWriter()
-
-            # Copy all pages from the original PDF
-            for page_num in range(len(pdf_reader.pages)):
-                pdf_writer.add_page(pdf_reader.pages[page_num])
-
-            # Create a new page with review information
-            review_page = BytesIO()
-            can = canvas.Canvas(review_page, pagesize=letter)
-
-            # Add review information to the page
-            can.setFont("Helvetica-Bold", 16)
-            can.drawString(100, 750, "Review Information")
-
-            can.setFont("Helvetica", 12)
-            can.drawString(100, 720, f"Reviewer: {reviewer_name}")
-            can.drawString(100, 700, f"Email: {reviewer_email}")
-            can.drawString(
-                100, 680, f"Date: {review_date.strftime('%Y-%m-%d %H:%M:%S')}")
-            can.drawString(100, 660, f"Score: {review_score}")
-
-            can.setFont("Helvetica-Bold", 14)
-            can.drawString(100, 620, "Review:")
-
-            # Handle multi-line review text
-            can.setFont("Helvetica", 12)
-            text_object = can.beginText(100, 600)
-
-            # Split the review text into lines
-            lines = []
-            for line in review_text.split('\n'):
-                # Further split long lines
-                while len(line) > 70:
-                    lines.append(line[:70])
-                    line = line[70:]
-                lines.append(line)
-
-            for line in lines:
-                text_object.textLine(line)
-
-            can.drawText(text_object)
-            can.save()
-
-            # Add the new page to the PDF
-            review_page.seek(0)
-            new_page = PyPDF2.PdfReader(review_page).pages[0]
-            pdf_writer.add_page(new_page)
+        # Create the reviewed PDF file name
+        reviewed_pdf_filename = f"reviewed_{pdf_filename}"
+        reviewed_pdf_path = storage.get("reviewed").path_for_write(reviewed_pdf_filename)
 
-            # Create the reviewed PDF file name
-            reviewed_pdf_filename = f"reviewed_{pdf_filename}"
-            reviewed_pdf_path = os.path.join(OUTPUT_DIR, reviewed_pdf_filename)
-            # Write the new PDF to the reviewed file
-            with open(reviewed_pdf_path, 'wb') as output_file:
-                pdf_writer.write(output_file)
+        # Parsing, the file lock and the fsync'd write all block
+        await run_in_threadpool(append_review_page, pdf_path, reviewed_pdf_path, review_text,
+                                review_score, review_date, reviewer_email, reviewer_name)
+        file_index.record(reviewed_pdf_path)
 
-            return {
-                "success": True,
-                "message": f"Review added to '{pdf_filename}' successfully",
-                "reviewed_pdf_path": reviewed_pdf_path
-            }
+        return {
+            "success": True,
+            "message": f"Review added to '{pdf_filename}' successfully",
+            "reviewed_pdf_path": reviewed_pdf_path
+        }
 
     except Exception as e:
         # If any error occurs, raise an HTTPException
-        print(e)
+        logger.exception("Failed to add review", extra={"pdf": pdf_filename})
         raise HTTPException(
             status_code=500, detail=f"Failed to add review: {str(e)}")
@@ -0,0 +1,70 @@
+"""
+Coalescing of concurrent identical pipeline calls.
+
+The UIs often send the same process-pdf or categorize request two or three
+times at once (double clicks, retries, several tabs). A Group runs the first
+call for a key and lets every identical call that arrives while it is in
+flight wait for the same result, instead of running the pipeline again.
+
+The calls run on a dedicated thread pool, off the event loop. PyMuPDF is
+not thread-safe, so the pool has a single thread by default: pipeline work
+in one worker process stays serialized as before, but the event loop keeps
+serving other requests meanwhile. Scale out with more uvicorn workers.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Tuple
+import asyncio
+import contextvars
+import functools
+import os
+
+from fastapiRouter import metrics
+
+PIPELINE_THREADS = int(os.getenv("PIPELINE_THREADS", "1"))
+
+executor = ThreadPoolExecutor(max_workers=PIPELINE_THREADS, thread_name_prefix="pipeline")
+
+
+def _submit(func: Callable, *args) -> asyncio.Future:
+    # The copied context keeps stage timings attached to the calling request
+    context = contextvars.copy_context()
+    return asyncio.get_running_loop().run_in_executor(
+        executor, functools.partial(context.run, func, *args))
+
+
+async def run(func: Callable, *args) -> Any:
+    """Run func(*args) on the pipeline executor, without coalescing."""
+    return await _submit(func, *args)
+
+
+class Group:
+    """Calls keyed by their inputs; identical concurrent calls share one execution."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+
+    async def run(self, key: Hashable, func: Callable, *args) -> Tuple[Any, bool]:
+        """
+        Run func(*args) on the pipeline executor, or join the identical call
+        already in flight. Returns (result, shared); shared is True for
+        callers that did not start the call themselves.
+        """
+        call = self._calls.get(key)
+        shared = call is not None
+        if shared:
+            metrics.increment("pdf_single_flight_shared_total", group=self.name)
+        else:
+            call = _submit(func, *args)
+            self._calls[key] = call
+            call.add_done_callback(functools.partial(self._done, key))
+
+        # A caller that goes away must not cancel the call for the others
+        return await asyncio.shield(call), shared
+
+    def _done(self, key: Hashable, call: asyncio.Future):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        if not call.cancelled():
+            # Mark the exception as retrieved in case every caller went away
+            call.exception()
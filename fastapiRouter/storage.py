@@ -0,0 +1,238 @@
+"""
+Storage layout for the PDF directories.
+
+Every directory the app writes PDFs into (uploads, processed, reviewed,
+decrypted) is accessed through a Storage object instead of joining paths
+by hand. Two layouts are available, selected with PDF_STORAGE_LAYOUT:
+
+    flat     pdfs/processed/processed_paper.pdf            (default)
+    sharded  pdfs/processed/3f/a2/processed_paper.pdf
+
+The sharded layout spreads files over 65536 subdirectories keyed by a hash
+of the filename, so no single directory grows past a few entries per shard
+even with millions of files. Files the Next.js upload routes put directly
+in an area's root are still found there, and rewritten in place; the
+Next.js list and download routes look in both places (lib/storage.ts).
+Existing trees can be converted with
+
+    python -m fastapiRouter.storage migrate --to sharded
+
+and hard links into the content store left by earlier versions are
+replaced with copies by
+
+    python -m fastapiRouter.storage detach
+"""
+import argparse
+import hashlib
+import os
+from typing import Dict, Iterator, List
+
+STORAGE_LAYOUT = os.getenv("PDF_STORAGE_LAYOUT", "flat")
+
+AREA_DIRS = {
+    "uploads": os.path.join(os.getcwd(), "pdfs"),
+    "processed": os.path.join(os.getcwd(), "pdfs", "processed"),
+    "reviewed": os.path.join(os.getcwd(), "pdfs", "reviewed"),
+    "decrypted": os.path.join(os.getcwd(), "pdfs", "decrypted"),
+}
+
+_HEX = set("0123456789abcdef")
+
+
+class FlatStorage:
+    """All files directly inside root."""
+
+    sharded = False
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+
+    def directory(self, name: str) -> str:
+        return self.root
+
+    def path(self, name: str) -> str:
+        """Location of a file by name; never escapes root."""
+        name = os.path.basename(name)
+        return os.path.join(self.directory(name), name)
+
+    def path_for_write(self, name: str) -> str:
+        """Like path(), but makes sure the containing directory exists."""
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    def exists(self, name: str) -> bool:
+        return os.path.exists(self.path(name))
+
+    def owns(self, path: str) -> bool:
+        """Whether path is where this storage would keep a file of that name."""
+        path = os.path.abspath(path)
+        return os.path.dirname(path) == self.directory(os.path.basename(path))
+
+    def iter_files(self) -> Iterator[os.DirEntry]:
+        with os.scandir(self.root) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    yield entry
+
+
+class ShardedStorage(FlatStorage):
+    """Files spread over root/xx/yy/ by the hash of their name."""
+
+    sharded = True
+
+    def directory(self, name: str) -> str:
+        digest = hashlib.md5(name.encode("utf-8")).hexdigest()
+        return os.path.join(self.root, digest[:2], digest[2:4])
+
+    def path(self, name: str) -> str:
+        """The sharded location, or the flat one if only that exists."""
+        name = os.path.basename(name)
+        path = os.path.join(self.directory(name), name)
+        if not os.path.exists(path):
+            flat = os.path.join(self.root, name)
+            if os.path.isfile(flat):
+                return flat
+        return path
+
+    def owns(self, path: str) -> bool:
+        path = os.path.abspath(path)
+        return os.path.dirname(path) in (self.root, self.directory(os.path.basename(path)))
+
+    def iter_files(self) -> Iterator[os.DirEntry]:
+        # Files left flat by the Next.js routes
+        yield from super().iter_files()
+        # Only walk the two-level hex shard directories, so sibling areas
+        # nested under the same root (pdfs/processed, ...) are not included
+        for first in _shard_dirs(self.root):
+            for second in _shard_dirs(first):
+                with os.scandir(second) as entries:
+                    for entry in entries:
+                        if entry.is_file():
+                            yield entry
+
+
+def _shard_dirs(path: str) -> Iterator[str]:
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if len(entry.name) == 2 and set(entry.name) <= _HEX and entry.is_dir():
+                    yield entry.path
+    except FileNotFoundError:
+        return
+
+
+LAYOUTS = {"flat": FlatStorage, "sharded": ShardedStorage}
+
+if STORAGE_LAYOUT not in LAYOUTS:
+    raise ValueError(
+        f"Unknown PDF_STORAGE_LAYOUT '{STORAGE_LAYOUT}', expected one of {list(LAYOUTS)}")
+
+_areas: Dict[str, FlatStorage] = {}
+
+
+def get(area: str) -> FlatStorage:
+    """Storage for one of the PDF areas in the configured layout."""
+    storage = _areas.get(area)
+    if storage is None:
+        storage = _areas[area] = LAYOUTS[STORAGE_LAYOUT](AREA_DIRS[area])
+    return storage
+
+
+def collect_pdfs(targets: List[str], recursive: bool = False) -> List[str]:
+    """
+    Absolute paths of the PDFs named by the command line tools' arguments.
+    A directory that is one of the areas yields that area's files in the
+    configured layout, without the areas nested in it; any other directory
+    yields the files directly inside it, or with recursive everything below
+    it except the areas and the content store. Files are taken as they are.
+    """
+    from fastapiRouter import content_store
+
+    areas = {os.path.abspath(root): area for area, root in AREA_DIRS.items()}
+    skipped = set(areas) | {os.path.abspath(content_store.STORE_DIR)}
+
+    def wanted(name: str) -> bool:
+        return name.lower().endswith(".pdf") and not name.startswith(".")
+
+    paths = []
+    for target in targets:
+        target = os.path.abspath(target)
+        if target in areas:
+            paths.extend(sorted(entry.path for entry in get(areas[target]).iter_files() if wanted(entry.name)))
+        elif os.path.isdir(target) and recursive:
+            for root, directories, names in os.walk(target):
+                directories[:] = sorted(name for name in directories if not name.startswith(".")
+                                        and os.path.join(root, name) not in skipped)
+                paths.extend(os.path.join(root, name) for name in sorted(names) if wanted(name))
+        elif os.path.isdir(target):
+            with os.scandir(target) as entries:
+                paths.extend(sorted(entry.path for entry in entries if entry.is_file() and wanted(entry.name)))
+        else:
+            paths.append(target)
+    return paths
+
+
+def migrate(layout: str, dry_run: bool = False) -> int:
+    """Move every file of every area into the given layout. Returns the number moved."""
+    moved = 0
+    for area, root in AREA_DIRS.items():
+        target = LAYOUTS[layout](root)
+        sources = [cls(root) for name, cls in LAYOUTS.items() if name != layout]
+        for source in sources:
+            # Materialize first: the tree changes while files are moved
+            for entry in list(source.iter_files()):
+                if entry.name.startswith("."):
+                    continue
+                # Where the layout puts the name, not where path() finds it now
+                destination = os.path.join(target.directory(entry.name), entry.name)
+                if os.path.abspath(entry.path) == destination:
+                    continue
+                if os.path.exists(destination):
+                    print(f"Skipping {entry.path}: {destination} already exists")
+                    continue
+                print(f"{entry.path} -> {destination}")
+                if not dry_run:
+                    os.makedirs(os.path.dirname(destination), exist_ok=True)
+                    os.replace(entry.path, destination)
+                moved += 1
+    return moved
+
+
+def detach(dry_run: bool = False) -> int:
+    """
+    Replace files that share their inode with another name (hard links into
+    the content store made by earlier versions) with copies of their own.
+    Returns the number of files detached.
+    """
+    from fastapiRouter import content_store
+
+    detached = 0
+    for area in AREA_DIRS:
+        for entry in list(get(area).iter_files()):
+            if entry.name.startswith(".") or entry.stat().st_nlink < 2:
+                continue
+            print(f"Detaching {entry.path}")
+            if not dry_run:
+                content_store.copy_file(entry.path, entry.path)
+            detached += 1
+    return detached
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="PDF storage layout tools")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    migrate_parser = subcommands.add_parser("migrate", help="convert the pdfs tree to another layout")
+    migrate_parser.add_argument("--to", choices=list(LAYOUTS), required=True)
+    migrate_parser.add_argument("--dry-run", action="store_true")
+    detach_parser = subcommands.add_parser("detach", help="replace hard links into the store with copies")
+    detach_parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    if args.command == "detach":
+        count = detach(args.dry_run)
+        print(f"{'Would detach' if args.dry_run else 'Detached'} {count} files")
+    else:
+        count = migrate(args.to, args.dry_run)
+        print(f"{'Would move' if args.dry_run else 'Moved'} {count} files")
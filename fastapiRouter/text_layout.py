@@ -0,0 +1,153 @@
+"""
+Text flow for the pages drawn with reportlab (review page, decrypted
+information overlay).
+
+wrap_text() breaks text into lines that fit a width, measured with the
+font's metrics, and yields them one at a time. TextFlow draws those lines on
+a canvas and starts a new page whenever the current one is full, so long
+input is laid out page by page without holding all lines in memory.
+
+Both run in linear time in the length of the text: character widths are
+looked up in a per-font table filled on first use instead of measuring the
+growing line again for every word.
+"""
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfgen.canvas import Canvas
+
+
+class _WidthTable(dict):
+    """Character -> width at font size 1, measured on first use."""
+
+    def __init__(self, font_name: str):
+        super().__init__()
+        self.font_name = font_name
+
+    def __missing__(self, char: str) -> float:
+        width = self[char] = pdfmetrics.stringWidth(char, self.font_name, 1)
+        return width
+
+
+_width_tables: Dict[str, _WidthTable] = {}
+
+
+def _width_table(font_name: str) -> _WidthTable:
+    table = _width_tables.get(font_name)
+    if table is None:
+        table = _width_tables.setdefault(font_name, _WidthTable(font_name))
+    return table
+
+
+def _split_word(word: str, table: _WidthTable, font_size: float,
+                max_width: float) -> Iterator[Tuple[str, float]]:
+    """Break a word wider than max_width (URLs, ciphertext) into pieces that fit."""
+    start = 0
+    width = 0.0
+    for index, char in enumerate(word):
+        char_width = table[char] * font_size
+        if width + char_width > max_width and index > start:
+            yield word[start:index], width
+            start = index
+            width = 0.0
+        width += char_width
+    yield word[start:], width
+
+
+def wrap_text(text: str, font_name: str, font_size: float, max_width: float) -> Iterator[str]:
+    """
+    Yield the lines of text wrapped to max_width points. Line breaks in the
+    text are kept (an empty line stays empty), runs of whitespace become a
+    single space, and words longer than a line are broken between characters.
+    """
+    table = _width_table(font_name)
+    space_width = table[" "] * font_size
+
+    for paragraph in text.split("\n"):
+        words = []
+        line_width = 0.0
+        for word in paragraph.split():
+            word_width = sum(map(table.__getitem__, word)) * font_size
+            if word_width > max_width:
+                if words:
+                    yield " ".join(words)
+                pieces = list(_split_word(word, table, font_size, max_width))
+                for piece, _ in pieces[:-1]:
+                    yield piece
+                word, word_width = pieces[-1]
+                words = []
+
+            if words and line_width + space_width + word_width > max_width:
+                yield " ".join(words)
+                words = []
+
+            if words:
+                line_width += space_width + word_width
+            else:
+                line_width = word_width
+            words.append(word)
+        yield " ".join(words)
+
+
+class TextFlow:
+    """
+    Draws wrapped text on a reportlab canvas from (x, y) downwards and
+    continues on a new page when the next line would fall below bottom.
+
+    on_new_page, if given, draws the header of a continuation page and
+    returns the y position the text continues from; otherwise text continues
+    from top. Call finish() before saving the canvas.
+    """
+
+    def __init__(self, can: Canvas, x: float, y: float, width: float, bottom: float = 50,
+                 top: Optional[float] = None, font_name: str = "Helvetica", font_size: float = 12,
+                 leading: Optional[float] = None,
+                 on_new_page: Optional[Callable[[Canvas], float]] = None):
+        self.canvas = can
+        self.x = x
+        self.y = y
+        self.width = width
+        self.bottom = bottom
+        self.top = y if top is None else top
+        self.font_name = font_name
+        self.font_size = font_size
+        self.leading = leading or font_size * 1.2
+        self.on_new_page = on_new_page
+        self.pages = 1
+        self._text = None
+
+    def _text_object(self):
+        if self._text is None:
+            # One text object per page keeps the content stream small
+            self._text = self.canvas.beginText(self.x, self.y)
+            self._text.setFont(self.font_name, self.font_size, self.leading)
+        return self._text
+
+    def _new_page(self):
+        self.finish()
+        self.canvas.showPage()
+        self.pages += 1
+        self.y = self.on_new_page(self.canvas) if self.on_new_page else self.top
+
+    def skip(self, height: float):
+        """Leave height points of vertical space."""
+        self.y -= height
+        if self._text is not None:
+            self._text.setTextOrigin(self.x, self.y)
+
+    def draw_line(self, line: str):
+        if self.y < self.bottom:
+            self._new_page()
+        self._text_object().textLine(line)
+        self.y -= self.leading
+
+    def write(self, text: str):
+        """Wrap text to the flow's width and draw it in the current font."""
+        for line in wrap_text(text, self.font_name, self.font_size, self.width):
+            self.draw_line(line)
+
+    def finish(self):
+        """Draw the text of the current page onto the canvas."""
+        if self._text is not None:
+            self.canvas.drawText(self._text)
+            self._text = None
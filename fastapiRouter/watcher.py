@@ -0,0 +1,317 @@
+"""
+Directory-watch ingestion daemon.
+
+Watches UPLOAD_DIR for new PDFs and runs anonymization and categorization
+on them through a bounded process pool, writing processed_<name> into
+PROCESS_DIR. An upload is skipped when the content store records that its
+current output was made from the same content and options, so touched or
+re-uploaded duplicates are not processed again. Run it from the project
+root next to the FastAPI app:
+
+    python -m fastapiRouter.watcher --jobs 4
+"""
+import argparse
+import ctypes
+import ctypes.util
+import json
+import os
+import select
+import struct
+import sys
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# inotify event flags (see <sys/inotify.h>)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class PollingWatcher:
+    """Portable fallback that rescans the storages on every call."""
+
+    def __init__(self, stores: Iterable, interval: float = 1.0):
+        self.stores = list(stores)
+        self.interval = interval
+        self._seen: Dict[str, Tuple[int, float]] = {}
+        self._primed = False
+
+    def _scan(self) -> Dict[str, Tuple[int, float]]:
+        current = {}
+        for store in self.stores:
+            try:
+                for entry in store.iter_files():
+                    stat = entry.stat()
+                    current[entry.path] = (stat.st_size, stat.st_mtime)
+            except FileNotFoundError:
+                continue
+        return current
+
+    def read(self, timeout: float) -> Set[str]:
+        """Return paths created, changed or removed since the previous call."""
+        if self._primed:
+            time.sleep(min(timeout, self.interval))
+        current = self._scan()
+        changed = {path for path, info in current.items() if self._seen.get(path) != info}
+        changed.update(path for path in self._seen if path not in current)
+        self._seen = current
+        self._primed = True
+        return changed
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """Linux inotify watcher using libc directly, no third-party packages."""
+
+    MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_MOVED_FROM | IN_CREATE | IN_MODIFY | IN_DELETE
+
+    def __init__(self, paths: Iterable[str]):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        self._dirs: Dict[int, str] = {}
+        for path in paths:
+            wd = libc.inotify_add_watch(self._fd, os.fsencode(path), self.MASK)
+            if wd < 0:
+                os.close(self._fd)
+                raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {path}")
+            self._dirs[wd] = path
+
+    def read(self, timeout: float) -> Set[str]:
+        changed = set()
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return changed
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return changed
+
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if name and wd in self._dirs:
+                changed.add(os.path.join(self._dirs[wd], os.fsdecode(name)))
+        return changed
+
+    def close(self):
+        os.close(self._fd)
+
+
+def create_watcher(stores: Iterable, force_polling: bool = False, interval: float = 1.0):
+    """
+    Use inotify where available and fall back to polling elsewhere. Sharded
+    storages are always polled, since inotify does not watch subdirectories.
+    """
+    stores = list(stores)
+    if (not force_polling and sys.platform.startswith("linux")
+            and not any(store.sharded for store in stores)):
+        try:
+            return InotifyWatcher([store.root for store in stores])
+        except (OSError, AttributeError) as e:
+            print(f"inotify unavailable ({e}), falling back to polling")
+    return PollingWatcher(stores, interval)
+
+
+class Debouncer:
+    """
+    Tracks files that are still being written. A path is reported as ready
+    once its size and mtime have not changed for `settle` seconds.
+    """
+
+    def __init__(self, settle: float = 2.0):
+        self.settle = settle
+        self._pending: Dict[str, Tuple[int, float, float]] = {}
+
+    def touch(self, path: str):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            self._pending.pop(path, None)
+            return
+        signature = (stat.st_size, stat.st_mtime)
+        previous = self._pending.get(path)
+        if previous is None or previous[:2] != signature:
+            self._pending[path] = (*signature, time.monotonic())
+
+    def ready(self) -> List[str]:
+        now = time.monotonic()
+        done = []
+        for path, (size, mtime, changed_at) in list(self._pending.items()):
+            if now - changed_at < self.settle:
+                continue
+            # Re-check in case a write landed without an event (polling, NFS)
+            self.touch(path)
+            entry = self._pending.get(path)
+            if entry is not None and entry[2] == changed_at:
+                del self._pending[path]
+                done.append(path)
+        return done
+
+    @property
+    def next_deadline(self) -> Optional[float]:
+        if not self._pending:
+            return None
+        return min(entry[2] for entry in self._pending.values()) + self.settle - time.monotonic()
+
+
+def is_candidate(path: str) -> bool:
+    name = os.path.basename(path)
+    # Skip temporary and hidden files such as in-progress uploads
+    return name.lower().endswith(".pdf") and not name.startswith(".")
+
+
+def options_key(options: Dict) -> str:
+    """Key of the encryption options, as the store keys processed outputs."""
+    import main
+
+    return main.result_key(main.EncryptionOptions(**options))
+
+
+def needs_processing(path: str, process_store, key: str) -> bool:
+    """
+    Whether the upload has no output made from its current content with
+    these options. Outputs are copies written whenever they are published,
+    so their mtime says nothing about the input; the record process_file()
+    leaves in the store does. The upload is only hashed again when its size
+    or mtime changed since that record.
+    """
+    from fastapiRouter import content_store
+
+    output_filename = f"processed_{os.path.basename(path)}"
+    if not process_store.exists(output_filename):
+        return True
+    record = content_store.load_published(output_filename)
+    if record is None or record.get("options_key") != key:
+        return True
+    try:
+        stat = os.stat(path)
+        if [stat.st_size, stat.st_mtime_ns] == record.get("input_stat"):
+            return False
+        return content_store.file_digest(path) != record.get("input_digest")
+    except FileNotFoundError:
+        # Removed while waiting; nothing to do
+        return False
+
+
+def process_file(path: str, options: Dict) -> Dict:
+    """Anonymize and categorize one upload. Runs inside a pool worker."""
+    # Imported here so the watcher module stays importable from main.py
+    import main
+    from fastapiRouter import atomic_io, categorize, content_store, layout_cache, preflight, storage
+
+    start = time.perf_counter()
+    filename = os.path.basename(path)
+    # Taken before hashing, so a write during hashing shows up as a change later
+    stat = os.stat(path)
+    digest = content_store.file_digest(path)
+
+    verdict = preflight.check(digest, path)
+    if verdict.rejected:
+        raise ValueError(f"PDF rejected: {verdict.error}")
+
+    output_filename = f"processed_{filename}"
+    output_path = storage.get("processed").path_for_write(output_filename)
+    with atomic_io.file_lock(output_path):
+        stored_path, mapping, deduplicated = main.process_pdf_with_store(
+            digest, main.EncryptionOptions(**options), path, verdict.has_text)
+        content_store.copy_file(stored_path, output_path)
+        content_store.save_published(output_filename, {
+            "input_digest": digest,
+            "input_stat": [stat.st_size, stat.st_mtime_ns],
+            "options_key": main.result_key(main.EncryptionOptions(**options)),
+        })
+
+    categories = categorize.categorize_with_store(
+        digest, lambda: layout_cache.get(digest, path).text if verdict.has_text else "")
+
+    return {
+        "filename": filename,
+        "processed_filename": output_filename,
+        "primary_category": categories["primary_category"],
+        "total_replacements": mapping["total_replacements"],
+        "deduplicated": deduplicated,
+        "seconds": round(time.perf_counter() - start, 3)
+    }
+
+
+def run(upload_store, process_store, jobs: int, settle: float,
+        force_polling: bool, interval: float, options: Dict):
+    watcher = create_watcher([upload_store], force_polling, interval)
+    debouncer = Debouncer(settle)
+    queue = deque()
+    queued: Set[str] = set()
+    in_flight = {}
+    key = options_key(options)
+
+    # Pick up files that arrived while the watcher was not running
+    for entry in upload_store.iter_files():
+        if is_candidate(entry.path):
+            debouncer.touch(entry.path)
+
+    print(f"Watching {upload_store.root} with {jobs} workers ({type(watcher).__name__})")
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        try:
+            while True:
+                deadline = debouncer.next_deadline
+                timeout = 1.0 if deadline is None else max(0.05, min(1.0, deadline))
+                for path in watcher.read(timeout):
+                    if is_candidate(path):
+                        debouncer.touch(path)
+
+                for path in debouncer.ready():
+                    if path not in queued and needs_processing(path, process_store, key):
+                        queue.append(path)
+                        queued.add(path)
+
+                # Keep every worker busy while bounding the number of submitted tasks
+                while queue and len(in_flight) < jobs * 2:
+                    path = queue.popleft()
+                    in_flight[pool.submit(process_file, path, options)] = path
+
+                if in_flight:
+                    done, _ = wait(list(in_flight), timeout=0, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        path = in_flight.pop(future)
+                        queued.discard(path)
+                        try:
+                            print(json.dumps(future.result()))
+                        except Exception as e:
+                            print(f"Failed to process {path}: {str(e)}")
+        except KeyboardInterrupt:
+            print("Stopping watcher")
+        finally:
+            watcher.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Anonymize and categorize PDFs as they land in UPLOAD_DIR")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                        help="number of worker processes (default: all cores)")
+    parser.add_argument("--settle", type=float, default=2.0,
+                        help="seconds a file must stay unchanged before it is processed")
+    parser.add_argument("--poll", action="store_true", help="use polling instead of inotify")
+    parser.add_argument("--interval", type=float, default=1.0, help="polling interval in seconds")
+    parser.add_argument("--options", default="{}", help="encryption options as JSON")
+    args = parser.parse_args()
+
+    from fastapiRouter import storage
+
+    run(storage.get("uploads"), storage.get("processed"), args.jobs, args.settle, args.poll, args.interval,
+        json.loads(args.options))
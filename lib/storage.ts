@@ -0,0 +1,58 @@
+import { createHash } from 'crypto';
+import fs from 'fs';
+import path from 'path';
+
+// Same areas and layouts as fastapiRouter/storage.py. A file is either
+// directly in its area's directory (flat layout, and everything the upload
+// routes write) or in xx/yy/ below it, keyed by the MD5 of its name
+// (PDF_STORAGE_LAYOUT=sharded). Both places are checked, so these helpers
+// work with either layout.
+export const AREA_DIRS = {
+  uploads: path.join(process.cwd(), 'pdfs'),
+  processed: path.join(process.cwd(), 'pdfs', 'processed'),
+  reviewed: path.join(process.cwd(), 'pdfs', 'reviewed'),
+  decrypted: path.join(process.cwd(), 'pdfs', 'decrypted'),
+};
+
+export type Area = keyof typeof AREA_DIRS;
+
+const SHARD = /^[0-9a-f]{2}$/;
+
+function shardedPath(area: Area, name: string): string {
+  const digest = createHash('md5').update(name, 'utf8').digest('hex');
+  return path.join(AREA_DIRS[area], digest.slice(0, 2), digest.slice(2, 4), name);
+}
+
+// Path of an existing file in an area, or null if there is none
+export function findPdf(area: Area, filename: string): string | null {
+  const name = path.basename(filename);
+  for (const candidate of [path.join(AREA_DIRS[area], name), shardedPath(area, name)]) {
+    if (fs.existsSync(candidate) && fs.statSync(candidate).isFile()) {
+      return candidate;
+    }
+  }
+  return null;
+}
+
+function subdirectories(dir: string): string[] {
+  return fs.readdirSync(dir, { withFileTypes: true })
+    .filter(entry => entry.isDirectory() && SHARD.test(entry.name))
+    .map(entry => path.join(dir, entry.name));
+}
+
+// Names of the files in an area, or null if its directory does not exist
+export function listPdfs(area: Area): string[] | null {
+  const root = AREA_DIRS[area];
+  if (!fs.existsSync(root)) {
+    return null;
+  }
+  const names: string[] = [];
+  for (const dir of [root, ...subdirectories(root).flatMap(subdirectories)]) {
+    for (const entry of fs.readdirSync(dir, { withFileTypes: true })) {
+      if (entry.isFile() && entry.name.toLowerCase().endsWith('.pdf')) {
+        names.push(entry.name);
+      }
+    }
+  }
+  return names;
+}
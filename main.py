@@ -1,27 +1,42 @@
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi import FastAPI, HTTPException
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Request
 from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
 from pydantic import BaseModel
-from typing import Dict, List, Optional
+from typing import Dict, List, Literal, Optional, Union
 import fitz  # PyMuPDF
 import re
 import os
-from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
-from cryptography.hazmat.primitives import padding
-from cryptography.hazmat.backends import default_backend
 import hashlib
 import io
 import json
+import logging
+import tempfile
+
+from fastapiRouter import addDecryptedInfo, review, categorize, decrypt, metrics, content_store, file_index, storage, atomic_io, layout_cache, entities, page_templates, admission, single_flight, pdf_response, ciphertext, preflight, profiling, gazetteer, preview, logs
+
+# Log records are written by a background thread (see logs)
+logs.setup()
+logger = logging.getLogger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The file index scans the storage areas in a thread of its own
+    file_index.start()
+    yield
 
-from fastapiRouter import addDecryptedInfo, review, categorize, decrypt
 
 # Create FastAPI instance with custom docs and openapi url
-app = FastAPI(docs_url="/api/py/docs", openapi_url="/api/py/openapi.json")
+app = FastAPI(docs_url="/api/py/docs", openapi_url="/api/py/openapi.json", lifespan=lifespan)
 
 app.include_router(review.router)
 app.include_router(categorize.router)
 app.include_router(decrypt.router)
 app.include_router(addDecryptedInfo.router)
+app.include_router(metrics.router)
+app.include_router(file_index.router)
+app.include_router(preview.router)
 
 # Add CORS middleware
 app.add_middleware(
@@ -32,6 +47,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request ids for the log lines and the X-Request-Id response header
+app.add_middleware(logs.RequestIdMiddleware)
+
+# Opt-in request profiling; the middleware is not installed when disabled
+if profiling.PROFILING_ENABLED:
+    app.add_middleware(profiling.ProfilingMiddleware)
+
 # Encryption setup
 ENCRYPTION_KEY = os.getenv(
     "ENCRYPTION_KEY", "your-secure-encryption-key-min-32-chars")
@@ -46,6 +68,26 @@ PROCESS_DIR = os.path.join(os.getcwd(), "pdfs", "processed")
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 os.makedirs(PROCESS_DIR, exist_ok=True)
 
+# Upload limits for the streaming upload endpoint
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(100 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+# Named save profiles for the anonymized output, trading save time for file size
+SAVE_PROFILES = {
+    # Minimal garbage collection, streams are written as they are
+    "fast": {"garbage": 1, "deflate": False},
+    "balanced": {"garbage": 2, "deflate": True},
+    # Full garbage collection, recompress everything and pack objects into streams
+    "compact": {"garbage": 4, "deflate": True, "deflate_images": True,
+                "deflate_fonts": True, "use_objstms": 1},
+}
+
+DEFAULT_SAVE_PROFILE = os.getenv("PDF_SAVE_PROFILE", "balanced")
+if DEFAULT_SAVE_PROFILE not in SAVE_PROFILES:
+    raise ValueError(
+        f"Unknown PDF_SAVE_PROFILE '{DEFAULT_SAVE_PROFILE}', expected one of {list(SAVE_PROFILES)}")
+
 
 class EncryptionOptions(BaseModel):
     name: bool = True
@@ -53,46 +95,105 @@ class EncryptionOptions(BaseModel):
     affiliation: bool = True
     title: bool = False
     address: bool = False
+    # Overrides PDF_SAVE_PROFILE for this request
+    save_profile: Optional[Literal["fast", "balanced", "compact"]] = None
+
+
+def result_key(options: EncryptionOptions) -> str:
+    """
+    Key of the stored outputs for a set of options. Includes the settings
+    that change the output without being part of the request: the save
+    profile in effect and the ciphertext format.
+    """
+    return content_store.options_key({
+        **options.dict(),
+        "save_profile": options.save_profile or DEFAULT_SAVE_PROFILE,
+        "ciphertext_format": ciphertext.CIPHERTEXT_FORMAT,
+    })
 
 
 def encrypt_aes(text: str) -> str:
-    iv = os.urandom(16)
-    cipher = Cipher(algorithms.AES(encryption_key),
-                    modes.CBC(iv), backend=default_backend())
-    encryptor = cipher.encryptor()
-    padder = padding.PKCS7(128).padder()
-    padded_data = padder.update(text.encode()) + padder.finalize()
-    encrypted = encryptor.update(padded_data) + encryptor.finalize()
-    return f"{iv.hex()}:{encrypted.hex()}"
+    # Compact "~..." value, or legacy "iv:ciphertext" hex with CIPHERTEXT_FORMAT=hex
+    return ciphertext.encrypt(text, encryption_key)
 
 
 def hash_sha256(text: str) -> str:
     return hashlib.sha256(text.encode()).hexdigest()
-def extract_ieee_author_info(doc: fitz.Document, process_percentage=0.5) -> dict:
+
+
+# Organisations and locations, including those the gazetteer does not know
+AFFILIATION_PATTERNS = [re.compile(pattern) for pattern in (
+    # Department pattern
+    r'(Department\s+of\s+[\w\s\-,&]+)',
+    # School pattern
+    r'(School\s+of\s+[\w\s\-,&]+)',
+    # University/Institute/College pattern
+    r'((?:University|Institute|College)\s+of\s+[\w\s\-,&]+)',
+    r'((?:University|Institute|College)\s+[\w\s\-,&]+)',
+    # Location with country
+    r'([A-Z][a-z]+(?:\s+[A-Z][a-z]+)?,\s+[A-Z][a-z]+)',
+)]
+
+
+# No pattern matches it, so text joined with it is never matched across the joins
+AFFILIATION_SEPARATOR = "\x00"
+
+
+def regex_affiliations(text: str) -> List[str]:
+    return [affiliation.strip() for pattern in AFFILIATION_PATTERNS for affiliation in pattern.findall(text)]
+
+
+def find_affiliations(block_text: str) -> List[str]:
+    """
+    Affiliations in a text block: the names the gazetteer knows, plus what
+    the regexes find in the text around them (labs, cities, countries,
+    organisations it does not list). The known names are cut out first, so
+    no regex match repeats or overlaps one, and the regexes do not cross a
+    line break there; names wrapped over lines are the gazetteer's. Without
+    a gazetteer the regexes run on the whole block.
+    """
+    index = gazetteer.get()
+    if index is None:
+        return regex_affiliations(block_text)
+
+    spans = index.spans(block_text)
+    affiliations = [" ".join(block_text[start:end].split()) for start, end in spans]
+    starts = [0] + [end for _, end in spans]
+    ends = [start for start, _ in spans] + [len(block_text)]
+    # One pass over the text between the names, cut apart where the names and line breaks were
+    outside = AFFILIATION_SEPARATOR.join(block_text[start:end] for start, end in zip(starts, ends))
+    affiliations.extend(regex_affiliations(outside.replace("\n", AFFILIATION_SEPARATOR)))
+    return affiliations
+
+def extract_ieee_author_info(doc: fitz.Document, process_percentage=0.5) -> entities.AuthorInfo:
     """
     Extract author information specifically from IEEE papers
     focussing on the specified percentage of the first page
     """
+    return extract_author_info_from_layout(
+        layout_cache.from_document(doc, full_text=False), process_percentage)
+
+def extract_author_info_from_layout(layout: layout_cache.DocumentLayout,
+                                    process_percentage=0.5) -> entities.AuthorInfo:
+    """
+    Same as extract_ieee_author_info(), working from a cached document layout
+    instead of an open PDF
+    """
     # Get text from only the first page where author info is typically found
-    first_page = doc[0]
-    text = first_page.get_text()
+    text = layout.first_page_text
+    page_height = layout.first_page_size[1]
 
     # Process the specified percentage of the first page
     header_section = text[:int(len(text) * process_percentage)]
 
     # Initialize results
-    authors_info = {
-        "names": [],
-        "emails": [],
-        "affiliations": [],
-        "title": ""  # Added field to capture paper title
-    }
+    authors_info = entities.AuthorInfo()
 
     # Get blocks for more structured analysis
-    blocks = first_page.get_text("blocks")
+    blocks = layout.first_page_blocks
     
     # Filter blocks to the top portion of the page
-    top_blocks = [block for block in blocks if block[1] < first_page.rect.height * process_percentage]
+    top_blocks = [block for block in blocks if block[1] < page_height * process_percentage]
     
     # Extract paper title first - usually the biggest text at the top
     # Sort blocks by font size (approximated by block height) - largest first
@@ -100,7 +201,7 @@ def extract_ieee_author_info(doc: fitz.Document, process_percentage=0.5) -> dict
     
     if title_candidates and title_candidates[0][3] - title_candidates[0][1] > 12:  # Title usually has larger text
         # Store the title but don't add it to things to encrypt unless specifically requested
-        authors_info["title"] = title_candidates[0][4].strip()
+        authors_info.title = title_candidates[0][4].strip()
         # Remove this block from further processing to avoid misidentification
         top_blocks.remove(title_candidates[0])
     
@@ -111,8 +212,7 @@ def extract_ieee_author_info(doc: fitz.Document, process_percentage=0.5) -> dict
         # Extract emails first - they're the most reliable identifiers
         emails = re.findall(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', block_text)
         for email in emails:
-            if email not in authors_info["emails"]:
-                authors_info["emails"].append(email)
+            if authors_info.emails.add(email):
                 
                 # Extract the name part from email (often first.last@domain)
                 name_part = email.split('@')[0]
@@ -120,9 +220,9 @@ def extract_ieee_author_info(doc: fitz.Document, process_percentage=0.5) -> dict
                     # Try to reconstruct a name from the email
                     parts = name_part.split('.')
                     constructed_name = ' '.join([part.capitalize() for part in parts])
-                    if constructed_name not in authors_info["names"] and len(constructed_name) > 5:
-                        # Only add if it's not already there and a reasonable length
-                        authors_info["names"].append(constructed_name)
+                    if len(constructed_name) > 5:
+                        # Only add if it's a reasonable length; duplicates are ignored
+                        authors_info.names.add(constructed_name)
         
         # If this block contains an email, it's likely an author block
         # Extract name that might be at the beginning of the block
@@ -138,30 +238,14 @@ def extract_ieee_author_info(doc: fitz.Document, process_percentage=0.5) -> dict
                 # Check if it looks like a name
                 words = potential_name.split()
                 if len(words) >= 2 and all(word[0].isupper() for word in words if len(word) > 1):
-                    if potential_name not in authors_info["names"]:
-                        authors_info["names"].append(potential_name)
+                    authors_info.names.add(potential_name)
         
         # Extract department and affiliation information
-        affiliation_patterns = [
-            # Department pattern
-            r'(Department\s+of\s+[\w\s\-,&]+)',
-            # School pattern
-            r'(School\s+of\s+[\w\s\-,&]+)',
-            # University/Institute/College pattern
-            r'((?:University|Institute|College)\s+of\s+[\w\s\-,&]+)',
-            r'((?:University|Institute|College)\s+[\w\s\-,&]+)',
-            # Location with country
-            r'([A-Z][a-z]+(?:\s+[A-Z][a-z]+)?,\s+[A-Z][a-z]+)'
-        ]
-        
-        for pattern in affiliation_patterns:
-            affiliations = re.findall(pattern, block_text)
-            for affiliation in affiliations:
-                if affiliation not in authors_info["affiliations"]:
-                    authors_info["affiliations"].append(affiliation.strip())
+        for affiliation in find_affiliations(block_text):
+            authors_info.affiliations.add(affiliation)
     
     # Fallback for names if email-based approach didn't find enough
-    if len(authors_info["emails"]) >= 1 and len(authors_info["names"]) < len(authors_info["emails"]):
+    if len(authors_info.emails) >= 1 and len(authors_info.names) < len(authors_info.emails):
         # Look for "standard" author name patterns in blocks that contain affiliations
         for block in top_blocks:
             block_text = block[4]
@@ -171,7 +255,7 @@ def extract_ieee_author_info(doc: fitz.Document, process_percentage=0.5) -> dict
                 continue
                 
             # Check if there's any indication this is an author block
-            has_affiliation = any(aff in block_text for aff in authors_info["affiliations"])
+            has_affiliation = any(aff in block_text for aff in authors_info.affiliations)
             has_location = re.search(r'\b(?:India|USA|UK|Germany|France|Japan|China|Canada)\b', block_text)
             
             if has_affiliation or has_location or 'Department' in block_text or 'University' in block_text:
@@ -184,99 +268,235 @@ def extract_ieee_author_info(doc: fitz.Document, process_percentage=0.5) -> dict
                     words = name.split()
                     if (2 <= len(words) <= 4 and 
                         4 <= len(name) <= 30 and 
-                        name not in authors_info["names"] and
                         not any(word in name for word in ["Department", "University", "College", "Institute", "School"])):
-                        authors_info["names"].append(name)
-    
-    # Remove duplicates while preserving order
-    authors_info["names"] = list(dict.fromkeys(authors_info["names"]))
-    authors_info["emails"] = list(dict.fromkeys(authors_info["emails"]))
-    authors_info["affiliations"] = list(dict.fromkeys(authors_info["affiliations"]))
+                        authors_info.names.add(name)
     
     # Final validation: if we found significantly more names than emails, 
     # we might have false positives - limit to a reasonable ratio
-    if len(authors_info["emails"]) > 0 and len(authors_info["names"]) > len(authors_info["emails"]) * 3:
+    if len(authors_info.emails) > 0 and len(authors_info.names) > len(authors_info.emails) * 3:
         # Too many names compared to emails - possible false positives
         # Keep the first names that match the number of emails multiplied by a reasonable factor
-        authors_info["names"] = authors_info["names"][:len(authors_info["emails"]) * 2]
+        authors_info.names.truncate(len(authors_info.emails) * 2)
     
     return authors_info
 
-def process_pdf_for_ieee(pdf_bytes: bytes, options: EncryptionOptions) -> tuple:
-    # Open the PDF for inspection
-    doc = fitz.open("pdf", pdf_bytes)
-    
-    # Extract author information from a larger portion of the first page
-    author_info = extract_ieee_author_info(
-        doc, process_percentage=0.5)  # Process top 50%
-    
-    # Close the doc after inspection
-    doc.close()
+def add_encryption_info_pages(doc: fitz.Document, encrypted_data: List[entities.EncryptedField],
+                              author_info: entities.AuthorInfo,
+                               options: EncryptionOptions, page_width: float, page_height: float):
+    """
+    Append the structured "ENCRYPTED INFORMATION" pages to the end of the document.
+    The page headers come from cached page templates; the text and lines of each
+    page are collected in one Shape and written with a single commit per page.
+    """
+    try:
+        # Add a new page at the end, with the title already on it
+        new_page = page_templates.new_page(doc, "encryption", page_width, page_height)
+        shape = new_page.new_shape()
+        
+        # Add simple information about what was encrypted
+        y_position = 80
+        
+        if options.name and author_info.names:
+            shape.insert_text(
+                fitz.Point(50, y_position),
+                f"Author Names: {len(author_info.names)} found and encrypted",
+                fontsize=10
+            )
+            y_position += 20
+            
+        if options.email and author_info.emails:
+            shape.insert_text(
+                fitz.Point(50, y_position),
+                f"Emails: {len(author_info.emails)} found and encrypted",
+                fontsize=10
+            )
+            y_position += 20
+            
+        if options.affiliation and author_info.affiliations:
+            
+            shape.insert_text(
+                fitz.Point(50, y_position),
+                f"Affiliations: {len(author_info.affiliations)} found and encrypted",
+                fontsize=10
+            )
+            y_position += 20
+        
+        # Add a separator
+        y_position += 10
+        shape.draw_line(
+            fitz.Point(50, y_position),
+            fitz.Point(page_width - 50, y_position)
+        )
+        shape.finish(color=(0, 0, 0), closePath=False)
+        y_position += 20
+        
+        # Add details section title
+        shape.insert_text(
+            fitz.Point(50, y_position),
+            "Encryption Details:",
+            fontsize=12,
+            fontname="Helvetica-Bold"
+        )
+        y_position += 30
+        
+        # Add each encrypted item with limited width to avoid overflow
+        current_x = 50
+        max_width = page_width - 100  # 50px margins on each side
+
+        for item in encrypted_data:
+            key = item.kind
+            original = item.original
+            encrypted = item.encrypted  # Don't truncate
+            
+            # Add the item type
+            shape.insert_text(
+                fitz.Point(current_x, y_position),
+                f"{key.capitalize()}:",
+                fontsize=10,
+                fontname="Helvetica-Bold"
+            )
+            y_position += 20  # Increase spacing
+            
+            # Add original value (can still truncate if needed)
+            if len(original) > 70:
+                original = original[:67] + "..."
+            
+            # shape.insert_text(
+            #     fitz.Point(current_x, y_position),
+            #     f"Original: {original}",
+            #     fontsize=9
+            # )
+            y_position += 10  # Increase spacing
+            
+            # Add encrypted value - handle long encrypted values
+            # Start the encrypted value text
+            encrypted_text = f"Encrypted: [{encrypted}]"
+            
+            # Calculate how many characters can fit on one line
+            # Approximate 6 pixels per character for font size 9
+            chars_per_line = int((max_width - current_x) / 6)
+            
+            # Break the encrypted text into multiple lines if needed
+            if len(encrypted_text) > chars_per_line:
+                # Print first line
+                shape.insert_text(
+                    fitz.Point(current_x, y_position),
+                    encrypted_text[:chars_per_line],
+                    fontsize=9
+                )
+                y_position += 15
+                
+                # Print remaining lines
+                remaining = encrypted_text[chars_per_line:]
+                while remaining:
+                    # Check if we need a new page
+                    if y_position > page_height - 50:
+                        shape.commit()
+                        new_page = page_templates.new_page(doc, "encryption_continued", page_width, page_height)
+                        shape = new_page.new_shape()
+                        y_position = 80  # Below the template title
+                    
+                    # Print the next line
+                    shape.insert_text(
+                        fitz.Point(current_x, y_position),
+                        remaining[:chars_per_line],
+                        fontsize=9
+                    )
+                    remaining = remaining[chars_per_line:]
+                    y_position += 15
+            else:
+                # Print the entire encrypted text on one line
+                shape.insert_text(
+                    fitz.Point(current_x, y_position),
+                    encrypted_text,
+                    fontsize=9
+                )
+                y_position += 20
+            
+            # Add a small separator with more space
+            y_position += 10  # Add more space before the separator
+            shape.draw_line(
+                fitz.Point(current_x, y_position),
+                fitz.Point(current_x + 100, y_position)
+            )
+            shape.finish(color=(0, 0, 0), closePath=False)
+            y_position += 25  # Add more space after the separator
+            
+            # Check if we need to start a new page
+            if y_position > page_height - 60:  # Increased margin
+                shape.commit()
+                new_page = page_templates.new_page(doc, "encryption_continued", page_width, page_height)
+                shape = new_page.new_shape()
+                y_position = 80  # Below the template title
+
+        shape.commit()
     
-    replacements = {}
-    encrypted_data = []
-
-    # Process names if option is enabled
-    if options.name and author_info["names"]:
-        for name in author_info["names"]:
-            encrypted = encrypt_aes(name)
-            encrypted_data.append({
-                "name": {
-                    "original": name,
-                    "encrypted": encrypted,
-                    "algorithm": "AES-256-CBC"
-                }
-            })
-            # Replace with asterisks instead of empty string
-            replacements[name] = "*" * len(name)
-
-    # Process emails if option is enabled
-    if options.email and author_info["emails"]:
-        for email in author_info["emails"]:
-            encrypted = encrypt_aes(email)
-            encrypted_data.append({
-                "email": {
-                    "original": email,
-                    "encrypted": encrypted,
-                    "algorithm": "AES-256-CBC"
-                }
-            })
-            # Replace with asterisks instead of empty string
-            replacements[email] = "*" * len(email)
-
-    # Process affiliations if option is enabled
-    if options.affiliation:
-        for affiliation in author_info["affiliations"]:
-            encrypted = encrypt_aes(affiliation)
-            encrypted_data.append({
-                "affiliation": {
-                    "original": affiliation,
-                    "encrypted": encrypted,
-                    "algorithm": "AES-256-CBC"
-                }
-            })
-            # Replace with asterisks instead of empty string
-            replacements[affiliation] = "*" * len(affiliation)
-
-    # Process title if option is explicitly enabled
-    if options.title and author_info["title"]:
-        encrypted = encrypt_aes(author_info["title"])
-        encrypted_data.append({
-            "title": {
-                "original": author_info["title"],
-                "encrypted": encrypted,
-                "algorithm": "AES-256-CBC"
-            }
-        })
-        # Replace with asterisks instead of empty string
-        replacements[author_info["title"]] = "*" * len(author_info["title"])
+    except Exception as e:
+        logger.exception("Error adding encryption information page")
+        # Continue with the PDF even if we can't add the encryption info page
+
 
-    # Open the PDF again for modification
-    doc = fitz.open("pdf", pdf_bytes)
+def open_pdf(source: Union[bytes, str]) -> fitz.Document:
+    """
+    Open a PDF from a file path or from in-memory bytes. Opening by path lets
+    MuPDF read the file on demand through the OS page cache instead of
+    holding a private copy of the whole input in the worker.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        return fitz.open(source)
+    return fitz.open("pdf", source)
+
+
+def process_pdf_for_ieee(source: Union[bytes, str], options: EncryptionOptions,
+                         digest: Optional[str] = None, extract: bool = True) -> tuple:
+    """
+    Anonymize a PDF. When the content digest is given, the document layout is
+    taken from (or added to) the layout cache, so later stages such as
+    categorization do not have to parse the document again. extract=False
+    skips looking for author information, for documents without a text
+    layer on the first page (see preflight).
+    """
+    # Open the PDF once; it is inspected first and then modified in place
+    with metrics.stage("parse"):
+        doc = open_pdf(source)
+    metrics.set_page_count(doc.page_count)
     
     # Verify the document has pages
     if doc.page_count == 0:
+        doc.close()
         raise ValueError("The PDF document contains no pages")
+    
+    # Extract author information from a larger portion of the first page
+    with metrics.stage("extract"):
+        if not extract:
+            author_info = entities.AuthorInfo()
+        else:
+            if digest is not None:
+                layout = layout_cache.for_document(digest, doc)
+            else:
+                layout = layout_cache.from_document(doc, full_text=False)
+            author_info = extract_author_info_from_layout(
+                layout, process_percentage=0.5)  # Process top 50%
+    
+    replacements = {}
+    encrypted_data: List[entities.EncryptedField] = []
+
+    # Values to encrypt, in the order they appear on the encryption page
+    selected = []
+    if options.name:
+        selected.extend(("name", name) for name in author_info.names)
+    if options.email:
+        selected.extend(("email", email) for email in author_info.emails)
+    if options.affiliation:
+        selected.extend(("affiliation", affiliation) for affiliation in author_info.affiliations)
+    # Title only if option is explicitly enabled
+    if options.title and author_info.title:
+        selected.append(("title", author_info.title))
+
+    for kind, value in selected:
+        encrypted_data.append(entities.EncryptedField(kind, value, encrypt_aes(value), ciphertext.algorithm()))
+        # Replace with asterisks instead of empty string
+        replacements[value] = "*" * len(value)
 
     # Sort replacements by length (longest first) to avoid partial replacements
     sorted_replacements = sorted(
@@ -286,17 +506,19 @@ def process_pdf_for_ieee(pdf_bytes: bytes, options: EncryptionOptions) -> tuple:
     page = doc[0]  # Get the first page
 
     # First, process specific text strings for replacement
-    for original, replacement in sorted_replacements:
-        instances = page.search_for(original)
-        
-        for rect in instances:
-            # Only redact if in the top 50% of the page
-            if rect.y0 < page.rect.height * 0.5:
-                # Use redaction annotation with asterisks instead of empty text
-                annot = page.add_redact_annot(rect, text=replacement)
+    with metrics.stage("search"):
+        for original, replacement in sorted_replacements:
+            instances = page.search_for(original)
+            
+            for rect in instances:
+                # Only redact if in the top 50% of the page
+                if rect.y0 < page.rect.height * 0.5:
+                    # Use redaction annotation with asterisks instead of empty text
+                    annot = page.add_redact_annot(rect, text=replacement)
                 
     # Apply all redactions
-    page.apply_redactions()
+    with metrics.stage("redact"):
+        page.apply_redactions()
     
     # Additional handling for author blocks that might be missed by string search
     # Process each text block in the first 50% of the page looking specifically for emails
@@ -332,184 +554,24 @@ def process_pdf_for_ieee(pdf_bytes: bytes, options: EncryptionOptions) -> tuple:
     
     # Create a structured encryption data page that's easy to read and process
     if encrypted_data:
-        try:
-            # Add a new page at the end
-            page_width = page.rect.width
-            page_height = page.rect.height
-            new_page = doc.new_page(-1, width=page_width, height=page_height)
-            
-            # Simple title at the top
-            new_page.insert_text(
-                fitz.Point(50, 50),
-                "ENCRYPTED INFORMATION",
-                fontsize=16,
-                fontname="Helvetica-Bold"
-            )
-            
-            # Add simple information about what was encrypted
-            y_position = 80
-            
-            if options.name and author_info["names"]:
-                new_page.insert_text(
-                    fitz.Point(50, y_position),
-                    f"Author Names: {len(author_info['names'])} found and encrypted",
-                    fontsize=10
-                )
-                y_position += 20
-                
-            if options.email and author_info["emails"]:
-                new_page.insert_text(
-                    fitz.Point(50, y_position),
-                    f"Emails: {len(author_info['emails'])} found and encrypted",
-                    fontsize=10
-                )
-                y_position += 20
-                
-            if options.affiliation and author_info["affiliations"]:
-                
-                new_page.insert_text(
-                    fitz.Point(50, y_position),
-                    f"Affiliations: {len(author_info['affiliations'])} found and encrypted",
-                    fontsize=10
-                )
-                y_position += 20
-            
-            # Add a separator
-            y_position += 10
-            new_page.draw_line(
-                fitz.Point(50, y_position),
-                fitz.Point(page_width - 50, y_position)
-            )
-            y_position += 20
-            
-            # Add details section title
-            new_page.insert_text(
-                fitz.Point(50, y_position),
-                "Encryption Details:",
-                fontsize=12,
-                fontname="Helvetica-Bold"
-            )
-            y_position += 30
-            
-            # Add each encrypted item with limited width to avoid overflow
-            current_x = 50
-            max_width = page_width - 100  # 50px margins on each side
-
-            for item in encrypted_data:
-                for key, value in item.items():
-                    original = value["original"]
-                    encrypted = value["encrypted"]  # Don't truncate
-                    
-                    # Add the item type
-                    new_page.insert_text(
-                        fitz.Point(current_x, y_position),
-                        f"{key.capitalize()}:",
-                        fontsize=10,
-                        fontname="Helvetica-Bold"
-                    )
-                    y_position += 20  # Increase spacing
-                    
-                    # Add original value (can still truncate if needed)
-                    if len(original) > 70:
-                        original = original[:67] + "..."
-                    
-                    # new_page.insert_text(
-                    #     fitz.Point(current_x, y_position),
-                    #     f"Original: {original}",
-                    #     fontsize=9
-                    # )
-                    y_position += 10  # Increase spacing
-                    
-                    # Add encrypted value - handle long encrypted values
-                    # Start the encrypted value text
-                    encrypted_text = f"Encrypted: [{encrypted}]"
-                    
-                    # Calculate how many characters can fit on one line
-                    # Approximate 6 pixels per character for font size 9
-                    chars_per_line = int((max_width - current_x) / 6)
-                    
-                    # Break the encrypted text into multiple lines if needed
-                    if len(encrypted_text) > chars_per_line:
-                        # Print first line
-                        new_page.insert_text(
-                            fitz.Point(current_x, y_position),
-                            encrypted_text[:chars_per_line],
-                            fontsize=9
-                        )
-                        y_position += 15
-                        
-                        # Print remaining lines
-                        remaining = encrypted_text[chars_per_line:]
-                        while remaining:
-                            # Check if we need a new page
-                            if y_position > page_height - 50:
-                                new_page = doc.new_page(-1, width=page_width, height=page_height)
-                                y_position = 50
-                                
-                                # Add "continued" header
-                                new_page.insert_text(
-                                    fitz.Point(50, y_position),
-                                    "ENCRYPTED INFORMATION (CONTINUED)",
-                                    fontsize=16,
-                                    fontname="Helvetica-Bold"
-                                )
-                                y_position += 30
-                            
-                            # Print the next line
-                            new_page.insert_text(
-                                fitz.Point(current_x, y_position),
-                                remaining[:chars_per_line],
-                                fontsize=9
-                            )
-                            remaining = remaining[chars_per_line:]
-                            y_position += 15
-                    else:
-                        # Print the entire encrypted text on one line
-                        new_page.insert_text(
-                            fitz.Point(current_x, y_position),
-                            encrypted_text,
-                            fontsize=9
-                        )
-                        y_position += 20
-                    
-                    # Add a small separator with more space
-                    y_position += 10  # Add more space before the separator
-                    new_page.draw_line(
-                        fitz.Point(current_x, y_position),
-                        fitz.Point(current_x + 100, y_position)
-                    )
-                    y_position += 25  # Add more space after the separator
-                    
-                    # Check if we need to start a new page
-                    if y_position > page_height - 60:  # Increased margin
-                        new_page = doc.new_page(-1, width=page_width, height=page_height)
-                        y_position = 50
-                        
-                        # Add "continued" header
-                        new_page.insert_text(
-                            fitz.Point(50, y_position),
-                            "ENCRYPTED INFORMATION (CONTINUED)",
-                            fontsize=16,
-                            fontname="Helvetica-Bold"
-                        )
-                        y_position += 30
-        
-        except Exception as e:
-            print(f"Error adding encryption information page: {str(e)}")
-            # Continue with the PDF even if we can't add the encryption info page
+        with metrics.stage("encryption_page"):
+            add_encryption_info_pages(doc, encrypted_data, author_info, options,
+                                      page.rect.width, page.rect.height)
     
     # Save the modified PDF
     output = io.BytesIO()
-    doc.save(output, deflate=True, garbage=4)
+    save_options = SAVE_PROFILES[options.save_profile or DEFAULT_SAVE_PROFILE]
+    with metrics.stage("save"):
+        doc.save(output, **save_options)
     doc.close()
 
     mapping = {
-        "encrypted_data": encrypted_data,
+        "encrypted_data": [item.to_dict() for item in encrypted_data],
         "sensitive_data_found": {
-            "name": len(author_info["names"]) > 0,
-            "email": len(author_info["emails"]) > 0,
-            "affiliation": len(author_info["affiliations"]) > 0,
-            "title": author_info["title"] != "" and options.title,  # Explicitly show if title was encrypted
+            "name": len(author_info.names) > 0,
+            "email": len(author_info.emails) > 0,
+            "affiliation": len(author_info.affiliations) > 0,
+            "title": author_info.title != "" and options.title,  # Explicitly show if title was encrypted
             "address": False
         },
         "encryption_options": options.dict(),
@@ -519,8 +581,154 @@ def process_pdf_for_ieee(pdf_bytes: bytes, options: EncryptionOptions) -> tuple:
     return output.getvalue(), mapping
 
 
+def process_pdf_with_store(digest: str, options: EncryptionOptions,
+                           source: Union[bytes, str], extract: bool = True) -> tuple:
+    """
+    Anonymize a document, reusing the stored output when the same content was
+    already processed with the same options. source is only opened on a miss.
+    Returns (stored output path, mapping, deduplicated).
+    """
+    key = result_key(options)
+    cached = content_store.load_processed(digest, key)
+    if cached is not None:
+        stored_path, mapping = cached
+        return stored_path, mapping, True
+
+    # Other processes (uvicorn workers, the ingestion daemon) anonymizing the
+    # same content with the same options wait here and then reuse the output
+    with atomic_io.file_lock(content_store.processed_path(digest, key)):
+        cached = content_store.load_processed(digest, key)
+        if cached is not None:
+            stored_path, mapping = cached
+            return stored_path, mapping, True
+
+        modified_pdf, mapping = process_pdf_for_ieee(source, options, digest, extract)
+        stored_path = content_store.save_processed(digest, key, modified_pdf, mapping)
+    preview.render_later(modified_pdf)
+    return stored_path, mapping, False
+
+
+# Concurrent requests for the same content and options share one pipeline run
+_processing = single_flight.Group("process")
+
+
+async def process_coalesced(digest: str, options: EncryptionOptions,
+                            source: Union[bytes, str], extract: bool = True) -> tuple:
+    """
+    process_pdf_with_store on the pipeline executor. Identical requests that
+    arrive while it runs wait for the same result, which counts as deduplicated.
+    """
+    key = (digest, result_key(options))
+    (stored_path, mapping, deduplicated), shared = await _processing.run(
+        key, process_pdf_with_store, digest, options, source, extract)
+    return stored_path, mapping, deduplicated or shared
+
+
+def publish_processed(stored_path: str, output_path: str):
+    """Copy a stored output to its processed_<name> path."""
+    # Writers of the same output are serialized; each one puts a complete file in place
+    with atomic_io.file_lock(output_path):
+        content_store.copy_file(stored_path, output_path)
+    file_index.record(output_path)
+
+
+def store_upload(temp_path: str, digest: str, filename: str) -> str:
+    """Move a received upload into the store and copy it to its name in the uploads area."""
+    object_path = content_store.add_object(temp_path, digest)
+    input_path = storage.get("uploads").path_for_write(filename)
+    with atomic_io.file_lock(input_path):
+        content_store.copy_file(object_path, input_path)
+    return input_path
+
+
+def process_pdf_for_response(digest: str, options: EncryptionOptions,
+                             source: Union[bytes, str], extract: bool = True) -> tuple:
+    """
+    Like process_pdf_with_store, but a fresh output is returned in memory
+    and not stored yet, so it can be sent before it is written; store it
+    with persist_processed. Returns (stored output path or None, pdf bytes
+    or None, mapping, deduplicated).
+    """
+    key = result_key(options)
+    cached = content_store.load_processed(digest, key)
+    if cached is not None:
+        stored_path, mapping = cached
+        return stored_path, None, mapping, True
+
+    modified_pdf, mapping = process_pdf_for_ieee(source, options, digest, extract)
+    return None, modified_pdf, mapping, False
+
+
+async def process_coalesced_for_response(digest: str, options: EncryptionOptions,
+                                         source: Union[bytes, str], extract: bool = True) -> tuple:
+    """process_pdf_for_response on the pipeline executor, coalesced like process_coalesced."""
+    key = (digest, result_key(options), "response")
+    (stored_path, pdf_bytes, mapping, deduplicated), shared = await _processing.run(
+        key, process_pdf_for_response, digest, options, source, extract)
+    return stored_path, pdf_bytes, mapping, deduplicated or shared
+
+
+def persist_processed(digest: str, options: EncryptionOptions, pdf_bytes: bytes,
+                      mapping: Dict, output_path: str):
+    """Store an output already sent to the client and publish it."""
+    key = result_key(options)
+    with atomic_io.file_lock(content_store.processed_path(digest, key)):
+        cached = content_store.load_processed(digest, key)
+        if cached is not None:
+            stored_path = cached[0]
+        else:
+            stored_path = content_store.save_processed(digest, key, pdf_bytes, mapping)
+            preview.render_later(pdf_bytes)
+    publish_processed(stored_path, output_path)
+
+
+def preflight_rejection(verdict: preflight.Verdict, **extra) -> JSONResponse:
+    return JSONResponse(
+        status_code=422,
+        content={"error": f"PDF rejected: {verdict.error}", "preflight": verdict.to_dict(), **extra}
+    )
+
+
+def process_result(mapping: Dict, output_filename: str, deduplicated: bool) -> Dict:
+    return {
+        "success": True,
+        "mapping": mapping,
+        "processed_filename": output_filename,
+        "download_url": f"/pdfs/processed/{output_filename}",
+        "preview_url": f"/api/py/preview/{output_filename}",
+        "deduplicated": deduplicated
+    }
+
+
+async def process_pdf_response(digest: str, options: EncryptionOptions, input_path: str,
+                               output_filename: str, output_path: str, response_mode: str,
+                               background_tasks: BackgroundTasks, extract: bool = True):
+    """Send the processed PDF in the response; a fresh output is stored afterwards."""
+    stored_path, pdf_bytes, mapping, deduplicated = await process_coalesced_for_response(
+        digest, options, input_path, extract)
+
+    if pdf_bytes is None:
+        # Already stored: publishing only copies it, the body is streamed from the store
+        with metrics.stage("write"):
+            await run_in_threadpool(publish_processed, stored_path, output_path)
+    else:
+        background_tasks.add_task(persist_processed, digest, options, pdf_bytes, mapping, output_path)
+
+    result = process_result(mapping, output_filename, deduplicated)
+    respond = pdf_response.multipart if response_mode == "multipart" else pdf_response.with_result_header
+    return respond(result, output_filename, data=pdf_bytes, path=stored_path)
+
+
 @app.post("/api/py/process-pdf")
-async def process_pdf_endpoint(request: dict):
+@metrics.timed_endpoint("process-pdf")
+@admission.admit("process-pdf", admission.BULK)
+async def process_pdf_endpoint(request: dict, background_tasks: BackgroundTasks):
+    """
+    Anonymize an uploaded PDF. By default the output is written to
+    PROCESS_DIR and the response has its download_url. With "responseMode"
+    set to "multipart" or "pdf" the output is sent in the response itself
+    (see pdf_response) and written after the response is sent.
+    """
     try:
         # Extract request data
         if not request:
@@ -536,12 +744,19 @@ async def process_pdf_endpoint(request: dict):
                 content={"error": "Filename is required"}
             )
 
+        response_mode = request.get("responseMode", "json")
+        if response_mode not in pdf_response.RESPONSE_MODES:
+            return JSONResponse(
+                status_code=400,
+                content={"error": f"responseMode must be one of: {', '.join(pdf_response.RESPONSE_MODES)}"}
+            )
+
         # Parse encryption options
         encryption_options_data = request.get("encryptionOptions", {})
         encryption_options = EncryptionOptions(**encryption_options_data)
 
         # Build file paths
-        input_path = os.path.join(UPLOAD_DIR, filename)
+        input_path = storage.get("uploads").path(filename)
         if not os.path.exists(input_path):
             return JSONResponse(
                 status_code=404,
@@ -550,35 +765,184 @@ async def process_pdf_endpoint(request: dict):
 
         # Generate output filename
         output_filename = f"processed_{filename}"
-        output_path = os.path.join(PROCESS_DIR, output_filename)
+        output_path = storage.get("processed").path_for_write(output_filename)
 
-        # Read the PDF file
-        with open(input_path, "rb") as f:
-            pdf_bytes = f.read()
+        # Identical content with identical options is only processed once
+        with metrics.stage("hash"):
+            digest = await run_in_threadpool(content_store.file_digest, input_path)
 
-        # Process the PDF specifically for IEEE papers
-        modified_pdf, mapping = process_pdf_for_ieee(
-            pdf_bytes, encryption_options)
+        # Unreadable, encrypted and empty files are turned away before the pipeline
+        verdict = await preflight.check_async(digest, input_path)
+        if verdict.rejected:
+            return preflight_rejection(verdict)
 
-        # Save the processed PDF
-        with open(output_path, "wb") as f:
-            f.write(modified_pdf)
+        async with preflight.queue(verdict, "process-pdf"):
+            if response_mode != "json":
+                return await process_pdf_response(
+                    digest, encryption_options, input_path, output_filename, output_path,
+                    response_mode, background_tasks, verdict.has_text)
+
+            # Process the PDF specifically for IEEE papers
+            stored_path, mapping, deduplicated = await process_coalesced(
+                digest, encryption_options, input_path, verdict.has_text)
+
+        # Publish the processed PDF under its usual name
+        with metrics.stage("write"):
+            await run_in_threadpool(publish_processed, stored_path, output_path)
 
         # Return response with mapping and new filename
-        return JSONResponse(content={
-            "success": True,
+        return JSONResponse(content=process_result(mapping, output_filename, deduplicated))
+
+    except HTTPException:
+        # Admission rejections (429) keep their status
+        raise
+    except Exception as e:
+        logger.exception("Processing failed", extra={"pdf": request.get("filename")})
+        import traceback
+        error_details = traceback.format_exc()
+        return JSONResponse(
+            status_code=500,
+            content={
+                "error": f"Processing failed: {str(e)}",
+                "details": error_details
+            }
+        )
+
+
+@app.post("/api/py/upload")
+@metrics.timed_endpoint("upload")
+@admission.admit("upload", admission.BULK)
+async def upload_pdf_endpoint(request: Request, filename: str, process: bool = False,
+                              encryptionOptions: Optional[str] = None):
+    """
+    Stream a raw PDF request body straight into UPLOAD_DIR.
+
+    The SHA-256 of the content is computed while the chunks are written and the
+    size limit is enforced as soon as it is exceeded. With process=true the
+    uploaded bytes are anonymized and categorized right away, without reading
+    the stored file back from disk.
+    """
+    filename = os.path.basename(filename)
+    if not filename.lower().endswith(".pdf"):
+        return JSONResponse(
+            status_code=400,
+            content={"error": "Only .pdf files can be uploaded"}
+        )
+
+    # Reject early when the client announces an oversized body
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > MAX_UPLOAD_BYTES:
+        return JSONResponse(
+            status_code=413,
+            content={"error": f"File exceeds the {MAX_UPLOAD_BYTES} byte upload limit"}
+        )
+
+    try:
+        encryption_options = EncryptionOptions(**json.loads(encryptionOptions or "{}"))
+    except Exception as e:
+        return JSONResponse(
+            status_code=400,
+            content={"error": f"Invalid encryption options: {str(e)}"}
+        )
+
+    hasher = hashlib.sha256()
+    size = 0
+    # Only keep the bytes around when they are processed right after the upload
+    pdf_buffer = bytearray() if process else None
+
+    temp_file = tempfile.NamedTemporaryFile(
+        dir=UPLOAD_DIR, prefix=".upload-", suffix=".part", delete=False)
+    try:
+        with metrics.stage("receive"), temp_file:
+            async for chunk in request.stream():
+                size += len(chunk)
+                if size > MAX_UPLOAD_BYTES:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"File exceeds the {MAX_UPLOAD_BYTES} byte upload limit")
+                hasher.update(chunk)
+                temp_file.write(chunk)
+                if pdf_buffer is not None:
+                    pdf_buffer.extend(chunk)
+
+        if size == 0:
+            raise HTTPException(status_code=400, detail="Empty upload")
+
+        # Identical uploads share one stored copy
+        digest = hasher.hexdigest()
+        input_path = await run_in_threadpool(store_upload, temp_file.name, digest, filename)
+        file_index.record(input_path)
+    except HTTPException as e:
+        if os.path.exists(temp_file.name):
+            os.unlink(temp_file.name)
+        return JSONResponse(status_code=e.status_code, content={"error": e.detail})
+    except Exception as e:
+        logger.exception("Upload failed", extra={"pdf": filename})
+        if os.path.exists(temp_file.name):
+            os.unlink(temp_file.name)
+        return JSONResponse(
+            status_code=500,
+            content={"error": f"Upload failed: {str(e)}"}
+        )
+
+    result = {
+        "success": True,
+        "filename": filename,
+        "size": size,
+        "sha256": digest
+    }
+
+    if not process:
+        return JSONResponse(content=result)
+
+    try:
+        pdf_bytes = bytes(pdf_buffer)
+        del pdf_buffer
+
+        verdict = await preflight.check_async(digest, pdf_bytes)
+        if verdict.rejected:
+            # The upload itself succeeded and is kept
+            return preflight_rejection(verdict, upload=result)
+
+        output_filename = f"processed_{filename}"
+        output_path = storage.get("processed").path_for_write(output_filename)
+        async with preflight.queue(verdict, "upload"):
+            stored_path, mapping, deduplicated = await process_coalesced(
+                digest, encryption_options, pdf_bytes, verdict.has_text)
+        with metrics.stage("write"):
+            await run_in_threadpool(publish_processed, stored_path, output_path)
+
+        if verdict.has_text:
+            categories = await categorize.categorize_coalesced(
+                digest, lambda: layout_cache.get(digest, pdf_bytes).text)
+        else:
+            # Nothing to score without a text layer
+            categories = await categorize.categorize_coalesced(digest, lambda: "")
+        file_index.set_category(filename, categories["primary_category"])
+
+        result.update({
             "mapping": mapping,
             "processed_filename": output_filename,
-            "download_url": f"/pdfs/processed/{output_filename}"
+            "download_url": f"/pdfs/processed/{output_filename}",
+            "preview_url": f"/api/py/preview/{output_filename}",
+            "deduplicated": deduplicated,
+            "primary_category": categories["primary_category"],
+            "category_scores": categories["category_scores"]
         })
+        return JSONResponse(content=result)
 
+    except HTTPException:
+        # Admission rejections (429) keep their status
+        raise
     except Exception as e:
+        logger.exception("Processing after upload failed", extra={"pdf": filename})
         import traceback
         error_details = traceback.format_exc()
         return JSONResponse(
             status_code=500,
             content={
                 "error": f"Processing failed: {str(e)}",
-                "details": error_details
+                "details": error_details,
+                "upload": result
             }
         )